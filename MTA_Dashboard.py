@@ -1,571 +1,785 @@
+import copy
+import functools
+import itertools
+import threading
+from contextlib import contextmanager
+
 from dash import Dash, dcc, html
-from dash import Input, Output
+from dash import ClientsideFunction, Input, Output, Patch, State, ctx
+from dash.exceptions import PreventUpdate
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 
+from aggregates import (
+    DAY_OF_WEEK_ORDER, GRANULARITY_COLUMNS, MONTH_ORDER, PERIOD_FREQUENCIES, ROLLING_STATISTICS, PrefixSums,
+    RollingWindows, period_ordinals, quantile_name, ratio_block, year_key
+)
+from config import (
+    CLIENTSIDE_HIGHLIGHT, DOWNSAMPLE_METHOD, FIGURE_BYTE_BUDGET, FORECAST_DAYS, FORECAST_WORKERS, HTTP_CACHE_BYTES,
+    HTTP_CACHE_SIZE, LINE_CHART_WIDTH, METRICS_ENABLED, PROFILE_DIR, PROFILE_RATE, PROFILE_TOGGLE, PROFILER, QUERY_BACKEND, QUERY_DB,
+    RECOVERY_THRESHOLD_HIGH, RECOVERY_THRESHOLD_LOW, SERVER_HOST, SERVER_PORT, SERVER_THREADS, SHARED_DATA_DIR,
+    REFRESH_INTERVAL, ROLLING_WINDOWS, SUMMARY_QUANTILES, WARMUP, WATCH_INTERVAL
+)
+from data_loader import DEFAULT_CACHE_DIR, DateIndex, Refresher, SourceWatcher, frame_hash, load_ridership, ratio_columns
+from downsampling import date_array, downsample_indices, fit_budget, points_within, typed_array
+from figure_cache import FigureCache, cache_size_from_env
+from forecasting import fit_forecasts
+from http_cache import ResponseCache
+import instrumentation
+from instrumentation import SamplingProfiler, output_seconds, span
+from query_backend import SqlAggregateCube, build_cube
+from services import ServiceRegistry
+from shared_data import read_shared
+
+
+# Bars and lines of the services that aren't selected
+default_color = "#484E54"
 
-dataset_url = "https://raw.githubusercontent.com/plotly/datasets/refs/heads/master/MTA_Ridership_by_DATA_NY_GOV.csv"
-df = pd.read_csv(dataset_url)
+# One KPI card per service, sharing the row equally whatever the count; past the min width they wrap onto more rows
+KPI_CARD_STYLE = {"flex": "1 1 0", "minWidth": "7rem"}
 
-df['Date'] = pd.to_datetime(df['Date'], errors='coerce')  # Ensure Date column is in datetime format
-df = df.dropna(subset=['Date'])  # Drop rows where Date is invalid
 
+def prepare_dataset(df):
+    # Keeps the frame compact: float32 ratios, int32 period ordinals and small-int categoricals
 
-# List of percentage columns
-percentage_columns = [
-    'Subways: % of Comparable Pre-Pandemic Day',
-    'Buses: % of Comparable Pre-Pandemic Day',
-    'LIRR: % of Comparable Pre-Pandemic Day',
-    'Metro-North: % of Comparable Pre-Pandemic Day',
-    'Access-A-Ride: % of Comparable Pre-Pandemic Day',
-    'Bridges and Tunnels: % of Comparable Pre-Pandemic Day',
-    'Staten Island Railway: % of Comparable Pre-Pandemic Day'
-]
+    # Making them as Percentages
+    percentage_columns = ratio_columns(df.columns)
+    df[percentage_columns] = (df[percentage_columns].astype("float64") / 100).astype("float32")
 
+    # Period / calendar columns used by the groupbys
+    for column, freq in PERIOD_FREQUENCIES.items():
+        df[column] = period_ordinals(df['Date'], freq)
 
-# Making them as Percentages
-df[percentage_columns] = df[percentage_columns] / 100
+    df['Year'] = df['Date'].dt.year.astype("int16")
+    df['Month_Name'] = pd.Categorical.from_codes(df['Date'].dt.month - 1, categories=MONTH_ORDER, ordered=True)  # month name
+    df['Day_of_Week'] = pd.Categorical.from_codes(df['Date'].dt.dayofweek, categories=DAY_OF_WEEK_ORDER, ordered=True)  # day name
 
-# will be used in highlighting the line chart
-service_mapping = {
-    "Subways": "Subways: % of Comparable Pre-Pandemic Day",
-    "Buses": "Buses: % of Comparable Pre-Pandemic Day",
-    "LIRR": "LIRR: % of Comparable Pre-Pandemic Day",
-    "Metro North": "Metro-North: % of Comparable Pre-Pandemic Day",
-    "Access-A": "Access-A-Ride: % of Comparable Pre-Pandemic Day",
-    "Bridges and Tunnels": "Bridges and Tunnels: % of Comparable Pre-Pandemic Day",
-    "Staten Island Railway": "Staten Island Railway: % of Comparable Pre-Pandemic Day"
-}
+    return df
 
-service_short_names = {
-    "Subways: % of Comparable Pre-Pandemic Day": "Subways",
-    "Buses: % of Comparable Pre-Pandemic Day": "Buses",
-    "LIRR: % of Comparable Pre-Pandemic Day": "LIRR",
-    "Metro-North: % of Comparable Pre-Pandemic Day": "Metro North",
-    "Access-A-Ride: % of Comparable Pre-Pandemic Day": "Access-A",
-    "Bridges and Tunnels: % of Comparable Pre-Pandemic Day": "Bridges",
-    "Staten Island Railway: % of Comparable Pre-Pandemic Day": "Staten Island"
-}
 
-service_colors_line_chart = {
-    "Subways: % of Comparable Pre-Pandemic Day": "#44b9dd", 
-    "Buses: % of Comparable Pre-Pandemic Day": "#bf9bf9", 
-    "LIRR: % of Comparable Pre-Pandemic Day": "#f89256",
-    "Metro-North: % of Comparable Pre-Pandemic Day": "#eb92ad",
-    "Access-A-Ride: % of Comparable Pre-Pandemic Day":  "#8ea9ff",
-    "Bridges and Tunnels: % of Comparable Pre-Pandemic Day": "#d3a61c",
-    "Staten Island Railway: % of Comparable Pre-Pandemic Day": "#40bfa9"
-}
+def ridership_totals():
+    # Total ridership / traffic counts aren't plotted, so they are only read when something asks for them
+    return current_snapshot().ridership_totals()
 
 
-default_color = "#484E54"
+def memory_report():
+    # Bytes held per worker, to size how many workers fit on a host
+    current = latest_snapshot()
+    columns = current.df.memory_usage(deep=True, index=True)
+    return {
+        "rows": len(current.df),
+        "df_columns": {column: int(size) for column, size in columns.items()},
+        "df": int(columns.sum()),
+        "aggregate_cube": current.aggregate_cube.nbytes(),
+        "prefix_sums": current.prefix_sums.nbytes(),
+        "rolling_windows": current.rolling_windows.nbytes(),
+        "forecasts": current.forecasts.nbytes() if current.forecasts is not None else 0,
+        "ridership_totals": int(current.totals.memory_usage(deep=True).sum()) if current.totals is not None else 0,
+        "date_index": current.date_index.dates.nbytes,
+    }
 
 
-service_colors = {
-    "Subways": "#44b9dd",  # $color-charts-blue-1-600  
-    "Buses": "#bf9bf9", # $color-charts-purple-600    
-    "LIRR": "#f89256",  # $color-charts-orange-600
-    "Metro North": "#eb92ad",  # $color-charts-pink-600
-    "Access-A": "#8ea9ff",  # $color-charts-blue-2-600
-    "Bridges and Tunnels": "#d3a61c",  # $color-charts-yellow-600
-    "Staten Island Railway": "#40bfa9"  # $color-charts-teal-600
-}
+class Snapshot:
+    """One dataset version and everything derived from it, replaced whole and never modified.
+
+    ``snapshot`` holds the current one; a reload or ingest builds the next off
+    the request path and swaps the reference in one assignment. Requests pin
+    the snapshot they started with (pinned_snapshot), so none sees the frame of
+    one version with the aggregates of another.
+    """
+
+    def __init__(self, df, source_columns, services, date_index, aggregate_cube, prefix_sums, rolling_windows=None):
+        self.df = df
+        self.source_columns = source_columns  # loaded CSV columns, before the derived columns are added
+        self.services = services
+        self.date_index = date_index
+        self.aggregate_cube = aggregate_cube
+        self.prefix_sums = prefix_sums
+
+        # Rolling line chart views, each computed on first use; memoized, so shared by every request on this snapshot
+        self.rolling_windows = rolling_windows if rolling_windows is not None else RollingWindows(prefix_sums)
+
+        # Recovery projections per service, fitted by with_forecasts() before the snapshot is published
+        self.forecasts = None
 
+        # Total ridership / traffic counts, read on first use by ridership_totals()
+        self.totals = None
 
-# ---- color option
-
-# service_colors = {
-#     "Subways": "#C2185B",  # Deep Pink
-#     "Buses": "#7B1FA2",  # Purple
-#     "LIRR": "#512DA8",  # Indigo
-#     "Metro North": "#303F9F",  # Dark Blue
-#     "Access-A": "#00796B",  # Teal
-#     "Bridges and Tunnels": "#F57C00",  # Orange
-#     "Staten Island Railway": "#C62828"  # Crimson
-# }
-
-summary_metrics = {
-    "Subways": df["Subways: % of Comparable Pre-Pandemic Day"].mean(),
-    "Buses": df["Buses: % of Comparable Pre-Pandemic Day"].mean(),
-    "LIRR": df["LIRR: % of Comparable Pre-Pandemic Day"].mean(),
-    "Metro North": df["Metro-North: % of Comparable Pre-Pandemic Day"].mean(),  
-    "Access-A": df["Access-A-Ride: % of Comparable Pre-Pandemic Day"].mean(), 
-    "Bridges and Tunnels": df["Bridges and Tunnels: % of Comparable Pre-Pandemic Day"].mean(),       
-    "Staten Island Railway": df["Staten Island Railway: % of Comparable Pre-Pandemic Day"].mean()
+        # The source hash changes on reload, the row count on ingest; either makes cached outputs stale
+        self.version = f"{df.attrs.get('version')}:{len(df)}"
+
+    def ridership_totals(self):
+        # From this snapshot's source file, cut to its days: after an ingest the file may already hold later ones
+        if self.totals is None:
+            totals = load_ridership(path=self.df.attrs.get("source"), kind="totals")
+            self.totals = totals[totals['Date'] <= self.df['Date'].max()].reset_index(drop=True)
+        return self.totals
+
+
+# Snapshot fields also readable as module attributes, e.g. `MTA_Dashboard.df` in scripts
+DATA_GLOBALS = (
+    "df", "source_columns", "services", "date_index", "aggregate_cube", "prefix_sums", "rolling_windows", "forecasts"
+)
+
+# Lookups that used to be module-level literals, now read from the snapshot's service registry
+SERVICE_GLOBALS = {
+    "service_mapping": "mapping",
+    "percentage_columns": "columns",
+    "service_short_names": "short_names",
+    "service_colors": "colors",
+    "service_colors_line_chart": "line_colors",
 }
 
-# Monthly
-df['Month'] = df['Date'].dt.to_period('M')
-monthly_avg = df.groupby('Month').mean().reset_index()
-monthly_avg['Month'] = monthly_avg['Month'].dt.to_timestamp()
+snapshot = None  # set by load_data(), which create_app() calls; importing this module loads nothing
+snapshot_lock = threading.Lock()  # one load / reload / ingest at a time; readers never take it
+_pinned = threading.local()
+
+loaded_source = None  # what load_data() was given, so reload_dataset() re-reads the same file
+
+# Finished callback outputs keyed by output and the selectors it depends on, for the current snapshot's version;
+# MTA_FIGURE_CACHE_SIZE bounds it
+figure_cache = FigureCache(maxsize=cache_size_from_env())
+
+
+def build_snapshot(df, source_columns):
+    # One service per ratio column of the header, named / colored by the registry
+    services = ServiceRegistry.from_header(source_columns)
+
+    # Year -> row offsets on the Date-sorted frame, so per-year filtering is a slice
+    date_index = DateIndex(df)
+
+    # Every aggregate update_dashboard needs, per year and for all services, built up front
+    # (in pandas, or queried from an embedded database with MTA_QUERY_BACKEND=sqlite / duckdb)
+    aggregate_cube = build_cube(df, services.mapping, date_index, QUERY_BACKEND, QUERY_DB)
+
+    # Cumulative sums / counts behind the date-range KPIs
+    prefix_sums = PrefixSums(date_index, services.mapping)
+    return Snapshot(df, source_columns, services, date_index, aggregate_cube, prefix_sums)
+
+
+def with_forecasts(new, cache=True):
+    # Fit (or read from .cache/) every service's projection off the request path, unless MTA_FORECAST_DAYS=0.
+    # Only snapshots read from a source file are cached on disk: the source hash in their version pins the data,
+    # which it doesn't for a frame passed in or for an ingest (same hash, more rows).
+    if FORECAST_DAYS > 0:
+        version = new.version if cache and new.df.attrs.get("version") else None
+        new.forecasts = fit_forecasts(
+            new.df, new.services.columns, FORECAST_DAYS, RECOVERY_THRESHOLD_HIGH, FORECAST_WORKERS, version
+        )
+    return new
+
+
+def swap_snapshot(new, invalidate=True):
+    # Cache first, so builds still pinned to the outgoing snapshot are no longer stored; then readers move over
+    global snapshot
+    figure_cache.set_version(new.version, invalidate)
+    snapshot = new
+    return new
+
+
+def load_data(data_source=None):
+    """Load the ridership data, build every aggregate the callbacks read and make it the current snapshot.
+
+    ``data_source`` is a CSV path, a frame shaped like load_ridership()'s
+    (parsed Date plus the "% of Comparable Pre-Pandemic Day" columns), or None
+    for the environment's choice: the MTA_SHARED_DATA_DIR export when set,
+    otherwise $MTA_DATA_PATH or the bundled CSV.
+    """
+    global loaded_source
+
+    # With MTA_SHARED_DATA_DIR set, map the export written by `python shared_data.py DIR` instead of loading
+    shared = read_shared(SHARED_DATA_DIR) if SHARED_DATA_DIR and data_source is None else None
+
+    if shared is not None:
+        # Columns, prefix sums and aggregates come read-only from the preparer; nothing to parse or group here
+        df, year_offsets, prefix_arrays, aggregate_cube = shared
+        date_index = DateIndex(df, year_offsets)
+        aggregate_cube.attach(df, date_index)
+        source_columns = ["Date"] + ratio_columns(df.columns)
+        services = ServiceRegistry.from_header(source_columns)
+        prefix_sums = PrefixSums.from_arrays(date_index, services.mapping, prefix_arrays)
+        new = Snapshot(df, source_columns, services, date_index, aggregate_cube, prefix_sums)
+
+    else:
+        # Reads Data/MTA_Daily_Ridership.csv (or $MTA_DATA_PATH) and reuses the parsed snapshot on warm starts.
+        # Set MTA_DATA_REFRESH=1 to pull the latest file from the remote source first.
+        if isinstance(data_source, pd.DataFrame):
+            # Not the file its attrs may name (e.g. a slice of one): versioned by content, with no source to watch,
+            # so a different frame of the same length never reuses cached outputs
+            raw = data_source.copy()
+            raw.attrs = {"version": frame_hash(raw)}
+        else:
+            raw = load_ridership(path=data_source)
+        source_columns = list(raw.columns)
+        new = build_snapshot(prepare_dataset(raw), source_columns)
+
+    loaded_source = data_source if not isinstance(data_source, pd.DataFrame) else None
+    return swap_snapshot(with_forecasts(new, cache=not isinstance(data_source, pd.DataFrame)))
+
+
+def latest_snapshot():
+    # Entry points usable without create_app() (update_dashboard, warm_up, scripts) load the default source once
+    if snapshot is None:
+        with snapshot_lock:
+            if snapshot is None:
+                load_data()
+    return snapshot
+
+
+def current_snapshot():
+    # The snapshot this thread's request pinned, else the latest one
+    pinned = getattr(_pinned, "snapshot", None)
+    return pinned if pinned is not None else latest_snapshot()
+
+
+@contextmanager
+def pinned_snapshot():
+    # Everything inside reads one snapshot; nested uses (update_dashboard in a callback request) keep the outer pin
+    pinned = getattr(_pinned, "snapshot", None)
+    if pinned is not None:
+        yield pinned
+        return
+    _pinned.snapshot = latest_snapshot()
+    try:
+        yield _pinned.snapshot
+    finally:
+        _pinned.snapshot = None
+
+
+def reload_dataset(**load_options):
+    # Re-read the source and swap in a rebuilt snapshot when the data actually changed. Runs on the watcher /
+    # refresher thread; requests keep reading the previous snapshot until the swap.
+    if loaded_source is not None:
+        load_options.setdefault("path", loaded_source)
+
+    with snapshot_lock:
+        fresh = load_ridership(**load_options)
+        if fresh.attrs.get("version") == snapshot.df.attrs.get("version"):
+            return False
+        source_columns = list(fresh.columns)
+        swap_snapshot(with_forecasts(build_snapshot(prepare_dataset(fresh), source_columns)))
+    return True
+
+
+def cache_entry_affected(key, years, first_new_date):
+    name, selected_year, *rest = key
+    if name in ("yearly-breakdown", "series-store"):
+        return True  # these show every year
+
+    # Date-range keys end with (start_date, end_date)
+    if name in DATE_RANGE_OUTPUTS:
+        start_date, end_date = rest[-2:]
+        if start_date or end_date:
+            return end_date is None or pd.Timestamp(end_date) >= first_new_date
+
+    return year_key(selected_year) == "All" or year_key(selected_year) in years
+
+
+def ingest_rows(new_rows):
+    # Append raw source rows for days after the last loaded one as a new snapshot. The cube and prefix sums
+    # are copied and extended rather than rebuilt, and only the cache entries the new days touch are dropped.
+    with snapshot_lock:
+        current = snapshot
+        new_rows = new_rows[new_rows['Date'] > current.df['Date'].max()]
+        if new_rows.empty:
+            return 0
+        new_rows = prepare_dataset(new_rows[current.source_columns].reset_index(drop=True))
+
+        combined = pd.concat([current.df, new_rows], ignore_index=True)
+        combined.attrs.update(current.df.attrs)
+        index = DateIndex(combined)
+
+        # Copies, so requests still on the current snapshot don't see its aggregates change under them
+        aggregate_cube = copy.deepcopy(current.aggregate_cube).attach(current.df, current.date_index)
+        years = aggregate_cube.append(combined, index, new_rows)
+        prefix_sums = copy.copy(current.prefix_sums)
+        prefix_sums.append(index)
+        rolling_windows = copy.copy(current.rolling_windows)
+        rolling_windows.append(prefix_sums)
+
+        first_new_date = new_rows['Date'].min()
+        swap_snapshot(
+            with_forecasts(
+                Snapshot(combined, current.source_columns, current.services, index, aggregate_cube, prefix_sums, rolling_windows),
+                cache=False
+            ),
+            invalidate=lambda key: cache_entry_affected(key, years, first_new_date)
+        )
+        return len(new_rows)
+
+
+def start_source_watch(interval=None):
+    # Poll the source CSV; appended days are ingested, a replaced file triggers a full reload
+    attrs = latest_snapshot().df.attrs
+    watcher = SourceWatcher(
+        attrs["source"], attrs["source_size"], attrs["header"],
+        on_rows=ingest_rows, on_replaced=reload_dataset, interval=WATCH_INTERVAL if interval is None else interval
+    )
+    watcher.start()
+    return watcher
+
+
+def refresh_dataset():
+    # One background refresh: reload, then warm the new snapshot's figure cache before requests need it
+    if not reload_dataset():
+        return False
+    warm_up()
+    return True
 
-# Weekly
-df['Week'] = df['Date'].dt.to_period('W')
-weekly_avg = df.groupby('Week').mean().reset_index()
-weekly_avg['Week'] = weekly_avg['Week'].dt.to_timestamp()
 
-# Quarterly
-df['Quarter'] = df['Date'].dt.to_period('Q')
-quarterly_avg = df.groupby('Quarter').mean().reset_index()
-quarterly_avg['Quarter'] = quarterly_avg['Quarter'].dt.to_timestamp()
+def start_refresher(interval=None):
+    # Full reloads every MTA_REFRESH_INTERVAL seconds, e.g. with MTA_DATA_REFRESH=1 pulling the remote file
+    refresher = Refresher(refresh_dataset, REFRESH_INTERVAL if interval is None else interval)
+    refresher.start()
+    return refresher
 
-df['Year'] = df['Date'].dt.year
-df['Month_Name'] = df['Date'].dt.strftime('%b')  # month name
-df['Day_of_Week'] = df['Date'].dt.strftime('%a')  # day name
 
-yearly_avg = df.groupby('Year')['Subways: % of Comparable Pre-Pandemic Day'].mean().reset_index()
-monthly_avg_b = df.groupby('Month_Name')['Subways: % of Comparable Pre-Pandemic Day'].mean().reset_index()
-day_of_week_avg = df.groupby('Day_of_Week')['Subways: % of Comparable Pre-Pandemic Day'].mean().reset_index()
+def start_background_threads():
+    # The watcher / refresher of a serving process: serve(), or each gunicorn worker's post_fork. Never in a
+    # preloading master, which serves nothing and whose held locks a fork would copy into the workers.
+    global source_watcher, refresher
+    if "source" not in latest_snapshot().df.attrs:
+        return  # a frame passed to create_app() has no file to come back to
+    if WATCH_INTERVAL > 0 and source_watcher is None:
+        source_watcher = start_source_watch()
+    if REFRESH_INTERVAL > 0 and refresher is None:
+        refresher = start_refresher()
 
-# Sort by day of the week for proper order
-day_of_week_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-day_of_week_avg['Day_of_Week'] = pd.Categorical(day_of_week_avg['Day_of_Week'], categories=day_of_week_order, ordered=True)
-day_of_week_avg = day_of_week_avg.sort_values('Day_of_Week')
 
+def stop_background_threads():
+    global source_watcher, refresher
+    for thread in (source_watcher, refresher):
+        if thread is not None:
+            thread.stop()
+    source_watcher = refresher = None
+
+
+source_watcher = None  # started by start_background_threads() when MTA_WATCH_INTERVAL > 0
+refresher = None  # likewise with MTA_REFRESH_INTERVAL > 0
+
+# Line chart granularity plotted from the daily rows themselves rather than a period table
+DAILY = "daily"
+
+# Trailing-window views of the daily rows, e.g. "rolling-28-median" -> (28, "median")
+ROLLING_VIEWS = {
+    f"rolling-{window}-{statistic}": (window, statistic)
+    for statistic in ROLLING_STATISTICS for window in ROLLING_WINDOWS
+}
+
+# Granularities with one point per day, which get WebGL traces and zoom-window refetches
+DAILY_VIEWS = {DAILY, *ROLLING_VIEWS}
+
+
+def granularity_label(granularity):
+    if granularity in ROLLING_VIEWS:
+        window, statistic = ROLLING_VIEWS[granularity]
+        return f"{window}-Day Rolling {statistic.capitalize()}"
+    return granularity.capitalize()
 
 
 
-app = Dash(__name__, external_stylesheets=["https://cdn.jsdelivr.net/npm/bootswatch@5.3.0/dist/slate/bootstrap.min.css"])
 
 # Sidebar
-sidebar = dbc.Col(
-    [
-        html.Div(
-            [
-                dcc.Markdown(
-                    """
-                    <svg width="47" height="51" xmlns="http://www.w3.org/2000/svg">
-                        <path d="M29.909 21.372l-2.743-.234v14.56l-4.088.724-.01-15.644-3.474-.308v-5.734l10.315 1.803v4.833zm7.785 12.484l-2.426.421-.283-2.122-2.363.307-.296 2.335-3.125.553 3.094-18.36 2.937.51 2.462 16.356zm-3.141-5.288l-.65-5.606h-.142l-.658 5.691 1.45-.085zM21.038 50.931c13.986 0 25.32-11.402 25.32-25.465C46.359 11.4 35.025 0 21.039 0 12.27 0 4.545 4.483 0 11.296l7.017 1.237 1.931 14.78c.007-.024.14-.009.14-.009l2.118-14.036 7.022 1.229V37.28l-4.432.776v-9.79s.164-4.217.067-4.938c0 0-.193.005-.196-.011l-2.644 15.236-4.403.777-3.236-16.412-.195-.014c-.069.594.237 5.744.237 5.744v11.243L.532 40.4c4.603 6.38 12.072 10.53 20.506 10.53v.001z" fill="#FFF" fill-rule="nonzero"></path>
-                    </svg>
-                    """,
-                    dangerously_allow_html=True,
-                    className="mb-2"
+def build_sidebar():
+    return dbc.Col(
+        [
+            html.Div(
+                [
+                    dcc.Markdown(
+                        """
+                        <svg width="47" height="51" xmlns="http://www.w3.org/2000/svg">
+                            <path d="M29.909 21.372l-2.743-.234v14.56l-4.088.724-.01-15.644-3.474-.308v-5.734l10.315 1.803v4.833zm7.785 12.484l-2.426.421-.283-2.122-2.363.307-.296 2.335-3.125.553 3.094-18.36 2.937.51 2.462 16.356zm-3.141-5.288l-.65-5.606h-.142l-.658 5.691 1.45-.085zM21.038 50.931c13.986 0 25.32-11.402 25.32-25.465C46.359 11.4 35.025 0 21.039 0 12.27 0 4.545 4.483 0 11.296l7.017 1.237 1.931 14.78c.007-.024.14-.009.14-.009l2.118-14.036 7.022 1.229V37.28l-4.432.776v-9.79s.164-4.217.067-4.938c0 0-.193.005-.196-.011l-2.644 15.236-4.403.777-3.236-16.412-.195-.014c-.069.594.237 5.744.237 5.744v11.243L.532 40.4c4.603 6.38 12.072 10.53 20.506 10.53v.001z" fill="#FFF" fill-rule="nonzero"></path>
+                        </svg>
+                        """,
+                        dangerously_allow_html=True,
+                        className="mb-2"
+                    ),
+                    html.H3("MTA Dashboard", className="text-center text-light", style={"fontSize": "1.7vw"})
+                ],
+                className="mb-4 mt-3 text-center"
+            ),
+            html.Hr(className="mb-4"),
+            html.Div("Select/Highlight a Service:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}),  
+            dbc.Select(
+                id="service-selector",
+                options=current_snapshot().services.options(),
+                value=current_snapshot().services.default(),
+                className="mb-4 p-10 form-select form-select-sm",
+                style={"width": "90%", "margin": "0 auto"}
+            ),
+            html.Div("Select Year:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}), 
+            dbc.Select(
+                id="year-selector",
+                options=[{"label": "All", "value": "All"}] + [{"label": year, "value": year} for year in current_snapshot().date_index.years()],
+                value="All",  # Default to "All"
+                className="mb-4 p-10 form-select form-select-sm",
+                style={"width": "90%", "margin": "0 auto"}
+            ),
+            html.Div("Or a Date Range (KPIs):", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}), 
+            html.Div(
+                dcc.DatePickerRange(
+                    id="date-range",
+                    min_date_allowed=current_snapshot().df['Date'].min().date(),
+                    max_date_allowed=current_snapshot().df['Date'].max().date(),
+                    start_date=None,
+                    end_date=None,
+                    clearable=True,
+                    display_format="YYYY-MM-DD"
                 ),
-                html.H3("MTA Dashboard", className="text-center text-light", style={"fontSize": "1.7vw"})
-            ],
-            className="mb-4 mt-3 text-center"
-        ),
-        html.Hr(className="mb-4"),
-        html.Div("Select/Highlight a Service:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}),  
-        dbc.Select(
-            id="service-selector",
-            options=[
-                {"label": "Subways", "value": "Subways"},
-                {"label": "Buses", "value": "Buses"},
-                {"label": "LIRR", "value": "LIRR"},
-                {"label": "Metro North", "value": "Metro North"},
-                {"label": "Access-A-Ride", "value": "Access-A"},
-                {"label": "Bridges and Tunnels", "value": "Bridges and Tunnels"},
-                {"label": "Staten Island Railway", "value": "Staten Island Railway"}
-            ],
-            value="Subways",
-            className="mb-4 p-10 form-select form-select-sm",
-            style={"width": "90%", "margin": "0 auto"}
-        ),
-        html.Div("Select Year:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}), 
-        dbc.Select(
-            id="year-selector",
-            options=[{"label": "All", "value": "All"}] + [{"label": year, "value": year} for year in sorted(df['Year'].unique())],
-            value="All",  # Default to "All"
-            className="mb-4 p-10 form-select form-select-sm",
-            style={"width": "90%", "margin": "0 auto"}
-        ),
-        html.Div("Display KPIs By:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}), 
-        dbc.Select(
-            id="metric-type",
-            options=[
-                {"label": "Average Daily Recovery", "value": "average"},
-                {"label": "Days ≥ 100% Recovery", "value": "days_100"},
-                {"label": "Days ≤ 50% Recovery", "value": "days_50"}
-            ],
-            value="average",
-            className="mb-4 p-10 form-select form-select-sm",
-            style={"width": "90%", "margin": "0 auto"} 
-        ),
-        html.Div("Line Chart Granularity:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}), 
-        dbc.Select(
-            id="time-granularity",
-            options=[
-                {"label": "Monthly", "value": "monthly"},
-                {"label": "Weekly", "value": "weekly"},
-                {"label": "Quarterly", "value": "quarterly"}
-            ],
-            value="monthly",
-            className="mb-4 p-10 form-select form-select-sm",
-            style={"width": "90%", "margin": "0 auto"}  
-        ),
-        
-        html.Hr(className="mb-4"),
-        
-        
-        # Tooltip and Info Section
-        html.Div(
-            [
-                # Question Section
-                html.Div(
-                    [
-                        html.Span(
-                            "Question:", 
-                            style={"fontSize": "0.85vw", "color": "white", "marginRight": "10px"}
-                        ),
-                        html.Div(
-                            id="info-icon",
-                            children=[
-                                html.Span(
+                className="mb-4",
+                style={"width": "90%", "margin": "0 auto"}
+            ),
+            html.Div("Display KPIs By:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}), 
+            dbc.Select(
+                id="metric-type",
+                options=[
+                    {"label": "Average Daily Recovery", "value": "average"}
+                ] + (
+                    [{"label": "Median Daily Recovery", "value": "median"}] if 0.5 in SUMMARY_QUANTILES else []
+                ) + [
+                    {"label": f"Days ≥ {RECOVERY_THRESHOLD_HIGH:.0%} Recovery", "value": "days_100"},
+                    {"label": f"Days ≤ {RECOVERY_THRESHOLD_LOW:.0%} Recovery", "value": "days_50"}
+                ],
+                value="average",
+                className="mb-4 p-10 form-select form-select-sm",
+                style={"width": "90%", "margin": "0 auto"} 
+            ),
+            html.Div("Line Chart Granularity:", className="fw text-light mb-2", style={"fontSize": "0.8vw", "width": "90%", "margin": "0 auto", "textAlign": "left"}), 
+            dbc.Select(
+                id="time-granularity",
+                options=[
+                    {"label": "Monthly", "value": "monthly"},
+                    {"label": "Weekly", "value": "weekly"},
+                    {"label": "Quarterly", "value": "quarterly"},
+                    {"label": "Daily", "value": DAILY}
+                ] + [{"label": granularity_label(view), "value": view} for view in ROLLING_VIEWS],
+                value="monthly",
+                className="mb-4 p-10 form-select form-select-sm",
+                style={"width": "90%", "margin": "0 auto"}  
+            ),
+
+            html.Hr(className="mb-4"),
+
+
+            # Tooltip and Info Section
+            html.Div(
+                [
+                    # Question Section
+                    html.Div(
+                        [
+                            html.Span(
+                                "Question:", 
+                                style={"fontSize": "0.85vw", "color": "white", "marginRight": "10px"}
+                            ),
+                            html.Div(
+                                id="info-icon",
+                                children=[
+                                    html.Span(
+                                        dcc.Markdown(
+                                            """
+                                            <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 512 512" style="width: 1.05em; height: 1.05em; color: #bbbbbb; cursor: pointer;">
+                                                <path fill="currentColor" d="M256 512A256 256 0 1 0 256 0a256 256 0 1 0 0 512zM169.8 165.3c7.9-22.3 29.1-37.3 52.8-37.3l58.3 0c34.9 0 63.1 28.3 63.1 63.1c0 22.6-12.1 43.5-31.7 54.8L280 264.4c-.2 13-10.9 23.6-24 23.6c-13.3 0-24-10.7-24-24l0-13.5c0-8.6 4.6-16.5 12.1-20.8l44.3-25.4c4.7-2.7 7.6-7.7 7.6-13.1c0-8.4-6.8-15.1-15.1-15.1l-58.3 0c-3.4 0-6.4 2.1-7.5 5.3l-.4 1.2c-4.4 12.5-18.2 19-30.6 14.6s-19-18.2-14.6-30.6l.4-1.2zM224 352a32 32 0 1 1 64 0 32 32 0 1 1 -64 0z"/>
+                                            </svg>
+                                            """,
+                                            dangerously_allow_html=True,
+                                        ),
+                                        style={"display": "inline-block"}
+                                    )
+                                ],
+                            ),
+                            dbc.Tooltip(
+                                "The MTA Dashboard provides insights into the recovery trends of public transit services in New York City after the COVID-19 pandemic. Explore metrics like recovery percentages and service performance over time to gain a deeper understanding of post-pandemic transit recovery.",
+                                target="info-icon",
+                                placement="right",
+                                className="custom-tooltip"
+                            ),
+                        ],
+                        style={"display": "flex", "alignItems": "center", "marginBottom": "10px"}
+                    ),
+                    # Link Section
+                    html.Div(
+                        [
+                            html.Span(
+                                "More info:", 
+                                style={"fontSize": "0.85vw", "color": "white", "marginRight": "10px"}
+                            ),
+                            html.A(
+                                href="https://new.mta.info",
+                                target="_blank",
+                                children=[
                                     dcc.Markdown(
                                         """
                                         <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 512 512" style="width: 1.05em; height: 1.05em; color: #bbbbbb; cursor: pointer;">
-                                            <path fill="currentColor" d="M256 512A256 256 0 1 0 256 0a256 256 0 1 0 0 512zM169.8 165.3c7.9-22.3 29.1-37.3 52.8-37.3l58.3 0c34.9 0 63.1 28.3 63.1 63.1c0 22.6-12.1 43.5-31.7 54.8L280 264.4c-.2 13-10.9 23.6-24 23.6c-13.3 0-24-10.7-24-24l0-13.5c0-8.6 4.6-16.5 12.1-20.8l44.3-25.4c4.7-2.7 7.6-7.7 7.6-13.1c0-8.4-6.8-15.1-15.1-15.1l-58.3 0c-3.4 0-6.4 2.1-7.5 5.3l-.4 1.2c-4.4 12.5-18.2 19-30.6 14.6s-19-18.2-14.6-30.6l.4-1.2zM224 352a32 32 0 1 1 64 0 32 32 0 1 1 -64 0z"/>
+                                            <path fill="currentColor" d="M320 0c-17.7 0-32 14.3-32 32s14.3 32 32 32l82.7 0L201.4 265.4c-12.5 12.5-12.5 32.8 0 45.3s32.8 12.5 45.3 0L448 109.3l0 82.7c0 17.7 14.3 32 32 32s32-14.3 32-32l0-160c0-17.7-14.3-32-32-32L320 0zM80 32C35.8 32 0 67.8 0 112L0 432c0 44.2 35.8 80 80 80l320 0c44.2 0 80-35.8 80-80l0-112c0-17.7-14.3-32-32-32s-32 14.3-32 32l0 112c0 8.8-7.2 16-16 16L80 448c-8.8 0-16-7.2-16-16l0-320c0-8.8 7.2-16 16-16l112 0c17.7 0 32-14.3 32-32s-14.3-32-32-32L80 32z"/>
                                         </svg>
                                         """,
                                         dangerously_allow_html=True,
                                     ),
-                                    style={"display": "inline-block"}
-                                )
-                            ],
-                        ),
-                        dbc.Tooltip(
-                            "The MTA Dashboard provides insights into the recovery trends of public transit services in New York City after the COVID-19 pandemic. Explore metrics like recovery percentages and service performance over time to gain a deeper understanding of post-pandemic transit recovery.",
-                            target="info-icon",
-                            placement="right",
-                            className="custom-tooltip"
-                        ),
-                    ],
-                    style={"display": "flex", "alignItems": "center", "marginBottom": "10px"}
-                ),
-                # Link Section
-                html.Div(
-                    [
-                        html.Span(
-                            "More info:", 
-                            style={"fontSize": "0.85vw", "color": "white", "marginRight": "10px"}
-                        ),
-                        html.A(
-                            href="https://new.mta.info",
-                            target="_blank",
-                            children=[
-                                dcc.Markdown(
-                                    """
-                                    <svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 512 512" style="width: 1.05em; height: 1.05em; color: #bbbbbb; cursor: pointer;">
-                                        <path fill="currentColor" d="M320 0c-17.7 0-32 14.3-32 32s14.3 32 32 32l82.7 0L201.4 265.4c-12.5 12.5-12.5 32.8 0 45.3s32.8 12.5 45.3 0L448 109.3l0 82.7c0 17.7 14.3 32 32 32s32-14.3 32-32l0-160c0-17.7-14.3-32-32-32L320 0zM80 32C35.8 32 0 67.8 0 112L0 432c0 44.2 35.8 80 80 80l320 0c44.2 0 80-35.8 80-80l0-112c0-17.7-14.3-32-32-32s-32 14.3-32 32l0 112c0 8.8-7.2 16-16 16L80 448c-8.8 0-16-7.2-16-16l0-320c0-8.8 7.2-16 16-16l112 0c17.7 0 32-14.3 32-32s-14.3-32-32-32L80 32z"/>
-                                    </svg>
-                                    """,
-                                    dangerously_allow_html=True,
-                                ),
-                            ],
-                        ),
-                    ],
-                    style={"display": "flex", "alignItems": "center"}
-                ),
-            ],
-            className="mb-4",
-            style={"width": "90%", "margin": "0 auto"}
-        )
+                                ],
+                            ),
+                        ],
+                        style={"display": "flex", "alignItems": "center"}
+                    ),
+                ],
+                className="mb-4",
+                style={"width": "90%", "margin": "0 auto"}
+            )
 
 
 
-        
-    ],
-    width=2,
-    className="bg-primary text-light p-3 sticky-top",
-    style={"height": "100vh", "overflowY": "auto"}
-)
+
+        ],
+        width=2,
+        className="bg-primary text-light p-3 sticky-top",
+        style={"height": "100vh", "overflowY": "auto"}
+    )
 
 
 
 
 # Layout for the app
-app.layout = dbc.Container(
-    dbc.Row(
-        [
-            # Sidebar
-            sidebar,
+def build_layout():
+    # Dash calls this on every page load, so the year / date / service choices follow a refresh or ingest
+    return layout_for(current_snapshot().version, CLIENTSIDE_HIGHLIGHT)
+
+
+@functools.lru_cache(maxsize=1)
+def layout_for(version, clientside_highlight):
+    # Built once per snapshot version. Initial figures: every service over all years, straight from the aggregate cube
+    services = current_snapshot().services
+    aggregate_cube = current_snapshot().aggregate_cube
+    overall = aggregate_cube.year("All")
+    summary_metrics = overall.summary["average"]
+    yearly_avg = aggregate_cube.yearly_avg
+    monthly_avg_b = overall.month_name
+    day_of_week_avg = overall.day_of_week
+
+    layout = dbc.Container(
+        dbc.Row(
+            [
+                # Sidebar
+                build_sidebar(),
 
-            # Main content
-            dbc.Col(
-                [
-                    # Top Section: Summary Metrics
-                    dbc.Row(
-                        id="metrics-row",  # ID for dynamic metric change
-                        children = [
-                            dbc.Col(
-                                html.Div(
-                                    [
-                                        html.H3( f"{value :.1%}" , className="text-center mb-0", style={"fontSize": "1.7vw"} ),
-                                        html.Small(metric_name, className="text-muted text-center d-block", style={"fontSize": "0.75vw"})
-                                    ],
-                                    className="p-3 bg-primary text-light rounded shadow-sm"
-                                ),
-                                style={"flex": "1 1 calc(100% / 7 - 10px)"}
-                            )
-                            for metric_name, value  in summary_metrics.items()
-                        ],
-                        className="g-3 mb-3 d-flex justify-content-between"
-                    ),
+                # Main content
+                dbc.Col(
+                    [
+                        # Top Section: Summary Metrics
+                        dbc.Row(
+                            id="metrics-row",  # ID for dynamic metric change
+                            children = [
+                                dbc.Col(
+                                    html.Div(
+                                        [
+                                            html.H3( f"{value :.1%}" , className="text-center mb-0", style={"fontSize": "1.7vw"} ),
+                                            html.Small(metric_name, className="text-muted text-center d-block", style={"fontSize": "0.75vw"})
+                                        ],
+                                        className="p-3 bg-primary text-light rounded shadow-sm"
+                                    ),
+                                    style=KPI_CARD_STYLE
+                                )
+                                for metric_name, value  in summary_metrics.items()
+                            ],
+                            className="g-3 mb-3 d-flex justify-content-between"
+                        ),
 
-                    # Middle Section: Charts
-                    dbc.Row(
-                        [
-                            dbc.Col(
-                                html.Div(
-                                    dcc.Graph(
-                                        id='bar-chart',
-                                        figure=px.bar(
-                                            y=list(summary_metrics.keys()),
-                                            x=list(summary_metrics.values()),
-                                            title="Average Daily Recovery by Service",
-                                            orientation='h'
-                                        ).update_layout(
-                                             plot_bgcolor="rgba(0,0,0,0)",
-                                             paper_bgcolor="rgba(0,0,0,0)",
-                                             font=dict(size=11),
-                                             showlegend=False,
-                                             title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
-                                             margin=dict(l=20, r=20, t=35, b=20),
-                                             xaxis_title=None, yaxis_title=None,
-                                             xaxis=dict( automargin=True, tickformat="0%", showgrid=False, zeroline=False ),
-                                             yaxis=dict( ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
-                                             template= "plotly_dark"
-                                         ).update_traces( marker=dict(line=dict(width=0)), marker_color= default_color ),
-                                        style={"height": "48vh", "width": "100%"}
+                        # Middle Section: Charts
+                        dbc.Row(
+                            [
+                                dbc.Col(
+                                    html.Div(
+                                        dcc.Graph(
+                                            id='bar-chart',
+                                            figure=px.bar(
+                                                y=list(summary_metrics.keys()),
+                                                x=list(summary_metrics.values()),
+                                                title="Average Daily Recovery by Service",
+                                                orientation='h'
+                                            ).update_layout(
+                                                 plot_bgcolor="rgba(0,0,0,0)",
+                                                 paper_bgcolor="rgba(0,0,0,0)",
+                                                 font=dict(size=11),
+                                                 showlegend=False,
+                                                 title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
+                                                 margin=dict(l=20, r=20, t=35, b=20),
+                                                 xaxis_title=None, yaxis_title=None,
+                                                 xaxis=dict( automargin=True, tickformat="0%", showgrid=False, zeroline=False ),
+                                                 yaxis=dict( ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
+                                                 template= "plotly_dark"
+                                             ).update_traces( marker=dict(line=dict(width=0)), marker_color= default_color ),
+                                            style={"height": "48vh", "width": "100%"}
+                                        ),
+                                        className="p-3 bg-primary rounded shadow-sm"
                                     ),
-                                    className="p-3 bg-primary rounded shadow-sm"
+                                    width=4
                                 ),
-                                width=4
-                            ),
 
-                            dbc.Col(
-                                html.Div(
-                                    dcc.Graph(
-                                        id='line-chart',
-                                        figure=px.line(
-                                            monthly_avg.melt(id_vars=["Month"], value_vars=[
-                                                "Subways: % of Comparable Pre-Pandemic Day",
-                                                "Buses: % of Comparable Pre-Pandemic Day",
-                                                "LIRR: % of Comparable Pre-Pandemic Day",
-                                                "Metro-North: % of Comparable Pre-Pandemic Day",
-                                                "Access-A-Ride: % of Comparable Pre-Pandemic Day",
-                                                "Bridges and Tunnels: % of Comparable Pre-Pandemic Day",
-                                                "Staten Island Railway: % of Comparable Pre-Pandemic Day"
-                                            ], var_name="Transport Service", value_name="Percentage"),
-                                            x="Month",
-                                            y="Percentage",
-                                            title="Monthly Recovery Trends by Service"
-                                        ).update_layout(
-                                            plot_bgcolor="rgba(0,0,0,0)",
-                                            paper_bgcolor="rgba(0,0,0,0)",
-                                            showlegend=False,
-                                            font=dict(size=11),
-                                            title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
-                                            margin=dict(l=20, r=20, t=35, b=20),
-                                            xaxis_title=None, yaxis_title=None,
-                                            xaxis=dict( automargin=True, showgrid=False, zeroline=False ),
-                                            yaxis=dict( automargin=True, tickformat="0%", showgrid=False, zeroline=False ),
-                                            template= "plotly_dark",
-                                            shapes=[ dict( type="line", x0=0, x1=1, xref="paper", y0=1, y1=1, yref="y", line=dict( color="grey", width=2, dash="dot" )  ) ]
-                                        ).update_traces(line=dict(width=2.65,  color= default_color )),
-                                        style={"height": "48vh", "width": "100%"}
+                                dbc.Col(
+                                    html.Div(
+                                        dcc.Graph(
+                                            id='line-chart',
+                                            # The same trace-dict figure (and figure cache entry) as the first callback
+                                            figure=cached_output("line-chart", build_line_chart, "All", services.default(), "monthly"),
+                                            style={"height": "48vh", "width": "100%"}
+                                        ),
+                                        className="p-3 bg-primary rounded shadow-sm"
                                     ),
-                                    className="p-3 bg-primary rounded shadow-sm"
-                                ),
-                                width=8
-                            )
-                        ],
-                        className="g-3 mb-3"
-                    ),
+                                    width=8
+                                )
+                            ],
+                            className="g-3 mb-3"
+                        ),
 
-                    # Bottom Section: Additional Charts
-                    dbc.Row(
-                        [
-                            dbc.Col(
-                                html.Div(
-                                    dcc.Graph(
-                                        id='yearly-breakdown',
-                                        figure=px.bar(
-                                            yearly_avg,
-                                            x='Subways: % of Comparable Pre-Pandemic Day',
-                                            y='Year',
-                                            orientation='h',
-                                            title="Yearly Average Recovery"
-                                        ).update_traces(
-                                             marker=dict(line=dict(width=0)),
-                                             marker_color= default_color
-                                        ).update_layout(
-                                             plot_bgcolor="rgba(0,0,0,0)",
-                                             paper_bgcolor="rgba(0,0,0,0)",
-                                             font=dict(size=11),
-                                             title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
-                                             margin=dict(l=20, r=20, t=35, b=20),
-                                             xaxis_title=None, yaxis_title=None,
-                                             xaxis=dict( automargin=True, tickformat="0%",  showgrid=False, zeroline=False ),
-                                             yaxis=dict( type="category", ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
-                                             template= "plotly_dark"
-                                         ),
-                                        style={"height": "21vh", "width": "100%"}
-                                        
+                        # Bottom Section: Additional Charts
+                        dbc.Row(
+                            [
+                                dbc.Col(
+                                    html.Div(
+                                        dcc.Graph(
+                                            id='yearly-breakdown',
+                                            figure=px.bar(
+                                                yearly_avg,
+                                                x=services.columns[0],
+                                                y='Year',
+                                                orientation='h',
+                                                title="Yearly Average Recovery"
+                                            ).update_traces(
+                                                 marker=dict(line=dict(width=0)),
+                                                 marker_color= default_color
+                                            ).update_layout(
+                                                 plot_bgcolor="rgba(0,0,0,0)",
+                                                 paper_bgcolor="rgba(0,0,0,0)",
+                                                 font=dict(size=11),
+                                                 title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
+                                                 margin=dict(l=20, r=20, t=35, b=20),
+                                                 xaxis_title=None, yaxis_title=None,
+                                                 xaxis=dict( automargin=True, tickformat="0%",  showgrid=False, zeroline=False ),
+                                                 yaxis=dict( type="category", ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
+                                                 template= "plotly_dark"
+                                             ),
+                                            style={"height": "21vh", "width": "100%"}
+
+                                        ),
+                                        className="p-3 bg-primary rounded shadow-sm"
                                     ),
-                                    className="p-3 bg-primary rounded shadow-sm"
+                                    width=4
                                 ),
-                                width=4
-                            ),
-                            dbc.Col(
-                                html.Div(
-                                    dcc.Graph(
-                                        id='monthly-breakdown',
-                                        figure=px.bar(
-                                            monthly_avg_b,
-                                            x='Month_Name',
-                                            y='Subways: % of Comparable Pre-Pandemic Day',
-                                            title="Monthly Average Recovery"
-                                        ).update_traces(
-                                             marker=dict(line=dict(width=0)),
-                                             marker_color= default_color
-                                        ).update_layout(
-                                             plot_bgcolor="rgba(0,0,0,0)",
-                                             paper_bgcolor="rgba(0,0,0,0)",
-                                             font=dict(size=11),
-                                             title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
-                                             margin=dict(l=20, r=20, t=35, b=20),
-                                             xaxis_title=None, yaxis_title=None,
-                                             xaxis=dict( ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
-                                             yaxis=dict( automargin=True, tickformat="0%",  showgrid=False, zeroline=False ),
-                                             template= "plotly_dark"
-                                         ),
-                                        style={"height": "21vh", "width": "100%"}
+                                dbc.Col(
+                                    html.Div(
+                                        dcc.Graph(
+                                            id='monthly-breakdown',
+                                            figure=px.bar(
+                                                monthly_avg_b,
+                                                x='Month_Name',
+                                                y=services.columns[0],
+                                                title="Monthly Average Recovery"
+                                            ).update_traces(
+                                                 marker=dict(line=dict(width=0)),
+                                                 marker_color= default_color
+                                            ).update_layout(
+                                                 plot_bgcolor="rgba(0,0,0,0)",
+                                                 paper_bgcolor="rgba(0,0,0,0)",
+                                                 font=dict(size=11),
+                                                 title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
+                                                 margin=dict(l=20, r=20, t=35, b=20),
+                                                 xaxis_title=None, yaxis_title=None,
+                                                 xaxis=dict( ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
+                                                 yaxis=dict( automargin=True, tickformat="0%",  showgrid=False, zeroline=False ),
+                                                 template= "plotly_dark"
+                                             ),
+                                            style={"height": "21vh", "width": "100%"}
+                                        ),
+                                        className="p-3 bg-primary rounded shadow-sm"
                                     ),
-                                    className="p-3 bg-primary rounded shadow-sm"
+                                    width=4
                                 ),
-                                width=4
-                            ),
-                            dbc.Col(
-                                html.Div(
-                                    dcc.Graph(
-                                        id='day-of-week-breakdown',
-                                        figure=px.bar(
-                                            day_of_week_avg,
-                                            x='Day_of_Week',
-                                            y='Subways: % of Comparable Pre-Pandemic Day',
-                                            title="Day of the Week Average Recovery"
-                                        ).update_traces(
-                                             marker=dict(line=dict(width=0)),
-                                             marker_color= default_color
-                                        ).update_layout(
-                                             plot_bgcolor="rgba(0,0,0,0)",
-                                             paper_bgcolor="rgba(0,0,0,0)",
-                                             font=dict(size=11),
-                                             title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
-                                             margin=dict(l=20, r=20, t=35, b=20),
-                                             xaxis_title=None, yaxis_title=None,
-                                             xaxis=dict( ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
-                                             yaxis=dict( automargin=True, tickformat="0%",  showgrid=False, zeroline=False ),
-                                             template= "plotly_dark"
-                                         ),
-                                        style={"height": "21vh", "width": "100%"}
+                                dbc.Col(
+                                    html.Div(
+                                        dcc.Graph(
+                                            id='day-of-week-breakdown',
+                                            figure=px.bar(
+                                                day_of_week_avg,
+                                                x='Day_of_Week',
+                                                y=services.columns[0],
+                                                title="Day of the Week Average Recovery"
+                                            ).update_traces(
+                                                 marker=dict(line=dict(width=0)),
+                                                 marker_color= default_color
+                                            ).update_layout(
+                                                 plot_bgcolor="rgba(0,0,0,0)",
+                                                 paper_bgcolor="rgba(0,0,0,0)",
+                                                 font=dict(size=11),
+                                                 title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
+                                                 margin=dict(l=20, r=20, t=35, b=20),
+                                                 xaxis_title=None, yaxis_title=None,
+                                                 xaxis=dict( ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
+                                                 yaxis=dict( automargin=True, tickformat="0%",  showgrid=False, zeroline=False ),
+                                                 template= "plotly_dark"
+                                             ),
+                                            style={"height": "21vh", "width": "100%"}
+                                        ),
+                                        className="p-3 bg-primary rounded shadow-sm"
                                     ),
-                                    className="p-3 bg-primary rounded shadow-sm"
-                                ),
-                                width=4
-                            )
-                        ],
-                        className="g-3"
-                    )
-                ],
-                width=10,
-                className= "pt-5 pb-5 ps-5 pe-5" 
-            )
-        ],
-    ),
-    fluid=True,
-    className="vh-100"
-)
+                                    width=4
+                                )
+                            ],
+                            className="g-3"
+                        )
+                    ],
+                    width=10,
+                    className= "pt-5 pb-5 ps-5 pe-5" 
+                )
+            ],
+        ),
+        fluid=True,
+        className="vh-100"
+    )
 
-# New Call Back                                                             ------------------------------------------------------------------------------------------------------------- 
+    if clientside_highlight:
+        # Per-year series for every service, read by the in-browser highlight callback
+        layout.children = [layout.children, dcc.Store(id="series-store")]
+    return layout
 
-@app.callback(
-    [
-        Output("metrics-row", "children"),
-        Output("bar-chart", "figure"),
-        Output("line-chart", "figure"),
-        Output("yearly-breakdown", "figure"),
-        Output("monthly-breakdown", "figure"),
-        Output("day-of-week-breakdown", "figure")
-    ],
-    [
-        Input("year-selector", "value"),
-        Input("metric-type", "value"),
-        Input("service-selector", "value"),
-        Input("time-granularity", "value")
-    ]
-)
-def update_dashboard(selected_year, selected_metric, selected_service, granularity):
-    
-    # Filter the dataset by the selected year
-    df_filtered = df if selected_year == "All" else df[df['Year'] == int(selected_year) ]
-    
-    summary_metrics = {
-    "Subways": df_filtered["Subways: % of Comparable Pre-Pandemic Day"].mean(),
-    "Buses": df_filtered["Buses: % of Comparable Pre-Pandemic Day"].mean(),
-    "LIRR": df_filtered["LIRR: % of Comparable Pre-Pandemic Day"].mean(),
-    "Metro North": df_filtered["Metro-North: % of Comparable Pre-Pandemic Day"].mean(),
-    "Access-A": df_filtered["Access-A-Ride: % of Comparable Pre-Pandemic Day"].mean(),
-    "Bridges and Tunnels": df_filtered["Bridges and Tunnels: % of Comparable Pre-Pandemic Day"].mean(),
-    "Staten Island Railway": df_filtered["Staten Island Railway: % of Comparable Pre-Pandemic Day"].mean()
-    }
 
-    sorted_summary_metrics = dict(sorted(summary_metrics.items(), key=lambda item: item[1] ))
+# Figure builders                                                           ------------------------------------------------------------------------------------------------------------- 
 
-    selected_column = service_mapping[selected_service]
-    
-    days_100_recovery = {
-    "Subways": (df_filtered["Subways: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
-    "Buses": (df_filtered["Buses: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
-    "LIRR": (df_filtered["LIRR: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
-    "Metro North": (df_filtered["Metro-North: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
-    "Access-A": (df_filtered["Access-A-Ride: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
-    "Bridges and Tunnels": (df_filtered["Bridges and Tunnels: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
-    "Staten Island Railway": (df_filtered["Staten Island Railway: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
-    }
+# KPI types shown as a percentage; the threshold day counts are plain integers
+PERCENT_METRICS = {"average", "median"} | {quantile_name(q) for q in SUMMARY_QUANTILES}
 
-    days_below_50_recovery = {
-    "Subways": (df_filtered["Subways: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
-    "Buses": (df_filtered["Buses: % of Comparable Pre-Pandemic Day"] <= 0.5).sum(),
-    "LIRR": (df_filtered["LIRR: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
-    "Metro North": (df_filtered["Metro-North: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
-    "Access-A": (df_filtered["Access-A-Ride: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
-    "Bridges and Tunnels": (df_filtered["Bridges and Tunnels: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
-    "Staten Island Railway": (df_filtered["Staten Island Railway: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
-    }
 
-    # Yearly average
-    yearly_avg = df.groupby('Year').agg({selected_column: 'mean'}).reset_index()
+# KPI shown for a date range without loaded days, or a service that reported none in it
+MISSING_METRIC = "–"
 
-    # Monthly average (sort by month order)
-    monthly_avg_b = df_filtered.groupby('Month_Name').agg({selected_column: 'mean'}).reset_index()
-    month_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    monthly_avg_b['Month_Name'] = pd.Categorical(monthly_avg_b['Month_Name'], categories=month_order, ordered=True)
-    monthly_avg_b = monthly_avg_b.sort_values('Month_Name')
 
-    # Day-of-week average (sort by weekday order)
-    day_of_week_avg = df_filtered.groupby('Day_of_Week').agg({selected_column: 'mean'}).reset_index()
-    day_of_week_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    day_of_week_avg['Day_of_Week'] = pd.Categorical(day_of_week_avg['Day_of_Week'], categories=day_of_week_order, ordered=True)
-    day_of_week_avg = day_of_week_avg.sort_values('Day_of_Week')
+def summary_for(selected_year, selected_metric="average", start_date=None, end_date=None):
+    # A picked date range overrides the year for the KPIs and is answered from the prefix sums, or with a query
+    # like the year's summaries when those come from MTA_QUERY_BACKEND's database
+    with span("filter"):
+        if start_date or end_date:
+            current = current_snapshot()
+            lo, hi = current.date_index.positions(start_date, end_date)
+            if lo == hi:
+                # Start after end, or no loaded day in between: nothing to count either
+                return dict.fromkeys(current.services.mapping, float("nan"))
+            if isinstance(current.aggregate_cube, SqlAggregateCube):
+                return current.aggregate_cube.range_summary(start_date, end_date, selected_metric)
+            return current.prefix_sums.summary(start_date, end_date, selected_metric)
+        return current_snapshot().aggregate_cube.year(selected_year).summary[selected_metric]
 
 
-    color = service_colors[selected_service] 
+def format_metric(value, selected_metric):
+    if pd.isna(value):
+        return MISSING_METRIC
+    return f"{value:.1%}" if selected_metric in PERCENT_METRICS else f"{value}"
 
 
-    # --- Changing  metrics
-    
-    if selected_metric == "average":
-        metrics = summary_metrics
-    elif selected_metric == "days_100":
-        metrics = days_100_recovery
-    elif selected_metric == "days_50":
-        metrics = days_below_50_recovery   
-
-    updated_metrics_row= [
+def build_metrics_row(selected_year, selected_metric, selected_service, start_date=None, end_date=None):
+    metrics = summary_for(selected_year, selected_metric, start_date, end_date)
+    service_colors = current_snapshot().services.colors
+
+    return [
         dbc.Col(
             html.Div(
                 [
@@ -579,7 +793,7 @@ def update_dashboard(selected_year, selected_metric, selected_service, granulari
                                     "fontSize": "1.5vw" if metric_name == selected_service else "0px"
                                 }
                             ),
-                            f"{value:.1%}" if selected_metric == "average" else f"{value}" 
+                            format_metric(value, selected_metric)
                         ],
                         className="text-center mb-0",
                         style={"fontSize": "1.5vw"}
@@ -588,25 +802,34 @@ def update_dashboard(selected_year, selected_metric, selected_service, granulari
                 ],
                 className="p-3 bg-primary text-light rounded shadow-sm"
             ),
-            style={"flex": "1 1 calc(100% / 7 - 10px)"}
+            style=KPI_CARD_STYLE
         )
         for metric_name, value in metrics.items()
     ]
 
-    
-    # --- Updating  bar chart
-    
-    colors = ["#484E54" if service != selected_service else service_colors[selected_service]
-              for service in sorted_summary_metrics.keys()]
 
-    updated_bar_chart = px.bar(
-        y= sorted_summary_metrics.keys(),
-        x= sorted_summary_metrics.values(),
+def sorted_summary_metrics(selected_year, start_date=None, end_date=None):
+    summary_metrics = summary_for(selected_year, "average", start_date, end_date)
+    return dict(sorted(summary_metrics.items(), key=lambda item: item[1] ))
+
+
+def bar_chart_colors(selected_year, selected_service, start_date=None, end_date=None):
+    service_colors = current_snapshot().services.colors
+    return ["#484E54" if service != selected_service else service_colors[selected_service]
+            for service in sorted_summary_metrics(selected_year, start_date, end_date).keys()]
+
+
+def build_bar_chart(selected_year, selected_service, start_date=None, end_date=None):
+    sorted_metrics = sorted_summary_metrics(selected_year, start_date, end_date)
+
+    return px.bar(
+        y= sorted_metrics.keys(),
+        x= sorted_metrics.values(),
         title="Average Daily Recovery by Service",
         orientation='h'
     ).update_traces(
         marker=dict(line=dict(width=0)),
-        marker_color=colors,
+        marker_color=bar_chart_colors(selected_year, selected_service, start_date, end_date),
         hovertemplate="Service: %{y}<br>Value: %{x:.1%}<extra></extra>"
     ).update_layout(
          plot_bgcolor="rgba(0,0,0,0)",
@@ -622,83 +845,198 @@ def update_dashboard(selected_year, selected_metric, selected_service, granulari
      )
 
 
-    # --- Updating line chart
-    if granularity == "monthly":
-        data = df_filtered.groupby('Month').mean(numeric_only=True).reset_index()
-        data['Month'] = data['Month'].dt.to_timestamp()
-        x_axis = "Month"
-    
-    elif granularity == "weekly":
-        data = df_filtered.groupby('Week').mean(numeric_only=True).reset_index()
-        data['Week'] = data['Week'].dt.to_timestamp()
-        x_axis = "Week"
-    
-    elif granularity == "quarterly":
-        data = df_filtered.groupby('Quarter').mean(numeric_only=True).reset_index()
-        data['Quarter'] = data['Quarter'].dt.to_timestamp()
-        x_axis = "Quarter"
-    
-    melted_data = data.melt(
-        id_vars=[x_axis],
-        value_vars=list(service_mapping.values()),
-        var_name="Transport Service",
-        value_name="Percentage"
+def daily_positions(selected_year, window=None):
+    # Row offsets of the year's (or every) day, optionally cut to a (start, end) window
+    current = current_snapshot()
+    key = year_key(selected_year)
+    lo, hi = (0, len(current.df)) if key == "All" else current.date_index.year_offsets.get(key, (0, 0))
+    if window is not None:
+        start, end = current.date_index.positions(*window)
+        lo, hi = max(lo, start), max(max(lo, start), min(hi, end))
+    return lo, hi
+
+
+def daily_rows(selected_year, window=None):
+    # The same days as a slice of the Date-sorted frame
+    lo, hi = daily_positions(selected_year, window)
+    return current_snapshot().df.iloc[lo:hi]
+
+
+def relayout_window(relayout_data):
+    # Visible x range after a zoom / pan, widened by half its span on each side so short pans need no refetch
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        start, end = relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    elif "xaxis.range" in relayout_data:
+        start, end = relayout_data["xaxis.range"][:2]
+    else:
+        return None
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    padding = (end - start) / 2
+    return start - padding, end + padding
+
+
+def build_line_chart(selected_year, selected_service, granularity, window=None):
+    # About one point per pixel of chart width, or fewer when that many per service can't fit
+    # MTA_FIGURE_BYTE_BUDGET; halved until the figure JSON fits
+    max_points = points_within(FIGURE_BYTE_BUDGET, len(current_snapshot().services), LINE_CHART_WIDTH)
+    return fit_budget(
+        lambda max_points: line_chart_figure(selected_year, selected_service, granularity, max_points, window),
+        max_points, FIGURE_BYTE_BUDGET
     )
-    
-    melted_data["Short Name"] = melted_data["Transport Service"].map(service_short_names)
 
-    selected_data = melted_data[melted_data["Transport Service"] == selected_column]
-    other_data = melted_data[melted_data["Transport Service"] != selected_column]
-    reordered_data = pd.concat([other_data, selected_data])  # Selected service last
-    
-    updated_line_chart = px.line(
-        reordered_data,
-        x=x_axis,
-        y="Percentage",
-        color="Transport Service",
-        title=f"{granularity.capitalize()} Recovery Trends by Service",
-        custom_data=["Short Name"]  # Add short names for hovertemplate
-    )
-    
-    updated_line_chart.for_each_trace(lambda trace: trace.update(
-            line=dict(
-                width= 3.3 , # if trace.name == selected_column else 2.65,
-                color=service_colors_line_chart[trace.name] if trace.name == selected_column else default_color
-            ),
-            hovertemplate=(
-                "Service: %{customdata[0]}<br>"
-                "Date: %{x}<br>"
-                "Value: %{y:.1%}<extra></extra>"
-            )
-        )
-    )
-    
-    updated_line_chart.update_layout(
+
+# px's render_mode="auto" threshold: above this many points in total the traces are drawn with WebGL
+WEBGL_POINTS = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def line_chart_template():
+    # Layout every line chart shares, plotly_dark resolved into JSON once; line_chart_figure only sets title / uirevision
+    template = go.Figure(layout=dict(
         plot_bgcolor="rgba(0,0,0,0)",
         paper_bgcolor="rgba(0,0,0,0)",
         showlegend=False,
         font=dict(size=11),
         title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y=1),
         margin=dict(l=20, r=20, t=35, b=20),
-        xaxis_title=None,
-        yaxis_title=None,
-        xaxis=dict(automargin=True, showgrid=False, zeroline=False),
+        xaxis=dict(type="date", automargin=True, showgrid=False, zeroline=False),
         yaxis=dict(automargin=True, tickformat="0%", showgrid=False, zeroline=False),
         template="plotly_dark",
-        shapes=[dict(type="line", x0=0, x1=1, xref="paper", y0=1, y1=1, yref="y", line=dict(color="grey", width=2, dash="dot"))]
-    )
+        shapes=[dict(type="line", x0=0, x1=1, xref="paper", y0=1, y1=1, yref="y", line=dict(color="grey", width=2, dash="dot"))],
+    ))
+    return template.to_plotly_json()["layout"]
+
+
+def line_chart_figure(selected_year, selected_service, granularity, max_points, window=None):
+    # Traces straight from the wide per-service columns, selected service last so it draws on top
+    services = current_snapshot().services
+    selected_column = services.mapping[selected_service]
+
+    with span("filter"):
+        if granularity in ROLLING_VIEWS:
+            # Rows of the precomputed (days x services) view, cut like the daily rows; windows reach into prior years
+            current = current_snapshot()
+            lo, hi = daily_positions(selected_year, window)
+            rolling = current.rolling_windows.series(*ROLLING_VIEWS[granularity])[lo:hi]
+            x_values = current.date_index.dates[lo:hi]
+            values = dict(zip(services.columns, rolling.T))
+        else:
+            if granularity == DAILY:
+                # Straight from the frame; a zoomed window is re-thinned at full chart resolution
+                x_axis = "Date"
+                data = daily_rows(selected_year, window)
+            else:
+                x_axis = GRANULARITY_COLUMNS[granularity]
+                data = current_snapshot().aggregate_cube.year(selected_year).trends[granularity]
+            x_values = data[x_axis].to_numpy()
+            values = dict(zip(services.columns, ratio_block(data, services.columns).T))  # one block, not a Series per service
+        columns = [column for column in services.columns if column != selected_column] + [selected_column]
+        x_values = x_values.astype("datetime64[ns]")
+        extensions = forecast_extensions(selected_year, granularity, window)
+
+    series, projected = [], {}
+    with span("downsample"):
+        for column in columns:
+            y_values = values[column]
+            if len(x_values) > max_points:
+                keep = downsample_indices(x_values.astype("int64"), y_values, max_points, DOWNSAMPLE_METHOD)
+                series.append((column, x_values[keep], y_values[keep]))
+            else:
+                series.append((column, x_values, y_values))
+            if column in extensions:
+                x_projected, y_projected = extensions[column]
+                if len(x_projected) > max_points:
+                    keep = downsample_indices(x_projected.astype("int64"), y_projected, max_points, DOWNSAMPLE_METHOD)
+                    x_projected, y_projected = x_projected[keep], y_projected[keep]
+                projected[column] = (x_projected, y_projected)
+
+    with span("encode"):
+        # x / y go out as base64 typed arrays: epoch-ms dates and float32 ratios; an unthinned x is encoded once
+        shared_x = date_array(x_values) if len(x_values) <= max_points else None
+        webgl = granularity in DAILY_VIEWS or sum(len(y_values) for _, _, y_values in series) > WEBGL_POINTS
+        traces = []
+        for column, x_column, y_values in series:
+            color = services.line_colors[column] if column == selected_column else default_color
+            traces.append({
+                "type": "scattergl" if webgl else "scatter",
+                "mode": "lines",
+                "name": column,
+                "x": shared_x if shared_x is not None else date_array(x_column),
+                "y": typed_array(y_values, "f4"),
+                "line": {"color": color, "width": 3.3},
+                "hovertemplate": (
+                    f"Service: {services.short_names[column]}<br>"  # in the template, not repeated per point as customdata
+                    "Date: %{x}<br>"
+                    "Value: %{y:.1%}<extra></extra>"
+                ),
+            })
+            if column in projected:
+                # Same name as the observed trace, so the browser-side highlight recolors / reorders both
+                x_projected, y_projected = projected[column]
+                traces.append({
+                    "type": "scattergl" if webgl else "scatter",
+                    "mode": "lines",
+                    "name": column,
+                    "x": date_array(x_projected),
+                    "y": typed_array(y_projected, "f4"),
+                    "line": {"color": color, "width": 2, "dash": "dash"},
+                    "hovertemplate": (
+                        f"Service: {services.short_names[column]}<br>"
+                        "Date: %{x}<br>"
+                        f"Projected: %{{y:.1%}}<br>{crossing_text(column)}<extra></extra>"
+                    ),
+                })
 
+        template = line_chart_template()
+        layout = dict(
+            template,
+            title=dict(template["title"], text=f"{granularity_label(granularity)} Recovery Trends by Service"),
+            uirevision=f"{selected_year}-{granularity}",  # keeps a zoom while service changes / windowed data come in
+        )
+    return {"data": traces, "layout": layout}
+
+
+def forecast_extensions(selected_year, granularity, window=None):
+    # Precomputed trend extensions (column -> (x, y)) at the chart's granularity; only the all-years view has them,
+    # so an ingest's invalidation of "All" entries also drops every chart that shows a projection
+    forecasts = current_snapshot().forecasts
+    if forecasts is None or year_key(selected_year) != "All":
+        return {}
+
+    # Rolling views extend with the daily trend, which is already smooth
+    granularity = DAILY if granularity in ROLLING_VIEWS else granularity
+    extensions = {}
+    for column in forecasts.fits:
+        x_values, y_values = forecasts.series(column, granularity)
+        if window is not None:
+            lo, hi = np.searchsorted(x_values, np.datetime64(window[0])), np.searchsorted(x_values, np.datetime64(window[1]), side="right")
+            x_values, y_values = x_values[lo:hi], y_values[lo:hi]
+        if len(x_values):
+            extensions[column] = (x_values, y_values)
+    return extensions
+
+
+def crossing_text(column):
+    forecasts = current_snapshot().forecasts
+    crossing = forecasts.crossing(column)
+    if crossing is None:
+        return f"Not projected to reach {forecasts.threshold:.0%}"
+    return f"Projected to reach {forecasts.threshold:.0%}: {pd.Timestamp(crossing):%Y-%m-%d}"
+
+
+def yearly_colors(selected_year, selected_service):
+    selected_year_int = int(selected_year) if selected_year != "All" else None
+    return [
+        current_snapshot().services.colors[selected_service] if selected_year_int is None or year == selected_year_int else "#484E54"
+        for year in current_snapshot().aggregate_cube.yearly_avg["Year"]
+    ]
 
 
-    # --- Updating  yearly figure
+def build_yearly_figure(selected_year, selected_service):
+    selected_column = current_snapshot().services.mapping[selected_service]
+    yearly_avg = current_snapshot().aggregate_cube.yearly_avg[['Year', selected_column]]
 
-    selected_year_int = int(selected_year) if selected_year != "All" else None
-    color_yearly = [
-        service_colors[selected_service] if selected_year_int is None or year == selected_year_int else "#484E54"
-        for year in yearly_avg["Year"]
-    ]
-    
-    updated_yearly_fig = px.bar(
+    return px.bar(
         yearly_avg,
         x=selected_column,
         y='Year',
@@ -706,7 +1044,7 @@ def update_dashboard(selected_year, selected_metric, selected_service, granulari
         title="Yearly Average Recovery"
     ).update_traces(
         marker=dict(line=dict(width=0)),
-        marker_color= color_yearly,
+        marker_color= yearly_colors(selected_year, selected_service),
         hovertemplate="Year: %{y}<br>Average: %{x:.1%}<extra></extra>"
     ).update_layout(
         plot_bgcolor="rgba(0,0,0,0)",
@@ -721,6 +1059,15 @@ def update_dashboard(selected_year, selected_metric, selected_service, granulari
     )
 
 
+def build_breakdown_figures(selected_year, selected_service):
+    aggregates = current_snapshot().aggregate_cube.year(selected_year)
+    services = current_snapshot().services
+    selected_column = services.mapping[selected_service]
+    color = services.colors[selected_service]
+
+    monthly_avg_b = aggregates.month_name[['Month_Name', selected_column]]
+    day_of_week_avg = aggregates.day_of_week[['Day_of_Week', selected_column]]
+
     # --- Updating  monthly figure
 
     updated_monthly_fig = px.bar(
@@ -768,12 +1115,415 @@ def update_dashboard(selected_year, selected_metric, selected_service, granulari
         template="plotly_dark"
     )
 
+    return updated_monthly_fig, updated_day_of_week_fig
+
+
+def serialize_output(output):
+    # Figures are stored as plain dicts so a cache hit skips px and figure validation entirely
+    if isinstance(output, tuple):
+        return tuple(serialize_output(item) for item in output)
+    return output.to_plotly_json() if hasattr(output, "to_plotly_json") and hasattr(output, "layout") else output
+
+
+def build_and_serialize(build, args):
+    with span("build"):
+        output = build(*args)
+    with span("serialize"):
+        return serialize_output(output)
+
+
+# Outputs whose arguments end with (start_date, end_date)
+DATE_RANGE_OUTPUTS = ("metrics-row", "bar-chart", "series-store")
+
+
+def selection_label(name, args):
+    # The enumerable selectors only: a label per picked date range would grow without bound, so those are "range"
+    if name in DATE_RANGE_OUTPUTS:
+        args, dates = args[:-2], args[-2:]
+        if any(dates):
+            args += ("range",)
+    return "|".join(str(arg) for arg in args)
+
+
+def cached_output(name, build, *args):
+    # Timed per output and selector combination, cache hits included (mta_output_seconds on /metrics)
+    with output_seconds.time(output=name, selection=selection_label(name, args)), pinned_snapshot() as current:
+        return figure_cache.get_or_build((name,) + args, lambda: build_and_serialize(build, args), current.version)
+
+
+# Component ids of the six dashboard outputs, in update_dashboard's return order
+DASHBOARD_OUTPUT_PROPS = [
+    ("metrics-row", "children"),
+    ("bar-chart", "figure"),
+    ("line-chart", "figure"),
+    ("yearly-breakdown", "figure"),
+    ("monthly-breakdown", "figure"),
+    ("day-of-week-breakdown", "figure"),
+]
+DASHBOARD_OUTPUTS = [component_id for component_id, _ in DASHBOARD_OUTPUT_PROPS]
+
+
+def update_dashboard(selected_year, selected_metric, selected_service, granularity, start_date=None, end_date=None):
+    # All six outputs for one selector state, all from one snapshot; the callbacks below each serve a slice of this
+    with pinned_snapshot():
+        monthly_fig, day_of_week_fig = cached_output("breakdowns", build_breakdown_figures, selected_year, selected_service)
+        return (
+            cached_output("metrics-row", build_metrics_row, selected_year, selected_metric, selected_service, start_date, end_date),
+            cached_output("bar-chart", build_bar_chart, selected_year, selected_service, start_date, end_date),
+            cached_output("line-chart", build_line_chart, selected_year, selected_service, granularity),
+            cached_output("yearly-breakdown", build_yearly_figure, selected_year, selected_service),
+            monthly_fig,
+            day_of_week_fig,
+        )
+
+
+# Call Backs                                                                ------------------------------------------------------------------------------------------------------------- 
+# One callback per output group, wired only to the selectors it actually depends on.
+# When a selector change only recolors a figure, a Patch with the new colors is sent instead of the whole figure.
+# With MTA_CLIENTSIDE_HIGHLIGHT=1 the server only answers year/metric/granularity changes and the browser does the rest.
+
+def triggered_only_by(component_id):
+    return [trigger["prop_id"].split(".")[0] for trigger in ctx.triggered] == [component_id]
+
+
+def register_server_callbacks(app):
+
+    @app.callback(
+        Output("metrics-row", "children"),
+        [
+            Input("year-selector", "value"),
+            Input("metric-type", "value"),
+            Input("service-selector", "value"),
+            Input("date-range", "start_date"),
+            Input("date-range", "end_date")
+        ]
+    )
+    def update_metrics_row(selected_year, selected_metric, selected_service, start_date, end_date):
+        return cached_output("metrics-row", build_metrics_row, selected_year, selected_metric, selected_service, start_date, end_date)
+
+    @app.callback(
+        Output("bar-chart", "figure"),
+        [
+            Input("year-selector", "value"),
+            Input("service-selector", "value"),
+            Input("date-range", "start_date"),
+            Input("date-range", "end_date")
+        ]
+    )
+    def update_bar_chart(selected_year, selected_service, start_date, end_date):
+        # Bar order depends on the year / date range only, so a service change is just a recolor
+        if triggered_only_by("service-selector"):
+            patch = Patch()
+            patch["data"][0]["marker"]["color"] = bar_chart_colors(selected_year, selected_service, start_date, end_date)
+            return patch
+        return cached_output("bar-chart", build_bar_chart, selected_year, selected_service, start_date, end_date)
+
+    @app.callback(
+        Output("line-chart", "figure"),
+        [
+            Input("year-selector", "value"),
+            Input("service-selector", "value"),
+            Input("time-granularity", "value")
+        ],
+        State("line-chart", "relayoutData")
+    )
+    def update_line_chart(selected_year, selected_service, granularity, relayout_data):
+        # uirevision keeps a daily zoom across service changes, so fill that window rather than the overview
+        window = relayout_window(relayout_data or {}) if granularity in DAILY_VIEWS else None
+        if window is not None and triggered_only_by("service-selector"):
+            return build_line_chart(selected_year, selected_service, granularity, window)
+        return cached_output("line-chart", build_line_chart, selected_year, selected_service, granularity)
+
+    @app.callback(
+        Output("yearly-breakdown", "figure"),
+        [
+            Input("year-selector", "value"),
+            Input("service-selector", "value")
+        ]
+    )
+    def update_yearly_figure(selected_year, selected_service):
+        # The yearly bars always cover every year; picking a year only moves the highlight
+        if triggered_only_by("year-selector"):
+            patch = Patch()
+            patch["data"][0]["marker"]["color"] = yearly_colors(selected_year, selected_service)
+            return patch
+        return cached_output("yearly-breakdown", build_yearly_figure, selected_year, selected_service)
+
+    @app.callback(
+        [
+            Output("monthly-breakdown", "figure"),
+            Output("day-of-week-breakdown", "figure")
+        ],
+        [
+            Input("year-selector", "value"),
+            Input("service-selector", "value")
+        ]
+    )
+    def update_breakdown_figures(selected_year, selected_service):
+        return cached_output("breakdowns", build_breakdown_figures, selected_year, selected_service)
+
+
+def register_line_chart_window_callback(app):
+
+    @app.callback(
+        Output("line-chart", "figure", allow_duplicate=True),
+        Input("line-chart", "relayoutData"),
+        [
+            State("year-selector", "value"),
+            State("service-selector", "value"),
+            State("time-granularity", "value")
+        ],
+        prevent_initial_call=True
+    )
+    def update_line_chart_window(relayout_data, selected_year, selected_service, granularity):
+        # Daily views only: a zoom / pan swaps in the visible window re-thinned at chart resolution,
+        # a reset (double click) goes back to the cached overview. Only the traces are sent.
+        if granularity not in DAILY_VIEWS or not relayout_data:
+            raise PreventUpdate
+        if relayout_data.get("xaxis.autorange"):
+            figure = cached_output("line-chart", build_line_chart, selected_year, selected_service, granularity)
+        else:
+            window = relayout_window(relayout_data)
+            if window is None:
+                raise PreventUpdate  # y-axis only / autosize
+            figure = build_line_chart(selected_year, selected_service, granularity, window)
+
+        patch = Patch()
+        patch["data"] = figure["data"]
+        return patch
+
+
+def build_series_store(selected_year, selected_metric, granularity, start_date=None, end_date=None):
+    # Figures rendered for one reference service plus every service's values; the browser swaps them in
+    services = current_snapshot().services
+    outputs = update_dashboard(selected_year, selected_metric, services.default(), granularity, start_date, end_date)
+    aggregate_cube = current_snapshot().aggregate_cube
+    aggregates = aggregate_cube.year(selected_year)
+    yearly_avg = aggregate_cube.yearly_avg
+
+    return {
+        "year": selected_year,
+        "services": list(services.mapping),
+        "columns": services.mapping,
+        "column_order": {column: position for position, column in enumerate(services.columns)},
+        "colors": services.colors,
+        "line_colors": services.line_colors,
+        "default_color": default_color,
+        "default_bar_color": "#484E54",
+        "years": yearly_avg["Year"].tolist(),
+        "yearly": {service: yearly_avg[column].tolist() for service, column in services.mapping.items()},
+        "month_name": {service: aggregates.month_name[column].tolist() for service, column in services.mapping.items()},
+        "day_of_week": {service: aggregates.day_of_week[column].tolist() for service, column in services.mapping.items()},
+        "figures": dict(zip(DASHBOARD_OUTPUTS, outputs)),
+    }
+
+
+def register_clientside_callbacks(app):
+
+    @app.callback(
+        Output("series-store", "data"),
+        [
+            Input("year-selector", "value"),
+            Input("metric-type", "value"),
+            Input("time-granularity", "value"),
+            Input("date-range", "start_date"),
+            Input("date-range", "end_date")
+        ]
+    )
+    def update_series_store(selected_year, selected_metric, granularity, start_date, end_date):
+        return cached_output("series-store", build_series_store, selected_year, selected_metric, granularity, start_date, end_date)
+
+    # Service switching never reaches the server; see assets/dashboard.js
+    app.clientside_callback(
+        ClientsideFunction(namespace="mta", function_name="highlightService"),
+        [Output(component_id, prop) for component_id, prop in DASHBOARD_OUTPUT_PROPS],
+        [
+            Input("series-store", "data"),
+            Input("service-selector", "value")
+        ]
+    )
+
+
+
+# Serving                                                                   ------------------------------------------------------------------------------------------------------------- 
+
+def dataset_version():
+    # Version of the snapshot this request reads; cached responses of any other version are stale
+    return current_snapshot().version
+
+
+profiler = None  # SamplingProfiler, set up by install_server_hooks()
+response_cache = None  # ResponseCache, likewise
+
+
+def install_server_hooks(server):
+    global profiler, response_cache
+
+    # Pinned before anything reads data (the response cache's version included) and held for the whole request
+    @server.before_request
+    def pin_snapshot():
+        _pinned.snapshot = latest_snapshot()
+
+    @server.teardown_request
+    def unpin_snapshot(exc):
+        _pinned.snapshot = None
+
+    # Request timing / sampling hooks go first so they also see requests the response cache answers
+    profiler = SamplingProfiler(PROFILE_RATE, PROFILE_DIR or DEFAULT_CACHE_DIR / "profiles", PROFILER)
+    if METRICS_ENABLED:
+        instrumentation.init_app(server, profiler, PROFILE_TOGGLE)
+
+    # Identical callback requests are answered from stored bytes until the dataset changes
+    response_cache = ResponseCache(
+        dataset_version, lambda: latest_snapshot().version, maxsize=HTTP_CACHE_SIZE, maxbytes=HTTP_CACHE_BYTES
+    )
+    if HTTP_CACHE_SIZE > 0:
+        response_cache.init_app(server)
+
+    @server.route("/_cache-stats")
+    def cache_stats():
+        return {"figures": figure_cache.stats(), "responses": response_cache.stats()}
+
+
+@instrumentation.registry.add_collector
+def cache_metrics():
+    samples = {"figures": figure_cache.stats(), "responses": response_cache.stats()}
+    return [
+        ("mta_cache_hits_total", "counter", "Cache hits.", [({"cache": name}, stats["hits"]) for name, stats in samples.items()]),
+        ("mta_cache_misses_total", "counter", "Cache misses.", [({"cache": name}, stats["misses"]) for name, stats in samples.items()]),
+        ("mta_cache_entries", "gauge", "Entries held.", [({"cache": name}, stats["size"]) for name, stats in samples.items()]),
+        ("mta_http_cache_bytes", "gauge", "Bytes of stored callback responses.", [({}, samples["responses"]["bytes"])]),
+    ]
+
+
+# Settings create_app(config=...) may override. The others (summary quantiles, recovery thresholds, server
+# address) are already read by aggregates.py / at import, so they stay environment-only.
+CONFIG_KEYS = (
+    "CLIENTSIDE_HIGHLIGHT", "DOWNSAMPLE_METHOD", "FIGURE_BYTE_BUDGET", "FIGURE_CACHE_SIZE", "FORECAST_DAYS",
+    "FORECAST_WORKERS", "HTTP_CACHE_BYTES", "HTTP_CACHE_SIZE", "LINE_CHART_WIDTH", "METRICS_ENABLED", "PROFILE_DIR",
+    "PROFILE_RATE", "PROFILE_TOGGLE", "PROFILER", "QUERY_BACKEND", "QUERY_DB", "REFRESH_INTERVAL", "SHARED_DATA_DIR",
+    "WARMUP", "WATCH_INTERVAL",
+)
+
+
+def apply_config(config):
+    unknown = sorted(set(config) - set(CONFIG_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown dashboard settings {unknown}; expected some of {list(CONFIG_KEYS)}")
+    for name, value in config.items():
+        if name == "FIGURE_CACHE_SIZE":
+            figure_cache.maxsize = value
+        else:
+            globals()[name] = value
+
+
+# Bootswatch "slate", also linked by static_export.py's pages
+STYLESHEET = "https://cdn.jsdelivr.net/npm/bootswatch@5.3.0/dist/slate/bootstrap.min.css"
+
+_app = None
+
+
+def create_app(data_source=None, config=None):
+    """Load the data and build the Dash app: layout, callbacks and server hooks.
+
+    ``data_source`` is passed to load_data() (a CSV path, a ridership frame or
+    None for the environment's source). ``config`` overrides settings from
+    config.py by name, e.g. ``{"CLIENTSIDE_HIGHLIGHT": True, "WARMUP": "none"}``.
+    The app becomes the module's ``app`` / ``server``.
+    """
+    global _app
+
+    apply_config(config or {})
+    with snapshot_lock:
+        load_data(data_source)
+
+    app = Dash(__name__, external_stylesheets=[STYLESHEET])
+    app.layout = build_layout
+
+    if CLIENTSIDE_HIGHLIGHT:
+        register_clientside_callbacks(app)
+    else:
+        register_server_callbacks(app)
+    register_line_chart_window_callback(app)
+
+    install_server_hooks(app.server)
+
+    # Threads of an earlier app would keep watching its source; serve() / post_fork start them for this one
+    stop_background_threads()
+
+    _app = app
+    return app
+
+
+def get_app():
+    # The app create_app() built, or one built now from the environment's settings
+    return _app if _app is not None else create_app()
+
+
+def __getattr__(name):
+    # `MTA_Dashboard.app` / `.server` / `.df` ... build or load on first access rather than at import
+    if name == "app":
+        return get_app()
+    if name == "server":
+        # WSGI callable for gunicorn / waitress / mod_wsgi (see wsgi.py and gunicorn.conf.py)
+        return get_app().server
+    if name in DATA_GLOBALS:
+        return getattr(latest_snapshot(), name)
+    if name in SERVICE_GLOBALS:
+        return getattr(latest_snapshot().services, SERVICE_GLOBALS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def default_selection():
+    # The sidebar's initial state; the service is the registry's first
+    return ("All", "average", latest_snapshot().services.default(), "monthly")
+
+# The four selectors whose options span every dashboard state, in update_dashboard's argument order
+STATE_SELECTORS = ["year-selector", "metric-type", "service-selector", "time-granularity"]
+
+
+def selector_states():
+    # Every (year, metric, service, granularity) the sidebar can produce, as the browser sends them (strings)
+    layout = build_layout()
+    options = [[str(option["value"]) for option in layout[component_id].options] for component_id in STATE_SELECTORS]
+    return list(itertools.product(*options))
+
+
+def warm_up(level=None):
+    # Fill the figure cache before traffic arrives (and, under gunicorn --preload, before forking
+    # so every worker inherits the entries copy-on-write). Returns the number of states rendered.
+    level = level or WARMUP
+    if level == "none":
+        return 0
+
+    if level == "all":
+        states = selector_states()
+    else:
+        states = [default_selection()]
+
+    rendered = 0
+    for state in states:
+        if CLIENTSIDE_HIGHLIGHT:
+            selected_year, selected_metric, _, granularity = state
+            cached_output("series-store", build_series_store, selected_year, selected_metric, granularity, None, None)
+        else:
+            update_dashboard(*state)
+        rendered += 1
+    return rendered
 
-    # --- Returning
-    
-    return updated_metrics_row, updated_bar_chart, updated_line_chart, updated_yearly_fig, updated_monthly_fig, updated_day_of_week_fig
 
+def serve(host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS):
+    # Multi-threaded waitress when installed; the Flask dev server is only a fallback for local use
+    app = get_app()
+    warm_up()
+    start_background_threads()
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        app.run(host=host, port=port, threaded=True)
+    else:
+        waitress_serve(app.server, host=host, port=port, threads=threads)
 
 
 if __name__ == "__main__":
-    app.run_server()
+    serve()
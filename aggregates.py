@@ -0,0 +1,396 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import RECOVERY_THRESHOLD_HIGH, RECOVERY_THRESHOLD_LOW, ROLLING_WINDOWS, SUMMARY_QUANTILES
+from data_loader import DateIndex
+
+
+MONTH_ORDER = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+DAY_OF_WEEK_ORDER = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# time-granularity value -> period column on df
+GRANULARITY_COLUMNS = {"monthly": "Month", "weekly": "Week", "quarterly": "Quarter"}
+
+# Period columns hold int32 period ordinals of these frequencies
+PERIOD_FREQUENCIES = {"Month": "M", "Week": "W", "Quarter": "Q"}
+
+# Statistics of the trailing-window line chart views, one view per statistic and MTA_ROLLING_WINDOWS size
+ROLLING_STATISTICS = ("mean", "median")
+
+
+def period_ordinals(dates, freq):
+    return dates.dt.to_period(freq).array.asi8.astype("int32")
+
+
+def ordinals_to_timestamps(ordinals, freq):
+    return pd.PeriodIndex.from_ordinals(np.asarray(ordinals, dtype="int64"), freq=freq).to_timestamp()
+
+
+def ratio_block(rows, columns):
+    # The (days x services) ratio array in its stored dtype (float32 on a prepared frame)
+    block = rows[columns].to_numpy()
+    return block if block.dtype.kind == "f" else block.astype("float64")
+
+
+def quantile_name(q):
+    return "median" if q == 0.5 else f"p{q * 100:g}"
+
+
+def summarize(block, high=RECOVERY_THRESHOLD_HIGH, low=RECOVERY_THRESHOLD_LOW, quantiles=SUMMARY_QUANTILES):
+    """Per-service statistics of a (days x services) block of recovery ratios.
+
+    NaNs (days a service did not report) are skipped like pandas' mean() does and
+    never count towards the threshold days. All quantiles share a single
+    nanquantile call.
+    """
+    block = np.asarray(block)
+    if block.dtype.kind != "f":
+        block = block.astype("float64")
+    valid = ~np.isnan(block)
+    counts = valid.sum(axis=0)
+
+    # Compare in the block's own precision so a float32 0.9 still counts as >= 0.9
+    high, low = block.dtype.type(high), block.dtype.type(low)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sums = np.where(valid, block, 0.0).sum(axis=0, dtype="float64")
+        means = sums / counts
+
+        stats = {
+            "average": means,
+            "sum": sums,
+            "days_100": (block >= high).sum(axis=0),
+            "days_50": (block <= low).sum(axis=0),
+            "count": counts,
+        }
+
+    if quantiles and len(block):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns just give NaN
+            values = np.nanquantile(block, list(quantiles), axis=0)
+    elif quantiles:
+        values = np.full((len(quantiles), block.shape[1]), np.nan)  # no rows, e.g. an empty date range
+    if quantiles:
+        for q, row in zip(quantiles, values):
+            stats[quantile_name(q)] = row
+
+    return stats
+
+
+def year_key(selected_year):
+    # dbc.Select hands us strings; "All" stays as-is, years become ints
+    return "All" if selected_year in (None, "All") else int(selected_year)
+
+
+# Bucket tables kept per year entry: name -> grouping column on df
+BUCKET_COLUMNS = {"month_name": "Month_Name", "day_of_week": "Day_of_Week", **GRANULARITY_COLUMNS}
+
+# Running per-service totals from summarize() that can simply be added up when rows arrive
+ADDITIVE_STATS = ("sum", "count", "days_100", "days_50")
+
+
+def bucket_totals(rows, by, columns):
+    # Accumulate in float64 even though the frame stores float32 ratios
+    grouped = rows[columns].astype("float64").groupby(rows[by], observed=True)
+    return grouped.sum(), grouped.count()
+
+
+def add_totals(current, new):
+    # Align on bucket; buckets missing on either side count as zero
+    if current is None:
+        return new
+    return tuple(old.add(extra, fill_value=0) for old, extra in zip(current, new))
+
+
+def bucket_means(totals):
+    sums, counts = totals
+    return sums / counts  # 0 / 0 -> NaN for buckets where a service never reported
+
+
+class YearAggregates:
+    """Everything update_dashboard needs for one year (or "All"), for every service.
+
+    Service selection is just a column pick on these wide tables, so one entry
+    per year covers all services and granularities. Sums and counts are kept
+    next to the means so appended days only touch the buckets they fall in.
+    """
+
+    def __init__(self, df_filtered, service_mapping):
+        self.service_mapping = service_mapping
+        self.columns = list(service_mapping.values())
+        self._running = None
+        self._totals = {}
+
+        self.append(df_filtered, df_filtered)
+
+    def append(self, new_rows, all_rows):
+        # all_rows is the entry's full slice after the append; only quantiles need it
+        stats = summarize(ratio_block(new_rows, self.columns), quantiles=())
+        if self._running is None:
+            self._running = {name: stats[name] for name in ADDITIVE_STATS}
+        else:
+            self._running = {name: self._running[name] + stats[name] for name in ADDITIVE_STATS}
+
+        for name, by in BUCKET_COLUMNS.items():
+            self._totals[name] = add_totals(self._totals.get(name), bucket_totals(new_rows, by, self.columns))
+
+        self._refresh_summary(all_rows)
+        self._refresh_tables()
+
+    def _refresh_summary(self, all_rows):
+        running = self._running
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats = dict(running, average=running["sum"] / running["count"])
+
+        if SUMMARY_QUANTILES:
+            # Quantiles can't be accumulated, so these come from the entry's rows
+            quantiles = summarize(ratio_block(all_rows, self.columns))
+            stats.update({quantile_name(q): quantiles[quantile_name(q)] for q in SUMMARY_QUANTILES})
+
+        # metric -> {service: value}
+        self.summary = {metric: dict(zip(self.service_mapping, values.tolist())) for metric, values in stats.items()}
+
+    def _refresh_tables(self):
+        # Monthly / day-of-week breakdowns, already in calendar order
+        month_means = bucket_means(self._totals["month_name"])
+        self.month_name = (
+            month_means.reindex([m for m in MONTH_ORDER if m in month_means.index])
+            .rename_axis('Month_Name').reset_index()
+        )
+        day_means = bucket_means(self._totals["day_of_week"])
+        self.day_of_week = (
+            day_means.reindex([d for d in DAY_OF_WEEK_ORDER if d in day_means.index])
+            .rename_axis('Day_of_Week').reset_index()
+        )
+
+        # Line chart data per granularity, x axis already converted to timestamps
+        self.trends = {}
+        for granularity, period_column in GRANULARITY_COLUMNS.items():
+            data = bucket_means(self._totals[granularity]).rename_axis(period_column).reset_index()
+            data[period_column] = ordinals_to_timestamps(data[period_column], PERIOD_FREQUENCIES[period_column])
+            self.trends[granularity] = data
+
+
+class AggregateCube:
+    """Lazily memoized aggregates keyed by year, plus the year-independent yearly averages."""
+
+    def __init__(self, df, service_mapping, index=None):
+        self.df = df
+        self.index = index if index is not None else DateIndex(df)
+        self.service_mapping = service_mapping
+        self._yearly_totals = bucket_totals(df, 'Year', list(service_mapping.values()))
+        self.yearly_avg = bucket_means(self._yearly_totals).rename_axis('Year').reset_index()
+        self._years = {}
+
+    def years(self):
+        return self.index.years()
+
+    def year(self, selected_year):
+        key = year_key(selected_year)
+        entry = self._years.get(key)
+        if entry is None:
+            df_filtered = self.df if key == "All" else self.index.year(key)
+            entry = self._years[key] = YearAggregates(df_filtered, self.service_mapping)
+        return entry
+
+    def build(self):
+        # Fill every entry up front so no request pays for aggregation
+        for key in ["All"] + self.years():
+            self.year(key)
+        return self
+
+    def append(self, df, index, new_rows):
+        """Fold newly ingested rows into the built entries; returns the years they touched."""
+        self.df = df
+        self.index = index
+
+        columns = list(self.service_mapping.values())
+        self._yearly_totals = add_totals(self._yearly_totals, bucket_totals(new_rows, 'Year', columns))
+        self.yearly_avg = bucket_means(self._yearly_totals).rename_axis('Year').reset_index()
+
+        years = sorted(int(year) for year in new_rows['Year'].unique())
+        for key in ["All"] + years:
+            entry = self._years.get(key)
+            if entry is None:
+                continue  # not built yet; it will be built from the full slice on first use
+            rows = new_rows if key == "All" else new_rows[new_rows['Year'] == key]
+            entry.append(rows, df if key == "All" else index.year(key))
+        return years
+
+    def clear(self):
+        self._years.clear()
+
+    def __getstate__(self):
+        # Pickled without the frame so a shared export doesn't duplicate the mapped columns
+        state = self.__dict__.copy()
+        state["df"] = state["index"] = None
+        return state
+
+    def attach(self, df, index):
+        self.df = df
+        self.index = index
+        return self
+
+    def nbytes(self):
+        total = self.yearly_avg.memory_usage(deep=True).sum()
+        for entry in self._years.values():
+            tables = [entry.month_name, entry.day_of_week, *entry.trends.values()]
+            tables += [frame for totals in entry._totals.values() for frame in totals]
+            total += sum(table.memory_usage(deep=True).sum() for table in tables)
+        return int(total)
+
+
+class PrefixSums:
+    """Cumulative per-service sums and counts over the Date-sorted frame.
+
+    The mean and threshold-day counts of any [start, end] window are the
+    difference of two rows, so a date-range KPI costs O(services) no matter
+    how long the window is.
+    """
+
+    def __init__(self, index, service_mapping, high=RECOVERY_THRESHOLD_HIGH, low=RECOVERY_THRESHOLD_LOW):
+        self.index = index
+        self.service_mapping = service_mapping
+
+        self.high = high
+        self.low = low
+
+        # Leading zero row so window sums are always cum[hi] - cum[lo]
+        width = len(service_mapping)
+        self.sums = np.zeros((1, width), dtype="float64")
+        self.counts = np.zeros((1, width), dtype="int32")
+        self.days_high = np.zeros((1, width), dtype="int32")
+        self.days_low = np.zeros((1, width), dtype="int32")
+
+        if index is not None:
+            self._extend(index.df)
+
+    @classmethod
+    def from_arrays(cls, index, service_mapping, arrays, high=RECOVERY_THRESHOLD_HIGH, low=RECOVERY_THRESHOLD_LOW):
+        # Reuse previously computed (e.g. memory-mapped) cumulative arrays instead of summing again
+        prefix_sums = cls(None, service_mapping, high, low)
+        prefix_sums.index = index
+        for name, values in arrays.items():
+            setattr(prefix_sums, name, values)
+        return prefix_sums
+
+    def _extend(self, rows):
+        block = ratio_block(rows, list(self.service_mapping.values()))
+        valid = ~np.isnan(block)
+        high, low = block.dtype.type(self.high), block.dtype.type(self.low)
+
+        def cumulative(current, values):
+            # Continue the running totals from the last row
+            return np.vstack([current, current[-1] + np.cumsum(values, axis=0, dtype=current.dtype)])
+
+        self.sums = cumulative(self.sums, np.where(valid, block, 0.0))
+        self.counts = cumulative(self.counts, valid)
+        self.days_high = cumulative(self.days_high, block >= high)
+        self.days_low = cumulative(self.days_low, block <= low)
+
+    def append(self, index):
+        # index.df is the grown frame; only rows past the current end are summed
+        new_rows = index.df.iloc[len(self.sums) - 1:]
+        self.index = index
+        self._extend(new_rows)
+
+    def window(self, start=None, end=None):
+        lo, hi = self.index.positions(start, end)
+        counts = self.counts[hi] - self.counts[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = (self.sums[hi] - self.sums[lo]) / counts
+        return {
+            "average": means,
+            "days_100": self.days_high[hi] - self.days_high[lo],
+            "days_50": self.days_low[hi] - self.days_low[lo],
+            "count": counts,
+        }
+
+    def nbytes(self):
+        return self.sums.nbytes + self.counts.nbytes + self.days_high.nbytes + self.days_low.nbytes
+
+    def summary(self, start=None, end=None, metric="average"):
+        stats = self.window(start, end)
+        if metric not in stats:
+            # Quantiles can't be differenced; summarize just the window's rows instead
+            rows = self.index.date_range(start, end)
+            stats = summarize(ratio_block(rows, list(self.service_mapping.values())))
+        return dict(zip(self.service_mapping, stats[metric].tolist()))
+
+
+class RollingWindows:
+    """Trailing-window means and medians of every service's daily ratio.
+
+    Windows count rows, i.e. days of the one-row-per-day frame. A day's value
+    is NaN until a full window precedes it, or when fewer than
+    ``min_fraction`` of the window's days reported. Each (window, statistic)
+    is computed for the whole history on first use and kept: means are the
+    difference of two prefix-sum rows, medians come from a sliding view,
+    chunked to bound the copy. ``append`` computes only the new days, each
+    from its own trailing window.
+    """
+
+    CHUNK_ROWS = 4096
+
+    def __init__(self, prefix_sums, windows=ROLLING_WINDOWS, min_fraction=0.5):
+        self.prefix_sums = prefix_sums
+        self.windows = tuple(windows)
+        self.min_fraction = min_fraction
+        self._series = {}  # (window, statistic) -> (days x services) float32
+
+    def series(self, window, statistic):
+        key = (window, statistic)
+        values = self._series.get(key)
+        if values is None:
+            values = self._series[key] = self._compute(window, statistic, 0, len(self.prefix_sums.sums) - 1)
+        return values
+
+    def _compute(self, window, statistic, start, stop):
+        # Rows [start, stop) of one view
+        ends = np.arange(start + 1, stop + 1)
+        begins = np.maximum(ends - window, 0)
+        counts = self.prefix_sums.counts[ends] - self.prefix_sums.counts[begins]
+        valid = (ends >= window)[:, None] & (counts >= max(1, int(np.ceil(window * self.min_fraction))))
+
+        if statistic == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = (self.prefix_sums.sums[ends] - self.prefix_sums.sums[begins]) / counts
+        elif statistic == "median":
+            values = self._medians(window, start, stop)
+        else:
+            raise ValueError(f"Unknown rolling statistic {statistic!r}; expected one of {ROLLING_STATISTICS}")
+        return np.where(valid, values, np.nan).astype("float32")
+
+    def _medians(self, window, start, stop):
+        first = max(start - window + 1, 0)
+        rows = self.prefix_sums.index.df.iloc[first:stop]
+        block = ratio_block(rows, list(self.prefix_sums.service_mapping.values()))
+        medians = np.full((stop - start, block.shape[1]), np.nan, dtype="float32")
+        if len(block) < window:
+            return medians
+
+        # Window j of the view ends on block row j + window - 1
+        views = sliding_window_view(block, window, axis=0)
+        offset = first + window - 1 - start
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN windows, masked by the caller anyway
+            for lo in range(0, len(views), self.CHUNK_ROWS):
+                windows = views[lo:lo + self.CHUNK_ROWS]
+                # nanmedian is several times slower than median; most chunks have no gaps to skip
+                chunk = np.nanmedian(windows, axis=-1) if np.isnan(windows).any() else np.median(windows, axis=-1)
+                medians[offset + lo:offset + lo + len(chunk)] = chunk
+        return medians
+
+    def append(self, prefix_sums):
+        # prefix_sums already covers the new days; the computed views grow by those days only
+        start, stop = len(self.prefix_sums.sums) - 1, len(prefix_sums.sums) - 1
+        self.prefix_sums = prefix_sums
+        self._series = {
+            key: np.vstack([values, self._compute(*key, start, stop)]) for key, values in self._series.items()
+        }
+
+    def nbytes(self):
+        return sum(values.nbytes for values in self._series.values())
@@ -0,0 +1,64 @@
+// Clientside highlighting (MTA_CLIENTSIDE_HIGHLIGHT=1).
+// The server ships every service's series for the selected year once (series-store);
+// switching service only recolors / reorders in the browser.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    mta: {
+        highlightService: function (store, service) {
+            if (!store || !service) {
+                return window.dash_clientside.no_update;
+            }
+
+            var copy = function (value) { return JSON.parse(JSON.stringify(value)); };
+            var figures = store.figures;
+            var color = store.colors[service];
+            var column = store.columns[service];
+
+            // --- Metrics row: move the dot to the selected service
+            var metricsRow = copy(figures["metrics-row"]);
+            metricsRow.forEach(function (col, index) {
+                var selected = store.services[index] === service;
+                var dot = col.props.children.props.children[0].props.children[0];
+                dot.props.style = {
+                    color: selected ? color : "transparent",
+                    marginRight: selected ? "10px" : "0px",
+                    fontSize: selected ? "1.5vw" : "0px"
+                };
+            });
+
+            // --- Bar chart: order is fixed by the year, only colors change
+            var barChart = copy(figures["bar-chart"]);
+            barChart.data[0].marker.color = barChart.data[0].y.map(function (name) {
+                return name === service ? color : store.default_bar_color;
+            });
+
+            // --- Line chart: selected service drawn last, in its own color
+            var lineChart = copy(figures["line-chart"]);
+            var others = lineChart.data.filter(function (trace) { return trace.name !== column; });
+            var selected = lineChart.data.filter(function (trace) { return trace.name === column; });
+            others.sort(function (a, b) { return store.column_order[a.name] - store.column_order[b.name]; });
+            lineChart.data = others.concat(selected).map(function (trace) {
+                trace.line.color = trace.name === column ? store.line_colors[trace.name] : store.default_color;
+                return trace;
+            });
+
+            // --- Yearly bars: swap in the service's values, highlight the selected year
+            var yearlyFig = copy(figures["yearly-breakdown"]);
+            yearlyFig.data[0].x = store.yearly[service];
+            yearlyFig.data[0].marker.color = store.years.map(function (year) {
+                return store.year === "All" || String(year) === String(store.year) ? color : store.default_bar_color;
+            });
+
+            // --- Month / weekday bars: swap in the service's values
+            var monthlyFig = copy(figures["monthly-breakdown"]);
+            monthlyFig.data[0].y = store.month_name[service];
+            monthlyFig.data[0].marker.color = color;
+
+            var dayOfWeekFig = copy(figures["day-of-week-breakdown"]);
+            dayOfWeekFig.data[0].y = store.day_of_week[service];
+            dayOfWeekFig.data[0].marker.color = color;
+
+            return [metricsRow, barChart, lineChart, yearlyFig, monthlyFig, dayOfWeekFig];
+        }
+    }
+});
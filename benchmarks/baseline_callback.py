@@ -0,0 +1,368 @@
+"""update_dashboard as it was before the aggregate cube, for bench_callback.py.
+
+The data preparation and callback are copied unchanged from the original
+MTA_Dashboard.py, except that the CSV is read from the local copy rather than
+the remote URL and only the columns the callback reads are derived. Every call
+filters and groups the full frame and builds its figures with plotly express.
+"""
+import sys
+from pathlib import Path
+
+import dash_bootstrap_components as dbc
+import pandas as pd
+import plotly.express as px
+from dash import html
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from data_loader import DEFAULT_DATA_PATH  # noqa: E402
+
+
+df = pd.read_csv(DEFAULT_DATA_PATH)
+
+df['Date'] = pd.to_datetime(df['Date'], errors='coerce')  # Ensure Date column is in datetime format
+df = df.dropna(subset=['Date'])  # Drop rows where Date is invalid
+
+
+# List of percentage columns
+percentage_columns = [
+    'Subways: % of Comparable Pre-Pandemic Day',
+    'Buses: % of Comparable Pre-Pandemic Day',
+    'LIRR: % of Comparable Pre-Pandemic Day',
+    'Metro-North: % of Comparable Pre-Pandemic Day',
+    'Access-A-Ride: % of Comparable Pre-Pandemic Day',
+    'Bridges and Tunnels: % of Comparable Pre-Pandemic Day',
+    'Staten Island Railway: % of Comparable Pre-Pandemic Day'
+]
+
+
+# Making them as Percentages
+df[percentage_columns] = df[percentage_columns] / 100
+
+# will be used in highlighting the line chart
+service_mapping = {
+    "Subways": "Subways: % of Comparable Pre-Pandemic Day",
+    "Buses": "Buses: % of Comparable Pre-Pandemic Day",
+    "LIRR": "LIRR: % of Comparable Pre-Pandemic Day",
+    "Metro North": "Metro-North: % of Comparable Pre-Pandemic Day",
+    "Access-A": "Access-A-Ride: % of Comparable Pre-Pandemic Day",
+    "Bridges and Tunnels": "Bridges and Tunnels: % of Comparable Pre-Pandemic Day",
+    "Staten Island Railway": "Staten Island Railway: % of Comparable Pre-Pandemic Day"
+}
+
+service_short_names = {
+    "Subways: % of Comparable Pre-Pandemic Day": "Subways",
+    "Buses: % of Comparable Pre-Pandemic Day": "Buses",
+    "LIRR: % of Comparable Pre-Pandemic Day": "LIRR",
+    "Metro-North: % of Comparable Pre-Pandemic Day": "Metro North",
+    "Access-A-Ride: % of Comparable Pre-Pandemic Day": "Access-A",
+    "Bridges and Tunnels: % of Comparable Pre-Pandemic Day": "Bridges",
+    "Staten Island Railway: % of Comparable Pre-Pandemic Day": "Staten Island"
+}
+
+service_colors_line_chart = {
+    "Subways: % of Comparable Pre-Pandemic Day": "#44b9dd", 
+    "Buses: % of Comparable Pre-Pandemic Day": "#bf9bf9", 
+    "LIRR: % of Comparable Pre-Pandemic Day": "#f89256",
+    "Metro-North: % of Comparable Pre-Pandemic Day": "#eb92ad",
+    "Access-A-Ride: % of Comparable Pre-Pandemic Day":  "#8ea9ff",
+    "Bridges and Tunnels: % of Comparable Pre-Pandemic Day": "#d3a61c",
+    "Staten Island Railway: % of Comparable Pre-Pandemic Day": "#40bfa9"
+}
+
+
+default_color = "#484E54"
+
+
+service_colors = {
+    "Subways": "#44b9dd",  # $color-charts-blue-1-600  
+    "Buses": "#bf9bf9", # $color-charts-purple-600    
+    "LIRR": "#f89256",  # $color-charts-orange-600
+    "Metro North": "#eb92ad",  # $color-charts-pink-600
+    "Access-A": "#8ea9ff",  # $color-charts-blue-2-600
+    "Bridges and Tunnels": "#d3a61c",  # $color-charts-yellow-600
+    "Staten Island Railway": "#40bfa9"  # $color-charts-teal-600
+}
+
+df['Month'] = df['Date'].dt.to_period('M')
+df['Week'] = df['Date'].dt.to_period('W')
+df['Quarter'] = df['Date'].dt.to_period('Q')
+df['Year'] = df['Date'].dt.year
+df['Month_Name'] = df['Date'].dt.strftime('%b')  # month name
+df['Day_of_Week'] = df['Date'].dt.strftime('%a')  # day name
+
+
+def update_dashboard(selected_year, selected_metric, selected_service, granularity):
+    
+    # Filter the dataset by the selected year
+    df_filtered = df if selected_year == "All" else df[df['Year'] == int(selected_year) ]
+    
+    summary_metrics = {
+    "Subways": df_filtered["Subways: % of Comparable Pre-Pandemic Day"].mean(),
+    "Buses": df_filtered["Buses: % of Comparable Pre-Pandemic Day"].mean(),
+    "LIRR": df_filtered["LIRR: % of Comparable Pre-Pandemic Day"].mean(),
+    "Metro North": df_filtered["Metro-North: % of Comparable Pre-Pandemic Day"].mean(),
+    "Access-A": df_filtered["Access-A-Ride: % of Comparable Pre-Pandemic Day"].mean(),
+    "Bridges and Tunnels": df_filtered["Bridges and Tunnels: % of Comparable Pre-Pandemic Day"].mean(),
+    "Staten Island Railway": df_filtered["Staten Island Railway: % of Comparable Pre-Pandemic Day"].mean()
+    }
+
+    sorted_summary_metrics = dict(sorted(summary_metrics.items(), key=lambda item: item[1] ))
+
+    selected_column = service_mapping[selected_service]
+    
+    days_100_recovery = {
+    "Subways": (df_filtered["Subways: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
+    "Buses": (df_filtered["Buses: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
+    "LIRR": (df_filtered["LIRR: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
+    "Metro North": (df_filtered["Metro-North: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
+    "Access-A": (df_filtered["Access-A-Ride: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
+    "Bridges and Tunnels": (df_filtered["Bridges and Tunnels: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
+    "Staten Island Railway": (df_filtered["Staten Island Railway: % of Comparable Pre-Pandemic Day"] >= 1).sum(),
+    }
+
+    days_below_50_recovery = {
+    "Subways": (df_filtered["Subways: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
+    "Buses": (df_filtered["Buses: % of Comparable Pre-Pandemic Day"] <= 0.5).sum(),
+    "LIRR": (df_filtered["LIRR: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
+    "Metro North": (df_filtered["Metro-North: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
+    "Access-A": (df_filtered["Access-A-Ride: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
+    "Bridges and Tunnels": (df_filtered["Bridges and Tunnels: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
+    "Staten Island Railway": (df_filtered["Staten Island Railway: % of Comparable Pre-Pandemic Day"] <= 0.5 ).sum(),
+    }
+
+    # Yearly average
+    yearly_avg = df.groupby('Year').agg({selected_column: 'mean'}).reset_index()
+
+    # Monthly average (sort by month order)
+    monthly_avg_b = df_filtered.groupby('Month_Name').agg({selected_column: 'mean'}).reset_index()
+    month_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    monthly_avg_b['Month_Name'] = pd.Categorical(monthly_avg_b['Month_Name'], categories=month_order, ordered=True)
+    monthly_avg_b = monthly_avg_b.sort_values('Month_Name')
+
+    # Day-of-week average (sort by weekday order)
+    day_of_week_avg = df_filtered.groupby('Day_of_Week').agg({selected_column: 'mean'}).reset_index()
+    day_of_week_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    day_of_week_avg['Day_of_Week'] = pd.Categorical(day_of_week_avg['Day_of_Week'], categories=day_of_week_order, ordered=True)
+    day_of_week_avg = day_of_week_avg.sort_values('Day_of_Week')
+
+
+    color = service_colors[selected_service] 
+
+
+    # --- Changing  metrics
+    
+    if selected_metric == "average":
+        metrics = summary_metrics
+    elif selected_metric == "days_100":
+        metrics = days_100_recovery
+    elif selected_metric == "days_50":
+        metrics = days_below_50_recovery   
+
+    updated_metrics_row= [
+        dbc.Col(
+            html.Div(
+                [
+                    html.H3(
+                        [
+                            html.Span(
+                                "●", 
+                                style={
+                                    "color": service_colors[selected_service] if metric_name == selected_service else "transparent",
+                                    "marginRight": "10px" if metric_name == selected_service else "0px",
+                                    "fontSize": "1.5vw" if metric_name == selected_service else "0px"
+                                }
+                            ),
+                            f"{value:.1%}" if selected_metric == "average" else f"{value}" 
+                        ],
+                        className="text-center mb-0",
+                        style={"fontSize": "1.5vw"}
+                    ),
+                    html.Small(metric_name, className="text-muted text-center d-block", style={"fontSize": "0.75vw"})
+                ],
+                className="p-3 bg-primary text-light rounded shadow-sm"
+            ),
+            style={"flex": "1 1 calc(100% / 7 - 10px)"}
+        )
+        for metric_name, value in metrics.items()
+    ]
+
+    
+    # --- Updating  bar chart
+    
+    colors = ["#484E54" if service != selected_service else service_colors[selected_service]
+              for service in sorted_summary_metrics.keys()]
+
+    updated_bar_chart = px.bar(
+        y= sorted_summary_metrics.keys(),
+        x= sorted_summary_metrics.values(),
+        title="Average Daily Recovery by Service",
+        orientation='h'
+    ).update_traces(
+        marker=dict(line=dict(width=0)),
+        marker_color=colors,
+        hovertemplate="Service: %{y}<br>Value: %{x:.1%}<extra></extra>"
+    ).update_layout(
+         plot_bgcolor="rgba(0,0,0,0)",
+         paper_bgcolor="rgba(0,0,0,0)",
+         font=dict(size=11),
+         showlegend=False,
+         title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y= 1),
+         margin=dict(l=20, r=20, t=35, b=20),
+         xaxis_title=None, yaxis_title=None,
+         xaxis=dict( automargin=True, tickformat="0%", showgrid=False, zeroline=False ),
+         yaxis=dict( ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False ),
+         template= "plotly_dark"
+     )
+
+
+    # --- Updating line chart
+    if granularity == "monthly":
+        data = df_filtered.groupby('Month').mean(numeric_only=True).reset_index()
+        data['Month'] = data['Month'].dt.to_timestamp()
+        x_axis = "Month"
+    
+    elif granularity == "weekly":
+        data = df_filtered.groupby('Week').mean(numeric_only=True).reset_index()
+        data['Week'] = data['Week'].dt.to_timestamp()
+        x_axis = "Week"
+    
+    elif granularity == "quarterly":
+        data = df_filtered.groupby('Quarter').mean(numeric_only=True).reset_index()
+        data['Quarter'] = data['Quarter'].dt.to_timestamp()
+        x_axis = "Quarter"
+    
+    melted_data = data.melt(
+        id_vars=[x_axis],
+        value_vars=list(service_mapping.values()),
+        var_name="Transport Service",
+        value_name="Percentage"
+    )
+    
+    melted_data["Short Name"] = melted_data["Transport Service"].map(service_short_names)
+
+    selected_data = melted_data[melted_data["Transport Service"] == selected_column]
+    other_data = melted_data[melted_data["Transport Service"] != selected_column]
+    reordered_data = pd.concat([other_data, selected_data])  # Selected service last
+    
+    updated_line_chart = px.line(
+        reordered_data,
+        x=x_axis,
+        y="Percentage",
+        color="Transport Service",
+        title=f"{granularity.capitalize()} Recovery Trends by Service",
+        custom_data=["Short Name"]  # Add short names for hovertemplate
+    )
+    
+    updated_line_chart.for_each_trace(lambda trace: trace.update(
+            line=dict(
+                width= 3.3 , # if trace.name == selected_column else 2.65,
+                color=service_colors_line_chart[trace.name] if trace.name == selected_column else default_color
+            ),
+            hovertemplate=(
+                "Service: %{customdata[0]}<br>"
+                "Date: %{x}<br>"
+                "Value: %{y:.1%}<extra></extra>"
+            )
+        )
+    )
+    
+    updated_line_chart.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        showlegend=False,
+        font=dict(size=11),
+        title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y=1),
+        margin=dict(l=20, r=20, t=35, b=20),
+        xaxis_title=None,
+        yaxis_title=None,
+        xaxis=dict(automargin=True, showgrid=False, zeroline=False),
+        yaxis=dict(automargin=True, tickformat="0%", showgrid=False, zeroline=False),
+        template="plotly_dark",
+        shapes=[dict(type="line", x0=0, x1=1, xref="paper", y0=1, y1=1, yref="y", line=dict(color="grey", width=2, dash="dot"))]
+    )
+
+
+
+    # --- Updating  yearly figure
+
+    selected_year_int = int(selected_year) if selected_year != "All" else None
+    color_yearly = [
+        service_colors[selected_service] if selected_year_int is None or year == selected_year_int else "#484E54"
+        for year in yearly_avg["Year"]
+    ]
+    
+    updated_yearly_fig = px.bar(
+        yearly_avg,
+        x=selected_column,
+        y='Year',
+        orientation='h',
+        title="Yearly Average Recovery"
+    ).update_traces(
+        marker=dict(line=dict(width=0)),
+        marker_color= color_yearly,
+        hovertemplate="Year: %{y}<br>Average: %{x:.1%}<extra></extra>"
+    ).update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(size=11),
+        title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y=1),
+        margin=dict(l=20, r=20, t=35, b=20),
+        xaxis_title=None, yaxis_title=None,
+        xaxis=dict(automargin=True, tickformat="0%", showgrid=False, zeroline=False),
+        yaxis=dict(type="category", ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False),
+        template="plotly_dark"
+    )
+
+
+    # --- Updating  monthly figure
+
+    updated_monthly_fig = px.bar(
+        monthly_avg_b,
+        x='Month_Name',
+        y=selected_column,
+        title="Monthly Average Recovery"
+    ).update_traces(
+        marker=dict(line=dict(width=0)),
+        marker_color=color,
+        hovertemplate="Month: %{x}<br>Average: %{y:.1%}<extra></extra>" 
+    ).update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(size=11),
+        title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y=1),
+        margin=dict(l=20, r=20, t=35, b=20),
+        xaxis_title=None, yaxis_title=None,
+        xaxis=dict(ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False),
+        yaxis=dict(automargin=True, tickformat="0%", showgrid=False, zeroline=False),
+        template="plotly_dark"
+    )
+
+    
+    # --- Updating  daily figure
+    
+    updated_day_of_week_fig = px.bar(
+        day_of_week_avg,
+        x='Day_of_Week',
+        y=selected_column,
+        title="Day of the Week Average Recovery"
+    ).update_traces(
+        marker=dict(line=dict(width=0)),
+        marker_color=color,
+        hovertemplate="Day: %{x}<br>Average: %{y:0.0%}<extra></extra>"
+    ).update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(size=11),
+        title=dict(font=dict(size=15), pad=dict(b=20), x=0.01, y=1),
+        margin=dict(l=20, r=20, t=35, b=20),
+        xaxis_title=None, yaxis_title=None,
+        xaxis=dict(ticks="outside", ticklen=2, tickcolor="rgba(0,0,0,0)", automargin=True, showgrid=False, zeroline=False),
+        yaxis=dict(automargin=True, tickformat="0%", showgrid=False, zeroline=False),
+        template="plotly_dark"
+    )
+
+
+    # --- Returning
+    
+    return updated_metrics_row, updated_bar_chart, updated_line_chart, updated_yearly_fig, updated_monthly_fig, updated_day_of_week_fig
@@ -0,0 +1,75 @@
+"""p50/p99 latency of update_dashboard over every input combination.
+
+    python benchmarks/bench_callback.py [--rounds N] [--limit N]
+
+"baseline" is the callback from before the aggregate cube (copied into
+baseline_callback.py), filtering and grouping the full frame on every call.
+"rebuild" is the current callback with the cube and figure cache cleared
+before every call, so each call first rebuilds the cube entry it reads;
+"warm" keeps the cube but still builds figures; "cached" is a figure cache hit.
+"""
+import argparse
+import itertools
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import MTA_Dashboard as dashboard  # noqa: E402
+import baseline_callback  # noqa: E402
+
+
+def input_combinations():
+    years = ["All"] + [str(year) for year in dashboard.aggregate_cube.years()]
+    metrics = ["average", "days_100", "days_50"]
+    services = list(dashboard.service_mapping)
+    granularities = ["monthly", "weekly", "quarterly"]
+    return list(itertools.product(years, metrics, services, granularities))
+
+
+def measure(combinations, rounds, before_each=None, callback=None):
+    callback = callback or dashboard.update_dashboard
+    timings = []
+    for _ in range(rounds):
+        for args in combinations:
+            if before_each is not None:
+                before_each()
+            start = time.perf_counter()
+            callback(*args)
+            timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+
+def report(label, timings):
+    p50, p99 = np.percentile(timings, [50, 99])
+    print(f"{label:<8} calls={len(timings):<6} p50={p50:9.3f} ms  p99={p99:9.3f} ms  mean={timings.mean():9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=None, help="only time an evenly spaced subset of combinations")
+    args = parser.parse_args()
+
+    combinations = input_combinations()
+    if args.limit:
+        combinations = combinations[::max(1, len(combinations) // args.limit)][:args.limit]
+
+    def clear_all():
+        dashboard.aggregate_cube.clear()
+        dashboard.figure_cache.invalidate()
+
+    report("baseline", measure(combinations, args.rounds, callback=baseline_callback.update_dashboard))
+    report("rebuild", measure(combinations, args.rounds, before_each=clear_all))
+    dashboard.aggregate_cube.build()
+    report("warm", measure(combinations, args.rounds, before_each=dashboard.figure_cache.invalidate))
+    measure(combinations, 1)  # fill the figure cache
+    report("cached", measure(combinations, args.rounds))
+    print(dashboard.figure_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
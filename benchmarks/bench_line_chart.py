@@ -0,0 +1,123 @@
+"""Time and memory allocated per line chart build, direct traces vs. the old melt / concat / px.line path.
+
+    python benchmarks/bench_line_chart.py [--rounds N]
+
+Both builders thin the same per-service series for every (year, service,
+granularity) state. Allocations are traced with tracemalloc, numpy buffers
+included: ``peak`` is the most memory a call held at once, ``retained`` and
+``blocks`` the bytes and number of allocations still live when it returns
+(the figure itself included).
+"""
+import argparse
+import itertools
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import MTA_Dashboard as dashboard  # noqa: E402
+from downsampling import date_array, downsample_indices, typed_array  # noqa: E402
+
+
+def melt_line_chart(selected_year, selected_service, granularity, max_points):
+    # The line chart as built before direct traces: long format, reorder by concat, px regroups by color
+    selected_column = dashboard.service_mapping[selected_service]
+    columns = list(dashboard.service_mapping.values())
+    if granularity == dashboard.DAILY:
+        x_axis = "Date"
+        data = dashboard.daily_rows(selected_year)[["Date"] + columns]
+    else:
+        x_axis = dashboard.GRANULARITY_COLUMNS[granularity]
+        data = dashboard.aggregate_cube.year(selected_year).trends[granularity]
+
+    melted = data.melt(id_vars=[x_axis], value_vars=columns, var_name="Transport Service", value_name="Percentage")
+    if len(data) > max_points:
+        x_values = data[x_axis].to_numpy().astype("datetime64[ns]").astype("int64")
+        keep = np.concatenate([
+            position * len(data) + downsample_indices(x_values, data[column].to_numpy(), max_points, dashboard.DOWNSAMPLE_METHOD)
+            for position, column in enumerate(columns)
+        ])
+        melted = melted.iloc[keep]
+    reordered = pd.concat([
+        melted[melted["Transport Service"] != selected_column], melted[melted["Transport Service"] == selected_column]
+    ])
+
+    figure = px.line(reordered, x=x_axis, y="Percentage", color="Transport Service",
+                     render_mode="webgl" if granularity == dashboard.DAILY else "auto")
+    figure.for_each_trace(lambda trace: trace.update(line=dict(
+        width=3.3,
+        color=dashboard.service_colors_line_chart[trace.name] if trace.name == selected_column else dashboard.default_color,
+    )))
+    figure.update_layout(template="plotly_dark", uirevision=f"{selected_year}-{granularity}")
+    encoded = figure.to_plotly_json()
+    for trace, source in zip(encoded["data"], figure.data):
+        trace["x"] = date_array(source.x)
+        trace["y"] = typed_array(source.y, "f4")
+    return encoded
+
+
+def direct_line_chart(selected_year, selected_service, granularity, max_points):
+    return dashboard.line_chart_figure(selected_year, selected_service, granularity, max_points)
+
+
+def measure(build, states, rounds):
+    timings, allocated, peaks, blocks = [], [], [], []
+    for _ in range(rounds):
+        for state in states:
+            start = time.perf_counter()
+            build(*state)
+            timings.append(time.perf_counter() - start)
+
+    # Allocation pass apart from the timed one; tracemalloc slows every allocation down
+    tracemalloc.start()
+    for state in states:
+        tracemalloc.clear_traces()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        figure = build(*state)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        difference = after.compare_to(before, "lineno")
+        allocated.append(sum(stat.size_diff for stat in difference if stat.size_diff > 0))
+        blocks.append(sum(stat.count_diff for stat in difference if stat.count_diff > 0))
+        peaks.append(peak - base)
+        del figure
+    tracemalloc.stop()
+    return np.array(timings) * 1000, np.array(allocated), np.array(peaks), np.array(blocks)
+
+
+def report(label, timings, allocated, peaks, blocks):
+    print(f"{label:<7} p50={np.percentile(timings, 50):8.2f} ms  mean={timings.mean():8.2f} ms  "
+          f"peak={np.mean(peaks) / 1024:9.1f} KiB  retained={np.mean(allocated) / 1024:8.1f} KiB  "
+          f"blocks={np.mean(blocks):8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=1)
+    args = parser.parse_args()
+
+    dashboard.latest_snapshot()
+    years = ["All"] + [str(year) for year in dashboard.aggregate_cube.years()]
+    granularities = ["monthly", "weekly", "quarterly", dashboard.DAILY]
+    states = [(year, service, granularity, dashboard.LINE_CHART_WIDTH)
+              for year, service, granularity in itertools.product(years, dashboard.service_mapping, granularities)]
+
+    # Template layouts and px's lazily imported modules aren't part of a call
+    direct_line_chart(*states[0])
+    melt_line_chart(*states[0])
+
+    print(f"{len(states)} states")
+    report("melt", *measure(melt_line_chart, states, args.rounds))
+    report("direct", *measure(direct_line_chart, states, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
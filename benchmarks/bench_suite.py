@@ -0,0 +1,260 @@
+"""Startup, callback latency and memory benchmarks at several data sizes, written as JSON.
+
+    python benchmarks/bench_suite.py [--scales 1,10,100,1000] [--limit N] [--output FILE]
+    python benchmarks/bench_suite.py compare OLD.json NEW.json
+
+Scale 1 is Data/MTA_Daily_Ridership.csv. Larger scales are synthetic CSVs
+with the same layout, grown by date range and by service count (see SCALES)
+from the real series plus seeded noise, so every run measures the same data.
+Each dataset is benchmarked in a fresh interpreter: the import, create_app()
+cold (no parsed snapshot) and warm, the data-prep stages on their own,
+update_dashboard over every selector state (rebuilt, then cached) and peak RSS.
+
+Results go to benchmarks/results/<commit>.json by default; ``compare``
+prints the ratio of every timing between two result files.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from data_loader import DEFAULT_CACHE_DIR, DEFAULT_DATA_PATH, source_hash  # noqa: E402
+
+
+# scale -> (date range factor, service count factor)
+SCALES = {1: (1, 1), 10: (10, 1), 100: (10, 10), 1000: (100, 10)}
+
+SEED = 2020
+SYNTHETIC_DIR = DEFAULT_CACHE_DIR / "bench"
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+# Synthetic ranges that would pass pandas' 2262 limit start here instead of at the real start date
+EARLIEST_START = pd.Timestamp("1700-01-01")
+
+# Callback states timed per synthetic dataset unless --limit says otherwise (scale 1 times all of them)
+DEFAULT_SYNTHETIC_LIMIT = 200
+
+
+def synthetic_path(scale):
+    date_factor, service_factor = SCALES[scale]
+    return SYNTHETIC_DIR / f"ridership-{scale}x-d{date_factor}-s{service_factor}-seed{SEED}.csv"
+
+
+def synthesize(scale):
+    """Write (once) the synthetic CSV for ``scale`` and return its path."""
+    path = synthetic_path(scale)
+    if path.exists():
+        return path
+
+    date_factor, service_factor = SCALES[scale]
+    real = pd.read_csv(DEFAULT_DATA_PATH, parse_dates=["Date"])
+    rng = np.random.default_rng(SEED)
+    rows = len(real) * date_factor
+
+    # Day arithmetic in datetime64[D]; a nanosecond Timedelta can't span the 1000x range
+    last_day = real["Date"].max().to_datetime64().astype("datetime64[D]")
+    start = pd.Timestamp(max(EARLIEST_START.to_datetime64().astype("datetime64[D]"), last_day - np.timedelta64(rows - 1, "D")))
+    columns = {"Date": pd.date_range(start, periods=rows, freq="D").strftime("%Y-%m-%d")}
+
+    for copy in range(service_factor):
+        for column in real.columns[1:]:
+            service, measure = column.split(": ", 1)
+            name = service if copy == 0 else f"{service} {copy + 1}"
+            values = np.resize(real[column].to_numpy(dtype="float64"), rows)
+            noise = rng.normal(1.0, 0.05, rows) if copy or date_factor > 1 else 1.0
+            # Ratios stay whole percentages like the source; blanks (NaN) stay blank
+            columns[f"{name}: {measure}"] = np.round(values * noise)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    pd.DataFrame(columns).to_csv(tmp, index=False, float_format="%.0f")
+    os.replace(tmp, path)
+    return path
+
+
+def stats(timings):
+    timings = np.asarray(timings) * 1000
+    if not len(timings):
+        return {}
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99])
+    return {"n": int(len(timings)), "mean_ms": float(timings.mean()), "p50_ms": float(p50),
+            "p90_ms": float(p90), "p99_ms": float(p99), "max_ms": float(timings.max())}
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def worker(path, limit, startup_only):
+    # Runs in a fresh interpreter with MTA_DATA_PATH=path; prints one JSON object
+    start = time.perf_counter()
+    import MTA_Dashboard as dashboard
+    result = {"import_s": time.perf_counter() - start}
+    _, result["create_app_s"] = timed(dashboard.create_app, None, {"WARMUP": "none", "WATCH_INTERVAL": 0})
+    result["rows"] = len(dashboard.df)
+    if startup_only:
+        print(json.dumps(result))
+        return
+
+    from aggregates import AggregateCube, PrefixSums
+    from data_loader import DateIndex, parse_csv
+
+    # Data prep stages on their own (create_app above ran them once already, snapshot aside)
+    raw, result["parse_csv_s"] = timed(parse_csv, path)
+    prepared, result["prepare_dataset_s"] = timed(dashboard.prepare_dataset, raw)
+    index, result["date_index_s"] = timed(DateIndex, prepared)
+    _, result["aggregate_cube_s"] = timed(lambda: AggregateCube(prepared, dashboard.service_mapping, index).build())
+    _, result["prefix_sums_s"] = timed(PrefixSums, index, dashboard.service_mapping)
+    del raw, prepared, index
+
+    states = dashboard.selector_states()
+    result["states_total"] = len(states)
+    if limit and len(states) > limit:
+        states = [states[position] for position in np.linspace(0, len(states) - 1, limit).astype(int)]
+
+    build, cached, by_granularity = [], [], {}
+    for state in states:
+        dashboard.figure_cache.invalidate()
+        _, elapsed = timed(dashboard.update_dashboard, *state)
+        build.append(elapsed)
+        by_granularity.setdefault(state[3], []).append(elapsed)
+    for state in states:
+        dashboard.update_dashboard(*state)  # fill
+    for state in states:
+        cached.append(timed(dashboard.update_dashboard, *state)[1])
+
+    result["callbacks"] = {
+        "states": len(states),
+        "build": stats(build),
+        "cached": stats(cached),
+        "build_by_granularity": {granularity: stats(values) for granularity, values in by_granularity.items()},
+    }
+    result["memory"] = dashboard.memory_report()
+    result["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kB on Linux
+    print(json.dumps(result))
+
+
+def run_worker(path, limit=None, startup_only=False):
+    env = dict(os.environ, MTA_DATA_PATH=str(path), MTA_DATA_REFRESH="0", MTA_WATCH_INTERVAL="0")
+    env.pop("MTA_SHARED_DATA_DIR", None)
+    command = [sys.executable, __file__, "worker", str(path), "--limit", str(limit or 0)]
+    if startup_only:
+        command.append("--startup-only")
+    output = subprocess.run(command, env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark(scale, limit):
+    path = DEFAULT_DATA_PATH if scale == 1 else synthesize(scale)
+    limit = limit if limit is not None else (0 if scale == 1 else DEFAULT_SYNTHETIC_LIMIT)
+
+    # Cold start: drop the parsed snapshot so the import pays for CSV parsing
+    for snapshot in DEFAULT_CACHE_DIR.glob(f"ridership-*-{source_hash(path)}.pkl"):
+        snapshot.unlink()
+
+    result = run_worker(path, limit)
+    warm = run_worker(path, startup_only=True)
+    result["import_cold_s"], result["import_warm_s"] = result.pop("import_s"), warm["import_s"]
+    result["create_app_cold_s"], result["create_app_warm_s"] = result.pop("create_app_s"), warm["create_app_s"]
+    result.update(scale=scale, date_factor=SCALES[scale][0], service_factor=SCALES[scale][1],
+                  source=str(path), source_bytes=os.path.getsize(path))
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            items.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return items
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(old_path, new_path):
+    old, new = json.loads(Path(old_path).read_text()), json.loads(Path(new_path).read_text())
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for dataset in new["datasets"]:
+        if dataset not in old["datasets"]:
+            continue
+        before, after = flatten(old["datasets"][dataset]), flatten(new["datasets"][dataset])
+        for key in sorted(after):
+            if key in before and key.endswith(("_s", "_ms", "_bytes")) and before[key]:
+                ratio = after[key] / before[key]
+                flag = "  !" if ratio > 1.1 else ""
+                print(f"{dataset:>6} {key:<48} {before[key]:>14.4g} {after[key]:>14.4g} {ratio:7.2f}x{flag}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["compare"]:
+        parser = argparse.ArgumentParser(description="Compare two bench_suite result files")
+        parser.add_argument("old")
+        parser.add_argument("new")
+        args = parser.parse_args(argv[1:])
+        compare(args.old, args.new)
+        return 0
+
+    if argv[:1] == ["worker"]:
+        parser = argparse.ArgumentParser()
+        parser.add_argument("path")
+        parser.add_argument("--limit", type=int, default=0)
+        parser.add_argument("--startup-only", action="store_true")
+        args = parser.parse_args(argv[1:])
+        worker(args.path, args.limit, args.startup_only)
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1,10,100,1000", help=f"comma-separated, from {sorted(SCALES)}")
+    parser.add_argument("--limit", type=int, default=None,
+                        help=f"callback states timed per dataset (default: all at scale 1, {DEFAULT_SYNTHETIC_LIMIT} otherwise)")
+    parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": SEED,
+        },
+        "datasets": {},
+    }
+    for scale in (int(item) for item in args.scales.split(",")):
+        print(f"scale {scale}x ...", file=sys.stderr)
+        report["datasets"][f"{scale}x"] = benchmark(scale, args.limit)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Time `import MTA_Dashboard` against the libraries it imports, in fresh interpreters.
+
+    python benchmarks/import_time.py [--runs N] [--target SECONDS]
+
+The dashboard module should only define things at import; data loading and
+figure construction wait for create_app(). The overhead over importing Dash,
+plotly, pandas and numpy alone is what the module itself costs, and must stay
+under --target (exit status 1 otherwise).
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+LIBRARIES = "import dash, dash_bootstrap_components, flask, numpy, pandas, plotly.express"
+
+TIMER = "import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+
+# Seconds the module may add on top of its libraries
+DEFAULT_TARGET = 0.15
+
+
+def timed_import(statement):
+    output = subprocess.run([sys.executable, "-c", TIMER.format(statement=statement)], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement (median is kept)")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET, help="allowed overhead over the libraries, seconds")
+    args = parser.parse_args(argv)
+
+    # Interleaved so a noisy moment hits both sides
+    libraries, dashboard = [], []
+    for _ in range(args.runs):
+        libraries.append(timed_import(LIBRARIES))
+        dashboard.append(timed_import(f"{LIBRARIES}; import MTA_Dashboard"))
+
+    libraries, dashboard = statistics.median(libraries), statistics.median(dashboard)
+    overhead = dashboard - libraries
+    print(f"libraries {libraries:.3f}s  MTA_Dashboard {dashboard:.3f}s  overhead {overhead:.3f}s  target {args.target:.3f}s")
+    return 0 if overhead <= args.target else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Per-worker memory footprint of the prepared dataset and derived structures.
+
+    python benchmarks/memory_report.py [--json]
+
+Each server worker holds one copy of everything listed here; use the total
+(plus the process baseline shown as peak RSS) to decide how many workers fit.
+"""
+import argparse
+import json
+import resource
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import MTA_Dashboard as dashboard  # noqa: E402
+
+
+# Everything a snapshot holds; rolling windows are filled as views are first drawn, totals once they are read
+PARTS = ("df", "aggregate_cube", "prefix_sums", "rolling_windows", "forecasts", "ridership_totals", "date_index")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    report = dashboard.memory_report()
+    report["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kB on Linux
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"rows: {report['rows']}")
+    for column, size in report["df_columns"].items():
+        print(f"  {column:<58} {size / 1024:10.1f} KiB")
+    for part in PARTS:
+        print(f"{part:<60} {report[part] / 1024:10.1f} KiB")
+    print(f"{'total':<60} {sum(report[part] for part in PARTS) / 1024:10.1f} KiB")
+    print(f"{'peak_rss':<60} {report['peak_rss'] / 2**20:10.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
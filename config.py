@@ -0,0 +1,88 @@
+import os
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_floats(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return tuple(default)
+    return tuple(float(item) for item in value.split(",") if item.strip())
+
+
+# Service/year highlighting runs in the browser; the server only ships per-year series
+CLIENTSIDE_HIGHLIGHT = env_flag("MTA_CLIENTSIDE_HIGHLIGHT")
+
+# "Days ≥ / ≤ X% Recovery" KPI thresholds, as ratios of the pre-pandemic day
+RECOVERY_THRESHOLD_HIGH = env_float("MTA_RECOVERY_THRESHOLD_HIGH", 1.0)
+RECOVERY_THRESHOLD_LOW = env_float("MTA_RECOVERY_THRESHOLD_LOW", 0.5)
+
+# Extra per-service quantiles computed with the summary metrics (0.5 is exposed as "median")
+SUMMARY_QUANTILES = env_floats("MTA_SUMMARY_QUANTILES", (0.5,))
+
+# Trailing windows, in days, of the rolling mean / median line chart views
+ROLLING_WINDOWS = tuple(int(days) for days in env_floats("MTA_ROLLING_WINDOWS", (7, 28, 91)))
+
+# Days the per-service recovery projection extends the "All" line chart (0 disables forecasting), and the
+# processes fitting it (0: a pool of one per CPU once there are 50+ services, otherwise in-process)
+FORECAST_DAYS = env_int("MTA_FORECAST_DAYS", 730)
+FORECAST_WORKERS = env_int("MTA_FORECAST_WORKERS", 0)
+
+# Seconds between checks of the source CSV for newly appended days (0 disables watching)
+WATCH_INTERVAL = env_float("MTA_WATCH_INTERVAL", 0)
+
+# Seconds between full background reloads of the source, swapped in once rebuilt (0 disables refreshing).
+# With MTA_DATA_REFRESH=1 each reload pulls the remote file first.
+REFRESH_INTERVAL = env_float("MTA_REFRESH_INTERVAL", 0)
+
+# Directory with a prepared, memory-mapped dataset written by `python shared_data.py DIR`
+SHARED_DATA_DIR = os.environ.get("MTA_SHARED_DATA_DIR") or None
+
+# Where the per-year aggregates are computed: "pandas" in memory, or pushed down to an embedded "sqlite" /
+# "duckdb" database at MTA_QUERY_DB (default .cache/ridership-<version>.<backend>)
+QUERY_BACKEND = os.environ.get("MTA_QUERY_BACKEND", "pandas").strip().lower()
+QUERY_DB = os.environ.get("MTA_QUERY_DB") or None
+
+# Production server (wsgi.py / gunicorn.conf.py / `python MTA_Dashboard.py`)
+SERVER_HOST = os.environ.get("MTA_HOST", "0.0.0.0")
+SERVER_PORT = env_int("MTA_PORT", 8050)
+SERVER_WORKERS = env_int("MTA_WORKERS", 2 * (os.cpu_count() or 1) + 1)
+SERVER_THREADS = env_int("MTA_THREADS", 4)
+
+# Figure cache warmup before serving / forking: "none", "default" (initial selector state) or "all"
+WARMUP = os.environ.get("MTA_WARMUP", "default").strip().lower()
+
+# Server-side cache of whole Dash callback responses: at most this many bodies (0 disables) and this many bytes
+HTTP_CACHE_SIZE = env_int("MTA_HTTP_CACHE_SIZE", 1024)
+HTTP_CACHE_BYTES = env_int("MTA_HTTP_CACHE_BYTES", 32 * 1024 * 1024)
+
+# Line chart payload: traces are thinned ("lttb", "minmax" or "none") to about one point per pixel of
+# MTA_LINE_CHART_WIDTH, then further until the figure JSON is under MTA_FIGURE_BYTE_BUDGET bytes (0: no budget)
+LINE_CHART_WIDTH = env_int("MTA_LINE_CHART_WIDTH", 1200)
+DOWNSAMPLE_METHOD = os.environ.get("MTA_DOWNSAMPLE", "lttb").strip().lower()
+FIGURE_BYTE_BUDGET = env_int("MTA_FIGURE_BYTE_BUDGET", 256 * 1024)
+
+# Per-stage timing histograms and the Prometheus /metrics endpoint
+METRICS_ENABLED = env_flag("MTA_METRICS", True)
+
+# Fraction of callback requests run under a profiler ("cprofile" or "pyinstrument"), written to MTA_PROFILE_DIR.
+# MTA_PROFILE_TOGGLE=1 adds /_profile for reading / changing the rate at runtime (POST rate=0.05).
+PROFILE_RATE = env_float("MTA_PROFILE_RATE", 0)
+PROFILER = os.environ.get("MTA_PROFILER", "cprofile").strip().lower()
+PROFILE_DIR = os.environ.get("MTA_PROFILE_DIR") or None
+PROFILE_TOGGLE = env_flag("MTA_PROFILE_TOGGLE")
@@ -0,0 +1,291 @@
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+import threading
+import urllib.request
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import env_flag
+
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Local copy shipped with the repo, used unless MTA_DATA_PATH points elsewhere
+DEFAULT_DATA_PATH = BASE_DIR / "Data" / "MTA_Daily_Ridership.csv"
+
+# Remote source, only fetched when a refresh is requested
+REMOTE_DATA_URL = "https://raw.githubusercontent.com/plotly/datasets/refs/heads/master/MTA_Ridership_by_DATA_NY_GOV.csv"
+
+# Parsed snapshots live here, one pickle per source hash
+DEFAULT_CACHE_DIR = BASE_DIR / ".cache"
+
+SNAPSHOT_FORMAT = 3  # bump when the parsing below changes so old snapshots are ignored
+
+
+# The dashboard only reads the "% of Comparable Pre-Pandemic Day" columns; the totals are loaded on request
+RATIO_MARKER = "% of Comparable Pre-Pandemic Day"
+
+
+def ratio_columns(header):
+    return [column for column in header if RATIO_MARKER in column]
+
+
+def total_columns(header):
+    return [column for column in header if column != "Date" and RATIO_MARKER not in column]
+
+
+def source_hash(path):
+    digest = hashlib.sha1(f"v{SNAPSHOT_FORMAT}".encode())
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def frame_hash(df):
+    # Content version of a frame that didn't come straight from a file, in place of source_hash()
+    digest = hashlib.sha1(f"v{SNAPSHOT_FORMAT}".encode())
+    digest.update("\0".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return f"frame-{digest.hexdigest()[:16]}"
+
+
+def _atomic_write(path, write):
+    # Write to a temp file in the same directory then rename, so readers never see a partial file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def fetch_remote(url=REMOTE_DATA_URL, cache_dir=DEFAULT_CACHE_DIR, timeout=30):
+    target = Path(cache_dir) / "remote" / Path(url).name
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        payload = response.read()
+    _atomic_write(target, lambda fh: fh.write(payload))
+    return target
+
+
+def csv_dtypes(columns):
+    # Every column except Date is numeric; blanks (services not reported yet) become NaN.
+    # Ratios are whole percentages, exact in float32; totals run into the millions so stay float64.
+    return {column: "float32" if RATIO_MARKER in column else "float64" for column in columns if column != "Date"}
+
+
+def parse_csv(path, kind="ratios"):
+    header = list(pd.read_csv(path, nrows=0).columns)
+    columns = ["Date"] + (ratio_columns(header) if kind == "ratios" else total_columns(header))
+
+    df = pd.read_csv(path, usecols=columns, dtype=csv_dtypes(columns), parse_dates=["Date"])[columns]
+
+    if not pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")  # Mixed/invalid dates fall back to coercion
+    df = df.dropna(subset=["Date"])  # Drop rows where Date is invalid
+
+    # Date order lets DateIndex answer year / date-range filters with slices
+    if not df["Date"].is_monotonic_increasing:
+        df = df.sort_values("Date", kind="stable")
+
+    return df.reset_index(drop=True)
+
+
+def read_appended_rows(path, offset, columns):
+    """Parse only the complete lines written to ``path`` after byte ``offset``.
+
+    Returns (rows, new_offset). A trailing line without a newline is left for
+    the next call, so a half-written row is never ingested.
+    """
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        payload = fh.read()
+
+    end = payload.rfind(b"\n") + 1
+    if end == 0:
+        return None, offset
+
+    rows = pd.read_csv(io.BytesIO(payload[:end]), header=None, names=list(columns), dtype=csv_dtypes(columns), parse_dates=["Date"])
+    if not pd.api.types.is_datetime64_any_dtype(rows["Date"]):
+        rows["Date"] = pd.to_datetime(rows["Date"], errors="coerce")
+    rows = rows.dropna(subset=["Date"]).sort_values("Date", kind="stable").reset_index(drop=True)
+
+    return rows, offset + end
+
+
+class SourceWatcher(threading.Thread):
+    """Polls the ridership CSV and hands newly appended rows to ``on_rows``.
+
+    The MTA file only ever grows by one line a day, so the watcher remembers
+    the byte offset it has read up to. If the file shrinks (replaced rather
+    than appended to) ``on_replaced`` is called so the caller can do a full reload.
+    """
+
+    def __init__(self, path, offset, columns, on_rows, on_replaced=None, interval=60):
+        super().__init__(name="ridership-watcher", daemon=True)
+        self.path = Path(path)
+        self.offset = offset
+        self.columns = list(columns)
+        self.on_rows = on_rows
+        self.on_replaced = on_replaced
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def poll(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+        # The offset only moves once the callback has taken the rows, so a failed ingest / reload is retried next poll
+        if size < self.offset:
+            if self.on_replaced is not None:
+                self.on_replaced()
+            self.offset = size
+            return 0
+
+        if size == self.offset:
+            return 0
+
+        rows, offset = read_appended_rows(self.path, self.offset, self.columns)
+        ingested = self.on_rows(rows) if rows is not None and not rows.empty else 0
+        self.offset = offset
+        return ingested
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as exc:  # keep watching; a bad line shouldn't kill the thread
+                warnings.warn(f"Could not ingest new rows from {self.path}: {exc}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+class Refresher(threading.Thread):
+    """Calls ``refresh`` every ``interval`` seconds, e.g. a full reload of the source off the request path."""
+
+    def __init__(self, refresh, interval=3600):
+        super().__init__(name="ridership-refresher", daemon=True)
+        self.refresh = refresh
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as exc:  # keep the current data and try again next time
+                warnings.warn(f"Could not refresh the ridership data: {exc}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def resolve_source(path=None, refresh=None, url=None, cache_dir=DEFAULT_CACHE_DIR):
+    path = Path(path or os.environ.get("MTA_DATA_PATH") or DEFAULT_DATA_PATH)
+    refresh = env_flag("MTA_DATA_REFRESH") if refresh is None else refresh
+    url = url or os.environ.get("MTA_DATA_URL") or REMOTE_DATA_URL
+
+    if refresh:
+        try:
+            return fetch_remote(url, cache_dir)
+        except OSError as exc:
+            # Network-isolated hosts keep working from the local file
+            warnings.warn(f"Could not refresh ridership data from {url} ({exc}); using {path}")
+
+    return path
+
+
+def load_ridership(path=None, refresh=None, url=None, cache_dir=DEFAULT_CACHE_DIR, use_snapshot=True, kind="ratios"):
+    """Load the daily ridership frame, local file first.
+
+    ``kind="ratios"`` (the default) reads Date plus the "% of Comparable
+    Pre-Pandemic Day" columns as float32; ``kind="totals"`` reads Date plus the
+    ridership / traffic counts, which the dashboard itself never uses.
+
+    The parsed frame is pickled under ``cache_dir`` keyed by the hash of the
+    source file, so a warm start skips CSV parsing and date coercion. The hash
+    is exposed as ``df.attrs["version"]``; ``source``, ``source_size`` and
+    ``header`` record where the rows came from so a SourceWatcher can pick up
+    appended lines.
+    """
+    source = resolve_source(path, refresh, url, cache_dir)
+    size = os.path.getsize(source)
+    version = source_hash(source)
+    header = list(pd.read_csv(source, nrows=0).columns)
+    snapshot = Path(cache_dir) / f"ridership-{kind}-{version}.pkl"
+
+    if use_snapshot and snapshot.exists():
+        try:
+            df = pd.read_pickle(snapshot)
+            df.attrs.update(version=version, source=str(source), source_size=size, header=header)
+            return df
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass  # Stale or corrupt snapshot, re-parse below
+
+    df = parse_csv(source, kind)
+
+    if use_snapshot:
+        try:
+            _atomic_write(snapshot, lambda fh: pickle.dump(df, fh, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError:
+            pass  # Read-only checkout; we just won't have a warm start
+
+    df.attrs.update(version=version, source=str(source), source_size=size, header=header)
+    return df
+
+
+class DateIndex:
+    """Row offsets into a Date-sorted frame.
+
+    Filtering by year or by a date range becomes a positional slice found with
+    a dict lookup or a binary search, instead of a boolean mask over every row.
+    """
+
+    def __init__(self, df, year_offsets=None):
+        self.df = df
+        self.dates = df["Date"].to_numpy()
+
+        if year_offsets is not None:
+            # Offsets computed by whoever prepared (and sorted) df, e.g. a shared export
+            self.year_offsets = dict(year_offsets)
+            return
+
+        if len(self.dates) and (np.diff(self.dates) < np.timedelta64(0)).any():
+            raise ValueError("DateIndex needs a frame sorted by Date")
+
+        # year -> (start, stop) row offsets
+        years = df["Date"].dt.year.to_numpy()
+        boundaries = np.flatnonzero(np.diff(years)) + 1
+        starts = np.r_[0, boundaries]
+        stops = np.r_[boundaries, len(years)]
+        self.year_offsets = {int(years[start]): (int(start), int(stop)) for start, stop in zip(starts, stops) if stop > start}
+
+    def years(self):
+        return list(self.year_offsets)
+
+    def year(self, year):
+        start, stop = self.year_offsets.get(int(year), (0, 0))
+        return self.df.iloc[start:stop]
+
+    def positions(self, start=None, end=None):
+        # Inclusive [start, end] as half-open row offsets
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)), side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end)), side="right"))
+        return lo, max(lo, hi)
+
+    def date_range(self, start=None, end=None):
+        lo, hi = self.positions(start, end)
+        return self.df.iloc[lo:hi]
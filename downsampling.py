@@ -0,0 +1,116 @@
+import base64
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+
+# Smallest per-trace point count the byte budget may shrink a figure to
+MIN_POINTS = 64
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: ``threshold`` indices that keep the visual shape of (x, y).
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the average of the next bucket.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # threshold - 2 buckets between the end points
+
+    # Average of every bucket's successor in one pass: bucket b + 1 spans [edges[b + 1], edges[b + 2]), the last one
+    # just the final point; edges are strictly increasing, so no segment is empty
+    next_sizes = np.diff(np.r_[edges[1:], n])
+    next_xs = np.add.reduceat(x, edges[1:]) / next_sizes
+    next_ys = np.add.reduceat(y, edges[1:]) / next_sizes
+
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    kept = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_x, next_y = next_xs[bucket], next_ys[bucket]
+
+        areas = np.abs(
+            (x[kept] - next_x) * (y[start:stop] - y[kept]) - (x[kept] - x[start:stop]) * (next_y - y[kept])
+        )
+        kept = start + int(areas.argmax())
+        indices[bucket + 1] = kept
+    return indices
+
+
+def minmax_indices(y, threshold):
+    # Min and max of each of threshold / 2 buckets, so spikes survive however far the series is thinned
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, threshold // 2 + 1).astype(int)
+    indices = [0, n - 1]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop > start:
+            indices += [start + int(np.argmin(y[start:stop])), start + int(np.argmax(y[start:stop]))]
+    return np.unique(indices)
+
+
+def downsample_indices(x, y, threshold, method="lttb"):
+    """Row positions to keep so a trace of (x, y) has about ``threshold`` points.
+
+    NaNs mark days or periods a service didn't report, which plotly draws as
+    gaps; they are left out of the selection, and the first NaN of every run
+    is kept so the gaps still show.
+    """
+    y = np.asarray(y, dtype="float64")
+    if method == "none" or len(y) <= threshold:
+        return np.arange(len(y))
+
+    finite = np.flatnonzero(~np.isnan(y))
+    gap_starts = np.flatnonzero(np.isnan(y) & ~np.isnan(np.r_[np.nan, y[:-1]]))
+
+    if method == "minmax":
+        chosen = minmax_indices(y[finite], threshold)
+    else:
+        chosen = lttb_indices(np.asarray(x, dtype="float64")[finite], y[finite], threshold)
+    return np.union1d(finite[chosen], gap_starts)
+
+
+def typed_array(values, dtype):
+    # plotly.js typed-array spec: base64 of the raw little-endian buffer
+    array = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": np.dtype(dtype).str[1:], "bdata": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def date_array(values):
+    # Dates as epoch milliseconds, which a date axis reads exactly like ISO strings at a fraction of the size
+    milliseconds = np.asarray(values, dtype="datetime64[ns]").astype("datetime64[ms]").astype("int64")
+    return typed_array(milliseconds, "f8")
+
+
+# Encoded size of one thinned point: base64 of its own f8 date and f4 ratio
+POINT_NBYTES = 16
+
+
+def points_within(budget, traces, max_points):
+    # Per-trace point count whose x / y arrays alone fit ``budget`` bytes, so fit_budget starts close
+    # instead of halving (and rebuilding every trace) once per doubling of the service count
+    if budget <= 0 or traces <= 0:
+        return max_points
+    return max(MIN_POINTS, min(max_points, budget // (traces * POINT_NBYTES)))
+
+
+def figure_nbytes(figure):
+    return len(to_json_plotly(figure))
+
+
+def fit_budget(build, max_points, budget):
+    """Call ``build(max_points)``, halving the point count until the figure's JSON fits in ``budget`` bytes."""
+    figure = build(max_points)
+    while budget > 0 and max_points > MIN_POINTS and figure_nbytes(figure) > budget:
+        max_points = max(MIN_POINTS, max_points // 2)
+        figure = build(max_points)
+    return figure
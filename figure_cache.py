@@ -0,0 +1,115 @@
+import threading
+from collections import OrderedDict
+
+from config import env_int
+
+
+DEFAULT_CACHE_SIZE = 1024  # enough for every (year, metric, service, granularity) combination of the bundled data
+
+
+def cache_size_from_env(default=DEFAULT_CACHE_SIZE):
+    return env_int("MTA_FIGURE_CACHE_SIZE", default)
+
+
+class FigureCache:
+    """Bounded LRU cache of serialized callback outputs.
+
+    Entries are tied to a dataset version; switching version drops everything
+    (or only what ``invalidate`` picks), so a reloaded dataset never serves
+    figures built from the old one. Callers reading an older snapshot pass
+    its version and get built, uncached results instead. With ``maxbytes``
+    the entries' ``sizeof`` is bounded too, least recently used out first.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, version=None, maxbytes=0, sizeof=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes  # 0: bounded by entry count only
+        self.sizeof = sizeof
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, version=None):
+        if self.maxsize <= 0:
+            return value
+        with self._lock:
+            if version is not None and version != self.version:
+                return value  # built from a snapshot that has since been swapped out
+            size = self.sizeof(value) if self.sizeof is not None else 0
+            if self.maxbytes and size > self.maxbytes:
+                return value  # would push out everything else
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.nbytes += size
+            while len(self._entries) > self.maxsize or (self.maxbytes and self.nbytes > self.maxbytes):
+                self._drop(next(iter(self._entries)))
+        return value
+
+    def _drop(self, key):
+        # Caller holds the lock
+        del self._entries[key]
+        self.nbytes -= self._sizes.pop(key)
+
+    def get_or_build(self, key, build, version=None):
+        # Build outside the lock; two concurrent misses on one key just both build it
+        if version is not None and version != self.version:
+            return build()
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.put(key, build(), version)
+        return value
+
+    def set_version(self, version, invalidate=True):
+        # invalidate: True drops every entry, False keeps them all, a callable drops the keys it matches
+        with self._lock:
+            if version == self.version:
+                return
+            if callable(invalidate):
+                for key in [key for key in self._entries if invalidate(key)]:
+                    self._drop(key)
+            elif invalidate:
+                self._clear()
+            self.version = version
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "bytes": self.nbytes,
+            "maxbytes": self.maxbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_MISSING = object()
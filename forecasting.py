@@ -0,0 +1,206 @@
+"""Per-service recovery projections: when does each service get back to 100%?
+
+Each service's recent daily ratios are deseasonalized by day of week, then a
+linear and a log-linear (exponential) trend are fitted by least squares and
+the one with the smaller error is kept. The trend is extended
+``horizon`` days past the last loaded day, and the first day it reaches the
+threshold is the projected crossing.
+
+Fits run before a snapshot is published, in a process pool when there are
+enough services to pay for one, and are pickled under .cache/ per dataset
+version; callbacks only slice the precomputed arrays.
+"""
+import os
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from aggregates import GRANULARITY_COLUMNS, PERIOD_FREQUENCIES, ordinals_to_timestamps
+from data_loader import DEFAULT_CACHE_DIR, _atomic_write
+
+
+FORECAST_FORMAT = 1  # bump when the fitting below changes so cached fits are ignored
+
+# Days of history each trend is fitted on; older days reflect an earlier phase of the recovery
+FIT_DAYS = 365
+
+# Fewer reported days than this in the fit window and the service gets no projection
+MIN_FIT_DAYS = 56
+
+# Crossings further out than this are reported as "not projected"
+MAX_CROSSING_DAYS = 20 * 365
+
+# With workers=0 (auto), a pool is only started for at least this many services; below it, spawning the
+# processes costs more than the fits (a few milliseconds each)
+POOL_MIN_SERVICES = 50
+
+DAY = np.timedelta64(1, "D")
+
+
+def weekdays(dates):
+    # Monday = 0, from days since the epoch (a Thursday)
+    return (dates.astype("datetime64[D]").astype("int64") + 3) % 7
+
+
+def least_squares(t, y):
+    # (intercept, slope) of y ~ a + b t
+    design = np.column_stack([np.ones_like(t), t])
+    (intercept, slope), *_ = np.linalg.lstsq(design, y, rcond=None)
+    return intercept, slope
+
+
+def fit_service(dates, values, horizon, threshold=1.0, fit_days=FIT_DAYS):
+    """Fit one service; ``dates`` / ``values`` are its whole daily history, NaN where not reported.
+
+    Returns a dict with the daily trend extension (starting on the last loaded
+    day so it joins the observed line), its per-period averages, the model
+    kept and the crossing date, or None when there is too little recent data.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    values = np.asarray(values, dtype="float64")
+    last = dates[-1]
+
+    recent = (dates > last - fit_days * DAY) & np.isfinite(values) & (values > 0)
+    if recent.sum() < MIN_FIT_DAYS:
+        return None
+    t = ((dates[recent] - last) / DAY).astype("float64")  # days before the last loaded one, <= 0
+    y = values[recent]
+    days = weekdays(dates[recent])
+
+    # Seasonal factors: each weekday's average ratio to a first straight-line trend, normalized to mean 1
+    intercept, slope = least_squares(t, y)
+    relative = y / np.maximum(intercept + slope * t, 1e-6)
+    factors = np.array([relative[days == day].mean() if (days == day).any() else 1.0 for day in range(7)])
+    factors /= factors.mean()
+    deseasonalized = y / factors[days]
+
+    candidates = {}
+    intercept, slope = least_squares(t, deseasonalized)
+    candidates["linear"] = (lambda at, a=intercept, b=slope: a + b * at, intercept, slope)
+    log_intercept, log_slope = least_squares(t, np.log(deseasonalized))
+    candidates["log"] = (lambda at, a=log_intercept, b=log_slope: np.exp(a + b * at), log_intercept, log_slope)
+
+    errors = {name: float(np.sum((trend(t) - deseasonalized) ** 2)) for name, (trend, _, _) in candidates.items()}
+    model = min(errors, key=errors.get)
+    trend, a, b = candidates[model]
+
+    # First day the trend reaches the threshold; already there means the last loaded day
+    if trend(0.0) >= threshold:
+        crossing = 0.0
+    elif b <= 0:
+        crossing = None
+    elif model == "linear":
+        crossing = float(np.ceil((threshold - a) / b))
+    else:
+        crossing = float(np.ceil((np.log(threshold) - a) / b))
+    if crossing is not None and crossing > MAX_CROSSING_DAYS:
+        crossing = None
+
+    steps = np.arange(horizon + 1, dtype="float64")
+    extension_dates = last + steps.astype("int64") * DAY
+    extension = trend(steps)
+    return {
+        "dates": extension_dates.astype("datetime64[ns]"),
+        "values": extension.astype("float32"),
+        "periods": period_means(extension_dates, extension),
+        "model": model,
+        "crossing": None if crossing is None else last + int(crossing) * DAY,
+        "fit_days": int(recent.sum()),
+        "rmse": float(np.sqrt(errors[model] / len(t))),
+    }
+
+
+def period_means(dates, values):
+    # granularity -> (period start timestamps, mean), from the period holding the last loaded day on
+    periods = {}
+    dates = pd.Series(dates.astype("datetime64[ns]"))
+    for granularity, x_axis in GRANULARITY_COLUMNS.items():
+        freq = PERIOD_FREQUENCIES[x_axis]
+        ordinals = dates.dt.to_period(freq).array.asi8
+        means = pd.Series(values).groupby(ordinals).mean()
+        means = means[means.index >= ordinals[0]]
+        periods[granularity] = (ordinals_to_timestamps(means.index, freq).to_numpy(), means.to_numpy(dtype="float32"))
+    return periods
+
+
+def _fit_job(job):
+    # Module-level so the pool can pickle it
+    column, dates, values, horizon, threshold = job
+    return column, fit_service(dates, values, horizon, threshold)
+
+
+class Forecasts:
+    """Fitted projections of one dataset version, keyed by ratio column.
+
+    Services without enough recent data have no entry. ``series`` gives the
+    day-by-day extension, or its monthly / weekly / quarterly averages for
+    the period line charts.
+    """
+
+    def __init__(self, fits, threshold=1.0):
+        self.fits = {column: fit for column, fit in fits.items() if fit is not None}
+        self.threshold = threshold
+
+    def series(self, column, granularity):
+        # (x, y) of one service's extension at a line chart granularity, or None
+        fit = self.fits.get(column)
+        if fit is None:
+            return None
+        if granularity in fit["periods"]:
+            return fit["periods"][granularity]
+        return fit["dates"], fit["values"]
+
+    def crossing(self, column):
+        fit = self.fits.get(column)
+        return None if fit is None else fit["crossing"]
+
+    def nbytes(self):
+        return int(sum(
+            fit["dates"].nbytes + fit["values"].nbytes + sum(x.nbytes + y.nbytes for x, y in fit["periods"].values())
+            for fit in self.fits.values()
+        ))
+
+
+def cache_path(version, horizon, threshold, cache_dir=DEFAULT_CACHE_DIR):
+    name = str(version).replace(":", "-")
+    return cache_dir / f"forecasts-{name}-h{horizon}-t{threshold:g}-v{FORECAST_FORMAT}.pkl"
+
+
+def fit_forecasts(df, columns, horizon, threshold=1.0, workers=1, version=None, cache_dir=DEFAULT_CACHE_DIR):
+    """Fit every service in ``columns``; reuses the cached fits of ``version`` when there are any.
+
+    ``workers`` > 1 fits in a process pool of that size, 0 picks one per CPU
+    when there are POOL_MIN_SERVICES services or more. The pool spawns rather
+    than forks: this may run on a watcher / refresher thread of a server.
+    """
+    path = cache_path(version, horizon, threshold, cache_dir) if version is not None else None
+    if path is not None and path.exists():
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except Exception:
+            pass  # unreadable / from an older version; refit
+
+    # Only the fit window is sent to the workers
+    dates = df["Date"].to_numpy()
+    start = int(np.searchsorted(dates, dates[-1] - FIT_DAYS * DAY, side="right")) if len(dates) else 0
+    jobs = [(column, dates[start:], df[column].to_numpy()[start:], horizon, threshold) for column in columns]
+    if workers <= 0:
+        workers = (os.cpu_count() or 1) if len(jobs) >= POOL_MIN_SERVICES else 1
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=get_context("spawn")) as pool:
+            fits = dict(pool.map(_fit_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        fits = dict(map(_fit_job, jobs))
+    forecasts = Forecasts(fits, threshold)
+
+    if path is not None:
+        try:
+            _atomic_write(path, lambda fh: pickle.dump(forecasts, fh, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as exc:
+            warnings.warn(f"Could not cache the forecasts at {path}: {exc}")
+    return forecasts
@@ -0,0 +1,18 @@
+# gunicorn -c gunicorn.conf.py
+from config import SERVER_HOST, SERVER_PORT, SERVER_THREADS, SERVER_WORKERS
+
+wsgi_app = "wsgi:create_server(background_threads=False)"
+bind = f"{SERVER_HOST}:{SERVER_PORT}"
+workers = SERVER_WORKERS
+threads = SERVER_THREADS
+worker_class = "gthread"
+
+# Import, load data and warm the figure cache once in the master; workers share it copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Threads don't survive fork, so each worker runs its own source watcher and refresher when enabled;
+    # the master (wsgi_app above) starts none
+    import MTA_Dashboard
+    MTA_Dashboard.start_background_threads()
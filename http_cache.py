@@ -0,0 +1,69 @@
+import hashlib
+
+from flask import Response, g, request
+
+from figure_cache import FigureCache
+
+
+DASH_UPDATE_PATH = "/_dash-update-component"  # where Dash posts callbacks; instrumentation.py times the same path
+
+
+class ResponseCache:
+    """Whole-response memoization of Dash callback requests on the Flask server.
+
+    The dataset only changes on reload or ingest, so a callback request body
+    (outputs, input values, triggering props) always maps to the same response
+    bytes for one dataset version. Anyone asking the same thing gets the stored
+    body without the callback running. This is server-side only: Dash sends
+    callbacks as POSTs, which browsers neither cache nor revalidate, so no
+    ETag / Cache-Control is sent. Bodies are bounded by count and total bytes.
+
+    Keys hash the version the request reads together with its body. Only
+    requests reading the latest version store their response, so a request
+    still pinned to a replaced snapshot neither empties the cache nor fills
+    it with bodies nobody will ask for again.
+    """
+
+    def __init__(self, version, latest=None, maxsize=1024, maxbytes=0):
+        self.version = version  # callable returning the dataset version this request reads
+        self.latest = latest or version  # callable returning the newest one
+        self._bodies = FigureCache(maxsize=maxsize, maxbytes=maxbytes, sizeof=lambda stored: len(stored[0]))
+
+    def init_app(self, server):
+        server.before_request(self._before_request)
+        server.after_request(self._after_request)
+        return self
+
+    def _key(self, version):
+        digest = hashlib.sha1(version.encode())
+        digest.update(request.get_data(cache=True))  # cache=True leaves the body for Dash to parse
+        return digest.hexdigest()
+
+    def _before_request(self):
+        if request.method != "POST" or not request.path.endswith(DASH_UPDATE_PATH):
+            return None
+
+        # Only ever moves forward to a newer dataset, dropping the previous one's bodies
+        self._bodies.set_version(str(self.latest()))
+        version = g.response_cache_version = str(self.version())
+        key = g.response_cache_key = self._key(version)
+
+        cached = self._bodies.get(key)
+        if cached is not None:
+            body, mimetype = cached
+            g.response_cache_key = None  # already stored
+            return Response(body, mimetype=mimetype)
+        return None
+
+    def _after_request(self, response):
+        key = g.pop("response_cache_key", None)
+        if key is None or response.status_code != 200 or response.direct_passthrough:
+            return response
+        self._bodies.put(key, (response.get_data(), response.mimetype), g.pop("response_cache_version", None))
+        return response
+
+    def invalidate(self):
+        self._bodies.invalidate()
+
+    def stats(self):
+        return self._bodies.stats()
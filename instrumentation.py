@@ -0,0 +1,223 @@
+"""Timing spans, Prometheus-format histograms and a sampling profiler for the callbacks.
+
+``span(stage)`` times a block into ``mta_stage_seconds{stage=...}``;
+``/metrics`` on the Flask server renders every histogram plus whatever
+collectors (cache stats, ...) were registered.
+"""
+import cProfile
+import json
+import random
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+
+from flask import Response, g, request
+
+from http_cache import DASH_UPDATE_PATH
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, one series per label combination."""
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            pairs = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {values[-2]:.9g}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {values[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collect):
+        # collect() -> [(name, type, help, [({label: value}, number), ...]), ...] read at scrape time
+        self.collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines += histogram.render()
+        for collect in self.collectors:
+            for name, kind, documentation, samples in collect():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(sorted(labels.items()))} {value:.9g}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "mta_stage_seconds", "Time spent per stage of building a dashboard output (stages nest inside build).", ["stage"]
+)
+output_seconds = registry.histogram(
+    "mta_output_seconds", "Time to produce one dashboard output, cache hits included, per selector combination.",
+    ["output", "selection"]
+)
+request_seconds = registry.histogram(
+    "mta_request_seconds", "Wall time of Dash callback requests, including response caching and encoding.",
+    ["output", "status"]
+)
+
+
+def span(stage):
+    return stage_seconds.time(stage=stage)
+
+
+class SamplingProfiler:
+    """Profiles a random fraction of callback requests.
+
+    ``rate`` can be changed while serving (``set_rate`` or POST /_profile).
+    One request is profiled at a time; each profile is written to
+    ``directory`` as a .prof file (cProfile, for pstats / snakeviz) or an
+    .html report (pyinstrument).
+    """
+
+    def __init__(self, rate=0.0, directory=None, engine="cprofile"):
+        self.rate = rate
+        self.directory = Path(directory) if directory else None
+        self.engine = engine
+        self.sampled = 0
+        self._busy = threading.Lock()
+
+        if engine == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                warnings.warn("pyinstrument is not installed; profiling with cProfile instead")
+                self.engine = "cprofile"
+
+    def set_rate(self, rate):
+        self.rate = min(max(float(rate), 0.0), 1.0)
+
+    def start(self):
+        if self.rate <= 0 or random.random() >= self.rate or not self._busy.acquire(blocking=False):
+            return None
+        if self.engine == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def stop(self, profiler, label):
+        try:
+            if self.engine == "pyinstrument":
+                profiler.stop()
+            else:
+                profiler.disable()
+            self.sampled += 1
+            if self.directory is None:
+                return None
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.sampled:05d}-{label}"
+            if self.engine == "pyinstrument":
+                path = self.directory / f"{stem}.html"
+                path.write_text(profiler.output_html())
+            else:
+                path = self.directory / f"{stem}.prof"
+                profiler.dump_stats(path)
+            return path
+        finally:
+            self._busy.release()
+
+    def status(self):
+        return {"rate": self.rate, "engine": self.engine, "sampled": self.sampled, "directory": str(self.directory)}
+
+
+def init_app(server, profiler=None, profile_toggle=False):
+    """Time callback requests, optionally sample them with ``profiler``, and serve /metrics."""
+
+    def output_label():
+        payload = request.get_json(silent=True, cache=True) or {}
+        return str(payload.get("output", "unknown")).split("@")[0]  # duplicate outputs carry an @hash suffix
+
+    @server.before_request
+    def start_timer():
+        if request.method == "POST" and request.path.endswith(DASH_UPDATE_PATH):
+            g.metrics_start = time.perf_counter()
+            g.profiler = profiler.start() if profiler is not None else None
+
+    @server.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            request_seconds.observe(time.perf_counter() - start, output=output_label(), status=response.status_code)
+        return response
+
+    @server.teardown_request
+    def stop_profiler(exc):
+        # teardown also runs when the callback raised, so the profiler is always released
+        active = g.pop("profiler", None)
+        if active is not None:
+            profiler.stop(active, "".join(char if char.isalnum() else "-" for char in output_label()))
+
+    @server.route("/metrics")
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    if profiler is not None and profile_toggle:
+        @server.route("/_profile", methods=["GET", "POST"])
+        def profile():
+            if request.method == "POST":
+                profiler.set_rate(request.values.get("rate", 0))
+            return Response(json.dumps(profiler.status()), mimetype="application/json")
+
+    return server
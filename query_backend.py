@@ -0,0 +1,605 @@
+"""Dashboard aggregates pushed down to an embedded SQLite or DuckDB database.
+
+    python query_backend.py check [--backend sqlite|duckdb] [--db PATH]
+
+SqlAggregateCube answers what aggregates.AggregateCube does (per-year
+summaries and threshold-day counts, Month/Week/Quarter trends, month-name and
+day-of-week breakdowns, yearly averages) with GROUP BY queries over an
+indexed table instead of pandas groupbys. The prepared rows are written to
+a database file once per dataset version, which each process copies before
+querying it (see Database); entries are queried per year on first use.
+``check`` compares every table against the pandas cube, including after an
+append, and exits with status 1 on any difference.
+"""
+import argparse
+import atexit
+import glob
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (
+    DAY_OF_WEEK_ORDER, GRANULARITY_COLUMNS, MONTH_ORDER, PERIOD_FREQUENCIES, AggregateCube,
+    ordinals_to_timestamps, period_ordinals, quantile_name, summarize, year_key
+)
+from config import RECOVERY_THRESHOLD_HIGH, RECOVERY_THRESHOLD_LOW, SUMMARY_QUANTILES
+from data_loader import DEFAULT_CACHE_DIR, DateIndex, csv_dtypes
+
+
+BACKENDS = ("pandas", "sqlite", "duckdb")
+
+TABLE = "ridership"
+
+# Calendar columns stored next to the service ratios: Date as days since the epoch, periods as ordinals
+CALENDAR_COLUMNS = {
+    "Date": "INTEGER", "Year": "INTEGER", "Month": "INTEGER", "Week": "INTEGER", "Quarter": "INTEGER",
+    "Month_Name": "TEXT", "Day_of_Week": "TEXT",
+}
+# Statistics _summary gets from plain aggregates; anything else is a quantile
+BASE_METRICS = ("sum", "count", "days_100", "days_50", "average")
+
+# Source rows parsed per executemany batch when SQLite loads straight from the CSV
+CSV_CHUNK_ROWS = 50_000
+
+# B-tree indexes for SQLite. DuckDB gets none: rows are stored in Date order, so its per-row-group min/max
+# already skip other years, and an ART index scan over a whole year was several times slower than that.
+INDEXED_COLUMNS = ("Year", "Date")
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def default_path(df, engine):
+    return DEFAULT_CACHE_DIR / f"ridership-{df.attrs.get('version', 'unversioned')}.{engine}"
+
+
+def table_rows(rows, columns):
+    # Prepared frame -> the stored layout; ratios as float64 copies of the float32 values, NaN as NULL
+    table = pd.DataFrame({
+        "Date": rows["Date"].to_numpy().astype("datetime64[D]").astype("int64"),
+        **{column: rows[column].to_numpy().astype("int64") for column in ("Year", "Month", "Week", "Quarter")},
+        "Month_Name": rows["Month_Name"].astype(str).to_numpy(),
+        "Day_of_Week": rows["Day_of_Week"].astype(str).to_numpy(),
+    })
+    for column in columns:
+        table[column] = rows[column].to_numpy().astype("float64")
+    return table
+
+
+def csv_table_rows(chunk, columns):
+    # Parsed source rows -> the stored layout, with the values prepare_dataset gives the frame
+    dates = chunk["Date"]
+    rows = pd.DataFrame({
+        "Date": dates,
+        "Year": dates.dt.year,
+        **{column: period_ordinals(dates, freq) for column, freq in PERIOD_FREQUENCIES.items()},
+        "Month_Name": np.asarray(MONTH_ORDER)[dates.dt.month.to_numpy() - 1],
+        "Day_of_Week": np.asarray(DAY_OF_WEEK_ORDER)[dates.dt.dayofweek.to_numpy()],
+    })
+    for column in columns:
+        rows[column] = (chunk[column].astype("float64") / 100).astype("float32")
+    return table_rows(rows, columns)
+
+
+def day_number(timestamp):
+    return int(np.datetime64(timestamp, "D").astype("int64"))
+
+
+# The stored calendar columns from a DATE, matching table_rows: days since the epoch and pandas period ordinals
+# ("W" periods are weeks ending on Sunday, so the 1970-01-01 Thursday is in week 1)
+DUCKDB_CALENDAR = """
+    date_diff('day', DATE '1970-01-01', d),
+    year(d),
+    (year(d) - 1970) * 12 + month(d) - 1,
+    CAST(floor((date_diff('day', DATE '1970-01-01', d) + 3) / 7) AS BIGINT) + 1,
+    (year(d) - 1970) * 4 + quarter(d) - 1,
+    strftime(d, '%b'),
+    strftime(d, '%a')
+"""
+
+
+class Database:
+    """An embedded database: one immutable file per dataset version, one working copy per process.
+
+    Neither engine takes writers from several processes on one file (DuckDB
+    refuses a second read-write open outright), so no file is ever written by
+    more than one process. load() builds ``path`` under a temporary name and
+    renames it into place, and nothing writes it afterwards, so it can be
+    reused across restarts. Every process then queries and ingests into its
+    own copy, ``<path>.<pid>-<version>``, made on first use: a gunicorn
+    worker forked after the master loaded gets a copy of its own. Copies are
+    removed when their process exits, or by the next process to make one if
+    their process died. A connection is opened per operation, so none is
+    shared between threads or carried over a fork.
+    """
+
+    def __init__(self, path, engine="sqlite"):
+        self.path = str(path)
+        self.engine = engine
+        self.version = None
+
+    def _open(self, path, read_only=False):
+        if self.engine == "duckdb":
+            import duckdb
+            return duckdb.connect(path, read_only=read_only)
+        if read_only:
+            return sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+        return sqlite3.connect(path)
+
+    @contextmanager
+    def connect(self, path=None, read_only=False):
+        connection = self._open(path or self.working_path(), read_only)
+        try:
+            yield connection
+            connection.commit()
+        finally:
+            connection.close()
+
+    def execute(self, sql, parameters=()):
+        with self.connect() as connection:
+            cursor = connection.execute(sql, parameters)
+            return cursor.fetchall() if cursor.description else []
+
+    def working_path(self):
+        """This process's copy of the loaded file, copied from ``path`` the first time it is asked for."""
+        if self.version is None:
+            raise RuntimeError("load() the database before querying it")
+        prefix = f"{self.path}.{os.getpid()}-"
+        private = prefix + self.version
+        if private not in _working_copies:
+            # Not trusted even if it exists: a dead process with a reused pid may have left it, ingests and all
+            remove_dead_copies(self.path)
+            shutil.copyfile(self.path, private)
+            _working_copies[private] = os.getpid()
+        return private
+
+    def meta(self, path=None):
+        # Version and row count recorded by load(); empty for a missing or half-written file
+        path = path or self.path
+        if not os.path.exists(path):
+            return {}
+        try:
+            with self.connect(path, read_only=True) as connection:
+                return dict(connection.execute("SELECT key, value FROM meta").fetchall())
+        except (sqlite3.Error, *self._engine_errors()):
+            return {}
+
+    def _engine_errors(self):
+        if self.engine == "duckdb":
+            import duckdb
+            return (duckdb.Error,)
+        return ()
+
+    def load(self, df, columns):
+        """Build ``path`` unless it already holds this dataset version.
+
+        A frame read from a CSV (``df.attrs["source"]``) is loaded from that
+        file rather than from ``df``, so no table-shaped copy of the frame is
+        made; should the file no longer give the frame's rows, ``df`` is used.
+        """
+        self.version = str(df.attrs.get("version"))
+        if self.meta() == {"version": self.version, "rows": str(len(df))}:
+            return False
+
+        # Built aside and renamed over the old file, which processes still reading it keep until they close it
+        target = Path(self.path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+        os.close(fd)
+        os.unlink(tmp)  # DuckDB won't open an empty file as a database
+        try:
+            self._build(tmp, df, columns)
+            os.replace(tmp, target)
+        finally:
+            for leftover in (tmp, f"{tmp}.wal"):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+        return True
+
+    def _build(self, path, df, columns):
+        real = "DOUBLE" if self.engine == "duckdb" else "REAL"
+        schema = [f"{quote(name)} {kind}" for name, kind in CALENDAR_COLUMNS.items()]
+        schema += [f"{quote(column)} {real}" for column in columns]
+        with self.connect(path) as connection:
+            connection.execute(f"CREATE TABLE {TABLE} ({', '.join(schema)})")
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("INSERT INTO meta VALUES ('version', ?)", (self.version,))
+            connection.execute("INSERT INTO meta VALUES ('rows', '0')")
+
+        if not self._load_source(path, df, columns):
+            with self.connect(path) as connection:
+                connection.execute(f"DELETE FROM {TABLE}")
+            self.insert(df, columns, path)
+
+        with self.connect(path) as connection:
+            connection.execute(f"UPDATE meta SET value = CAST((SELECT COUNT(*) FROM {TABLE}) AS TEXT) WHERE key = 'rows'")
+            for column in INDEXED_COLUMNS if self.engine == "sqlite" else ():
+                connection.execute(f"CREATE INDEX {TABLE}_{column.lower()} ON {TABLE} ({quote(column)})")
+
+    def _load_source(self, path, df, columns):
+        # False when df has no source file, or the file no longer holds df's rows (rewritten since)
+        source = df.attrs.get("source")
+        if not source or df.empty or not os.path.exists(source):
+            return False
+        return self._load_csv(path, source, columns, df["Date"].iloc[-1]) == len(df)
+
+    def _load_csv(self, path, source, columns, last):
+        """Insert the source file's rows up to ``last`` (the frame's final day); returns how many were written."""
+        if self.engine == "duckdb":
+            # Parsed, converted and sorted inside DuckDB; ratios rounded through float32 like the frame's
+            ratios = ", ".join(
+                f"CAST(CAST(TRY_CAST({quote(column)} AS FLOAT) AS DOUBLE) / 100 AS FLOAT)" for column in columns
+            )
+            with self.connect(path) as connection:
+                connection.execute(
+                    f"INSERT INTO {TABLE} SELECT {DUCKDB_CALENDAR}, {ratios} "
+                    f"FROM (SELECT TRY_CAST(\"Date\" AS DATE) AS d, * FROM read_csv(?, header = true, all_varchar = true)) "
+                    f"WHERE d IS NOT NULL AND d <= ? ORDER BY d",
+                    (str(source), pd.Timestamp(last).date()),
+                )
+                return connection.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+        written = 0
+        usecols = ["Date"] + list(columns)
+        chunks = pd.read_csv(source, usecols=usecols, dtype=csv_dtypes(usecols), parse_dates=["Date"], chunksize=CSV_CHUNK_ROWS)
+        with self.connect(path) as connection:
+            for chunk in chunks:
+                if not pd.api.types.is_datetime64_any_dtype(chunk["Date"]):
+                    chunk["Date"] = pd.to_datetime(chunk["Date"], errors="coerce")
+                chunk = chunk[chunk["Date"].notna() & (chunk["Date"] <= last)]
+                written += self._insert_table(connection, csv_table_rows(chunk, columns))
+        return written
+
+    def _insert_table(self, connection, table):
+        if self.engine == "duckdb":
+            # Bulk insert straight from the frame's buffers
+            connection.register("new_rows", table)
+            connection.execute(f"INSERT INTO {TABLE} SELECT * FROM new_rows")
+            connection.unregister("new_rows")
+        else:
+            # Plain Python values column by column; sqlite3 stores a NaN float as NULL
+            placeholders = ", ".join("?" * len(table.columns))
+            values = zip(*(table[column].tolist() for column in table.columns))
+            connection.executemany(f"INSERT INTO {TABLE} VALUES ({placeholders})", values)
+        return len(table)
+
+    def discard(self):
+        # Drop this process's copy and the built file; only for a database nobody else was given (check's)
+        for path in list(_working_copies):
+            if path.startswith(f"{self.path}.{os.getpid()}-"):
+                remove_working_copy(path)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def insert(self, rows, columns, path=None):
+        """Append the days after the last stored one; returns how many rows were written.
+
+        Rows already stored are skipped, so handing the same appended source
+        lines over twice writes them once.
+        """
+        table = table_rows(rows, columns)
+        with self.connect(path) as connection:
+            connection.execute("BEGIN IMMEDIATE" if self.engine == "sqlite" else "BEGIN TRANSACTION")
+            last = connection.execute(f"SELECT MAX(Date) FROM {TABLE}").fetchone()[0]
+            if last is not None:
+                table = table[table["Date"] > last]
+            self._insert_table(connection, table)
+            connection.execute(f"UPDATE meta SET value = CAST((SELECT COUNT(*) FROM {TABLE}) AS TEXT) WHERE key = 'rows'")
+        return len(table)
+
+
+# working copy -> pid of the process that made it; a forked child inherits the entries but not the pid
+_working_copies = {}
+
+
+def remove_working_copy(path):
+    if _working_copies.get(path) != os.getpid():
+        return  # made by the parent this process forked from, which may still be using it
+    del _working_copies[path]
+    for leftover in (path, f"{path}.wal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def remove_dead_copies(path):
+    # Working copies of processes that exited without removing theirs (killed, or os._exit after a fork)
+    base = Path(path)
+    for copy in base.parent.glob(f"{glob.escape(base.name)}.*-*"):
+        pid = copy.name[len(base.name) + 1:].split("-", 1)[0]
+        if not pid.isdigit() or pid_alive(int(pid)):
+            continue
+        try:
+            os.remove(copy)
+        except FileNotFoundError:
+            pass  # another process got there first
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+@atexit.register
+def remove_working_copies():
+    for path in list(_working_copies):
+        remove_working_copy(path)
+
+
+class SqlYearAggregates:
+    # Same attributes as aggregates.YearAggregates, filled from queries instead of held running totals
+    def __init__(self, summary, month_name, day_of_week, trends):
+        self.summary = summary
+        self.month_name = month_name
+        self.day_of_week = day_of_week
+        self.trends = trends
+
+
+class SqlAggregateCube:
+    """AggregateCube over an embedded database: lazily queried per year, plus the yearly averages.
+
+    Quantiles are DuckDB's quantile_cont; SQLite has no percentile aggregate,
+    so there the year's ratio rows are fetched and summarized in numpy.
+    """
+
+    def __init__(self, df, service_mapping, index=None, engine="sqlite", path=None):
+        self.df = df
+        self.index = index if index is not None else DateIndex(df)
+        self.service_mapping = service_mapping
+        self.columns = list(service_mapping.values())
+        self.database = Database(path or default_path(df, engine), engine)
+        self.database.load(df, self.columns)
+
+        # Compared the way summarize() does on the float32 frame: float32 thresholds, widened exactly
+        self.high = float(np.float32(RECOVERY_THRESHOLD_HIGH))
+        self.low = float(np.float32(RECOVERY_THRESHOLD_LOW))
+
+        with self.database.connect() as connection:
+            self.yearly_avg = self._bucket_means(connection, "Year", "All")
+        self._years = {}
+
+    def _where(self, key):
+        return ("", ()) if key == "All" else (" WHERE Year = ?", (int(key),))
+
+    def _bucket_means(self, connection, by, key):
+        where, parameters = self._where(key)
+        averages = ", ".join(f"AVG({quote(column)})" for column in self.columns)
+        rows = connection.execute(
+            f"SELECT {quote(by)}, {averages} FROM {TABLE}{where} GROUP BY {quote(by)} ORDER BY {quote(by)}", parameters
+        ).fetchall()
+        values = np.array([row[1:] for row in rows], dtype="float64").reshape(len(rows), len(self.columns))
+        data = pd.DataFrame(values, columns=self.columns)  # NULL averages (no reports in the bucket) become NaN
+        data.insert(0, by, [row[0] for row in rows])
+        return data
+
+    def _range_where(self, start, end):
+        # Inclusive [start, end] like DateIndex.positions; a missing bound leaves that side open
+        conditions, parameters = [], []
+        if start is not None:
+            conditions.append("Date >= ?")
+            parameters.append(day_number(pd.Timestamp(start).ceil("D")))
+        if end is not None:
+            conditions.append("Date <= ?")
+            parameters.append(day_number(pd.Timestamp(end).floor("D")))
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), tuple(parameters)
+
+    def _summary(self, connection, where, parameters, quantiles=True):
+        expressions = []
+        for column in self.columns:
+            name = quote(column)
+            expressions += [
+                f"COUNT({name})",
+                f"COALESCE(SUM({name}), 0)",
+                f"SUM(CASE WHEN {name} >= {self.high!r} THEN 1 ELSE 0 END)",
+                f"SUM(CASE WHEN {name} <= {self.low!r} THEN 1 ELSE 0 END)",
+            ]
+            if quantiles and self.database.engine == "duckdb":
+                expressions += [f"quantile_cont({name}, {q!r})" for q in SUMMARY_QUANTILES]
+        row = connection.execute(f"SELECT {', '.join(expressions)} FROM {TABLE}{where}", parameters).fetchone()
+
+        width = len(expressions) // len(self.columns)
+        values = np.array(row, dtype="float64").reshape(len(self.columns), width).T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats = {
+                "sum": values[1],
+                "count": values[0].astype("int64"),
+                "days_100": np.nan_to_num(values[2]).astype("int64"),
+                "days_50": np.nan_to_num(values[3]).astype("int64"),
+                "average": values[1] / values[0],
+            }
+
+        if quantiles and SUMMARY_QUANTILES:
+            if self.database.engine == "duckdb":
+                stats.update({quantile_name(q): values[4 + position] for position, q in enumerate(SUMMARY_QUANTILES)})
+            else:
+                selected = ", ".join(quote(column) for column in self.columns)
+                block = np.array(connection.execute(f"SELECT {selected} FROM {TABLE}{where}", parameters).fetchall(), dtype="float64")
+                quantiles = summarize(block.reshape(-1, len(self.columns)))
+                stats.update({quantile_name(q): quantiles[quantile_name(q)] for q in SUMMARY_QUANTILES})
+
+        # metric -> {service: value}, like YearAggregates.summary
+        return {metric: dict(zip(self.service_mapping, values.tolist())) for metric, values in stats.items()}
+
+    def _query_year(self, connection, key):
+        # Six queries per entry over one connection: summary, two breakdowns, three granularities
+        month_means = self._bucket_means(connection, "Month_Name", key).set_index("Month_Name")
+        month_name = month_means.reindex([m for m in MONTH_ORDER if m in month_means.index]).reset_index()
+        day_means = self._bucket_means(connection, "Day_of_Week", key).set_index("Day_of_Week")
+        day_of_week = day_means.reindex([d for d in DAY_OF_WEEK_ORDER if d in day_means.index]).reset_index()
+
+        trends = {}
+        for granularity, period_column in GRANULARITY_COLUMNS.items():
+            data = self._bucket_means(connection, period_column, key)
+            data[period_column] = ordinals_to_timestamps(data[period_column], PERIOD_FREQUENCIES[period_column])
+            trends[granularity] = data
+
+        return SqlYearAggregates(self._summary(connection, *self._where(key)), month_name, day_of_week, trends)
+
+    def years(self):
+        return self.index.years()
+
+    def range_summary(self, start=None, end=None, metric="average"):
+        """``metric`` per service over the days from ``start`` to ``end``, the SQL answer to PrefixSums.summary."""
+        where, parameters = self._range_where(start, end)
+        with self.database.connect() as connection:
+            summary = self._summary(connection, where, parameters, quantiles=metric not in BASE_METRICS)
+        return summary[metric]
+
+    def year(self, selected_year):
+        key = year_key(selected_year)
+        entry = self._years.get(key)
+        if entry is None:
+            with self.database.connect() as connection:
+                entry = self._years[key] = self._query_year(connection, key)
+        return entry
+
+    def build(self):
+        with self.database.connect() as connection:
+            for key in ["All"] + self.years():
+                if key not in self._years:
+                    self._years[key] = self._query_year(connection, key)
+        return self
+
+    def append(self, df, index, new_rows):
+        """Insert newly ingested rows and re-query the entries they touch; returns those years."""
+        self.df = df
+        self.index = index
+        self.database.insert(new_rows, self.columns)
+
+        years = sorted(int(year) for year in new_rows['Year'].unique())
+        with self.database.connect() as connection:
+            self.yearly_avg = self._bucket_means(connection, "Year", "All")
+            for key in ["All"] + years:
+                if key in self._years:
+                    self._years[key] = self._query_year(connection, key)
+        return years
+
+    def clear(self):
+        self._years.clear()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["df"] = state["index"] = None
+        return state
+
+    def attach(self, df, index):
+        self.df = df
+        self.index = index
+        return self
+
+    def nbytes(self):
+        # In-memory query results only; the rows themselves live in the database file
+        total = self.yearly_avg.memory_usage(deep=True).sum()
+        for entry in self._years.values():
+            tables = [entry.month_name, entry.day_of_week, *entry.trends.values()]
+            total += sum(table.memory_usage(deep=True).sum() for table in tables)
+        return int(total)
+
+
+def build_cube(df, service_mapping, index, backend="pandas", path=None):
+    """The aggregate cube for ``backend`` ("pandas", "sqlite" or "duckdb"), with every year entry built."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown query backend {backend!r}; expected one of {list(BACKENDS)}")
+
+    if backend == "duckdb":
+        try:
+            import duckdb  # noqa: F401
+        except ImportError:
+            warnings.warn("duckdb is not installed; querying through SQLite instead")
+            backend = "sqlite"
+
+    if backend == "pandas":
+        return AggregateCube(df, service_mapping, index).build()
+    return SqlAggregateCube(df, service_mapping, index, backend, path).build()
+
+
+def compare_frames(name, expected, actual, differences):
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        differences.append(f"{name}: shape {expected.shape} != {actual.shape}")
+        return
+    for column in expected.columns:
+        left, right = expected[column].to_numpy(), actual[column].to_numpy()
+        if left.dtype.kind in "fc":
+            same = np.allclose(left, right.astype("float64"), rtol=1e-6, atol=1e-9, equal_nan=True)
+        else:
+            same = (left.astype(str) == right.astype(str)).all()
+        if not same:
+            differences.append(f"{name}.{column}")
+
+
+def compare_cubes(expected, actual):
+    differences = []
+    compare_frames("yearly_avg", expected.yearly_avg, actual.yearly_avg, differences)
+    for key in ["All"] + expected.years():
+        left, right = expected.year(key), actual.year(key)
+        for metric, values in left.summary.items():
+            services = list(values)
+            if not np.allclose([values[s] for s in services], [right.summary[metric][s] for s in services],
+                               rtol=1e-6, atol=1e-9, equal_nan=True):
+                differences.append(f"{key}.summary.{metric}")
+        compare_frames(f"{key}.month_name", left.month_name, right.month_name, differences)
+        compare_frames(f"{key}.day_of_week", left.day_of_week, right.day_of_week, differences)
+        for granularity, data in left.trends.items():
+            compare_frames(f"{key}.trends.{granularity}", data, right.trends[granularity], differences)
+    return differences
+
+
+def check(backend, path=None):
+    import MTA_Dashboard as dashboard
+
+    current = dashboard.latest_snapshot()
+    df, mapping, index = current.df, dashboard.service_mapping, current.date_index
+
+    start = time.perf_counter()
+    expected = AggregateCube(df, mapping, index).build()
+    print(f"pandas built in {time.perf_counter() - start:.3f}s")
+    start = time.perf_counter()
+    actual = SqlAggregateCube(df, mapping, index, backend, path).build()
+    print(f"{backend} built in {time.perf_counter() - start:.3f}s ({actual.database.path})")
+    differences = compare_cubes(expected, actual)
+
+    # Appended days must update both the same way; split off the last 45 days and fold them back in
+    head = df.iloc[:-45].copy()
+    head.attrs.update(df.attrs, version=f"{df.attrs.get('version')}-check")
+    head_index = DateIndex(head)
+    expected = AggregateCube(head, mapping, head_index).build()
+    actual = SqlAggregateCube(head, mapping, head_index, backend, f"{actual.database.path}.check")
+    actual.build()
+    expected.append(df, index, df.iloc[-45:])
+    actual.append(df, index, df.iloc[-45:])
+    differences += [f"after append: {name}" for name in compare_cubes(expected, actual)]
+    if actual.database.insert(df.iloc[-45:], actual.columns):
+        differences.append("re-inserting the appended days wrote rows again")
+    actual.database.discard()
+
+    for name in differences:
+        print(f"MISMATCH {name}")
+    print(f"{backend}: {'matches' if not differences else f'{len(differences)} differences from'} the pandas cube")
+    return 1 if differences else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--backend", choices=BACKENDS[1:], default="sqlite")
+    parser.add_argument("--db", default=None, help="database file (default: .cache/ridership-<version>.<backend>)")
+    args = parser.parse_args(argv)
+    return check(args.backend, args.db)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
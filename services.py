@@ -0,0 +1,99 @@
+"""The services the dashboard shows, read from the ridership CSV header.
+
+Every "<Service>: % of Comparable Pre-Pandemic Day" column is one service,
+in header order. Descriptions come from Data/MTA_data_dictionary.csv when it
+lists the column. The bundled services keep the names, labels and colors they
+have always had. Any other service uses its header name and the next palette
+color. Only the selected service is drawn in its color, so repeated colors
+with many services do no harm.
+"""
+import pandas as pd
+from plotly.colors import qualitative
+
+from data_loader import BASE_DIR, ratio_columns
+
+
+DATA_DICTIONARY_PATH = BASE_DIR / "Data" / "MTA_data_dictionary.csv"
+
+# Header name -> (name, selector label, short name for hover text, color)
+KNOWN_SERVICES = {
+    "Subways": ("Subways", "Subways", "Subways", "#44b9dd"),  # $color-charts-blue-1-600
+    "Buses": ("Buses", "Buses", "Buses", "#bf9bf9"),  # $color-charts-purple-600
+    "LIRR": ("LIRR", "LIRR", "LIRR", "#f89256"),  # $color-charts-orange-600
+    "Metro-North": ("Metro North", "Metro North", "Metro North", "#eb92ad"),  # $color-charts-pink-600
+    "Access-A-Ride": ("Access-A", "Access-A-Ride", "Access-A", "#8ea9ff"),  # $color-charts-blue-2-600
+    "Bridges and Tunnels": ("Bridges and Tunnels", "Bridges and Tunnels", "Bridges", "#d3a61c"),  # $color-charts-yellow-600
+    "Staten Island Railway": ("Staten Island Railway", "Staten Island Railway", "Staten Island", "#40bfa9"),  # $color-charts-teal-600
+}
+
+# Colors handed out, in order, to services not listed above
+PALETTE = qualitative.Pastel + qualitative.Set2 + qualitative.Safe
+
+
+def read_dictionary(path=DATA_DICTIONARY_PATH):
+    # Field -> description; an absent or unreadable dictionary just means no descriptions
+    try:
+        fields = pd.read_csv(path, usecols=["Field", "Description"], dtype=str)
+    except (OSError, ValueError):
+        return {}
+    return dict(zip(fields["Field"], fields["Description"].fillna("")))
+
+
+class Service:
+    def __init__(self, name, column, label, short_name, color, description=""):
+        self.name = name  # selector value, KPI card and bar chart label
+        self.column = column
+        self.label = label
+        self.short_name = short_name
+        self.color = color
+        self.description = description
+
+    def __repr__(self):
+        return f"Service({self.name!r}, {self.column!r})"
+
+
+class ServiceRegistry:
+    """The services in column order, plus the lookups the figures use.
+
+    The lookups are built once here, so a callback reads a dict instead of
+    rebuilding one per request, whatever the number of services.
+    """
+
+    def __init__(self, services):
+        self.services = list(services)
+        if not self.services:
+            raise ValueError("No '% of Comparable Pre-Pandemic Day' columns to build services from")
+
+        self.mapping = {service.name: service.column for service in self.services}  # name -> ratio column
+        if len(self.mapping) != len(self.services):
+            raise ValueError("Service names must be unique")
+        self.columns = list(self.mapping.values())
+        self.short_names = {service.column: service.short_name for service in self.services}
+        self.colors = {service.name: service.color for service in self.services}
+        self.line_colors = {service.column: service.color for service in self.services}
+
+    @classmethod
+    def from_header(cls, header, dictionary=None):
+        dictionary = read_dictionary() if dictionary is None else dictionary
+        services, palette = [], iter(PALETTE * (len(header) // len(PALETTE) + 1))
+        for column in ratio_columns(header):
+            header_name = column.split(": ", 1)[0]
+            if header_name in KNOWN_SERVICES:
+                name, label, short_name, color = KNOWN_SERVICES[header_name]
+            else:
+                name = label = short_name = header_name
+                color = next(palette)
+            services.append(Service(name, column, label, short_name, color, dictionary.get(column, "")))
+        return cls(services)
+
+    def __len__(self):
+        return len(self.services)
+
+    def __iter__(self):
+        return iter(self.services)
+
+    def default(self):
+        return self.services[0].name
+
+    def options(self):
+        return [{"label": service.label, "value": service.name, "title": service.description} for service in self.services]
@@ -0,0 +1,155 @@
+"""Prepared dataset shared between server workers through memory-mapped .npy files.
+
+One preparer process writes the prepared columns, the prefix-sum arrays and
+the (small) aggregate cube under a versioned directory:
+
+    python shared_data.py /var/lib/mta-dashboard
+
+Workers started with MTA_SHARED_DATA_DIR pointing there map the arrays
+read-only instead of parsing and aggregating, so startup is near-instant and
+the page cache holds one copy of the data however many workers run.
+"""
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"  # name of the live version directory, swapped atomically
+
+PREFIX_ARRAYS = ("sums", "counts", "days_high", "days_low")
+
+
+def _array_name(position):
+    # Column names contain ':' and '%', so files are numbered and named in the manifest
+    return f"column-{position:03d}.npy"
+
+
+def stage(directory, version):
+    # Hidden scratch directory next to the published versions, so publish() is a rename on one filesystem
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(dir=directory, prefix=f".{version}."))
+
+
+def publish(directory, staging, version, replace=False):
+    """Move a complete staging directory to ``directory/version``, then point CURRENT at it.
+
+    An already published version is kept (the same data) unless ``replace``.
+    Readers see the old version or the new one, never a partial directory.
+    """
+    directory = Path(directory)
+    target = directory / version
+    if target.exists() and not replace:
+        shutil.rmtree(staging)
+    else:
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(staging, target)
+
+    pointer = directory / f".{CURRENT}.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, directory / CURRENT)
+    return target
+
+
+def write_shared(directory, df, aggregate_cube, prefix_sums, date_index):
+    """Write a complete version directory, then point CURRENT at it."""
+    version = df.attrs.get("version", "unversioned")
+    staging = stage(directory, version)
+    columns = []
+    for position, column in enumerate(df.columns):
+        values = df[column]
+        entry = {"name": column, "file": _array_name(position)}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            entry["categories"] = list(values.cat.categories)
+            entry["ordered"] = bool(values.cat.ordered)
+            np.save(staging / entry["file"], values.cat.codes.to_numpy())
+        else:
+            np.save(staging / entry["file"], values.to_numpy())
+        columns.append(entry)
+
+    for name in PREFIX_ARRAYS:
+        np.save(staging / f"prefix-{name}.npy", getattr(prefix_sums, name))
+
+    with open(staging / "aggregate_cube.pkl", "wb") as fh:
+        pickle.dump(aggregate_cube, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    manifest = {
+        "version": version,
+        "attrs": {key: value for key, value in df.attrs.items() if isinstance(value, (str, int, float, list))},
+        "columns": columns,
+        "year_offsets": {str(year): offsets for year, offsets in date_index.year_offsets.items()},
+    }
+    with open(staging / MANIFEST, "w") as fh:
+        json.dump(manifest, fh)
+    return publish(directory, staging, version)
+
+
+def current_version_dir(directory):
+    directory = Path(directory)
+    try:
+        version = (directory / CURRENT).read_text().strip()
+    except OSError:
+        return None
+    path = directory / version
+    return path if (path / MANIFEST).exists() else None
+
+
+def read_shared(directory):
+    """Map the live version read-only.
+
+    Returns (df, year_offsets, prefix_arrays, aggregate_cube) or None when
+    nothing has been published yet. The cube still needs ``attach(df, index)``.
+    """
+    path = current_version_dir(directory)
+    if path is None:
+        return None
+
+    with open(path / MANIFEST) as fh:
+        manifest = json.load(fh)
+
+    data = {}
+    for entry in manifest["columns"]:
+        values = np.load(path / entry["file"], mmap_mode="r")
+        if "categories" in entry:
+            values = pd.Categorical.from_codes(values, categories=entry["categories"], ordered=entry["ordered"])
+        data[entry["name"]] = values
+
+    # copy=False keeps each column backed by its mapped file
+    df = pd.DataFrame(data, copy=False)
+    df.attrs.update(manifest["attrs"])
+
+    prefix_arrays = {name: np.load(path / f"prefix-{name}.npy", mmap_mode="r") for name in PREFIX_ARRAYS}
+
+    with open(path / "aggregate_cube.pkl", "rb") as fh:
+        aggregate_cube = pickle.load(fh)
+
+    year_offsets = {int(year): tuple(offsets) for year, offsets in manifest["year_offsets"].items()}
+    return df, year_offsets, prefix_arrays, aggregate_cube
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(__doc__)
+        return 2
+
+    # The preparer itself must build from the source, not from a previous export
+    os.environ.pop("MTA_SHARED_DATA_DIR", None)
+    import MTA_Dashboard as dashboard
+
+    target = write_shared(argv[0], dashboard.df, dashboard.aggregate_cube, dashboard.prefix_sums, dashboard.date_index)
+    print(f"Wrote {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
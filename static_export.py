@@ -0,0 +1,167 @@
+"""Pre-render every dashboard state to static files.
+
+    python static_export.py OUT_DIR [--workers N] [--html] [--png]
+
+Each (year, metric, service, granularity) state of the sidebar is rendered
+through update_dashboard and written as one JSON document holding the six
+outputs, keyed by component id, exactly as the callbacks would send them.
+``--html`` adds a self-contained page per state and ``--png`` one image per
+figure (needs kaleido). States are spread over a process pool; the export
+is written to a versioned directory and CURRENT is switched once it is
+complete, so a CDN or plain file server can serve OUT_DIR without any
+Python in the request path.
+"""
+import argparse
+import html
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs_version
+from plotly.io.json import to_json_plotly
+
+from shared_data import MANIFEST, publish, stage
+
+
+# Figures in an exported state; the metrics row is a component list, not a figure
+FIGURE_OUTPUTS = ["bar-chart", "line-chart", "yearly-breakdown", "monthly-breakdown", "day-of-week-breakdown"]
+
+# Same plotly.js the installed plotly renders for, as pio.to_html(include_plotlyjs="cdn") would use
+PLOTLY_JS = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+
+_dashboard = None  # MTA_Dashboard, imported once per pool worker
+
+
+def _load_dashboard():
+    global _dashboard
+    if _dashboard is None:
+        import MTA_Dashboard
+        _dashboard = MTA_Dashboard
+    return _dashboard
+
+
+def slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(value)).strip("-").lower()
+
+
+def state_path(state):
+    # year/metric/service/granularity, e.g. all/average/bridges-and-tunnels/monthly
+    return "/".join(slug(value) for value in state)
+
+
+def render_html(dashboard, state, outputs):
+    selected_year, selected_metric, selected_service, granularity = state
+    metrics = dashboard.summary_for(selected_year, selected_metric)
+    kpis = ""
+    for name, value in metrics.items():
+        border = " border border-light" if name == selected_service else ""
+        text = dashboard.format_metric(value, selected_metric)
+        kpis += (
+            f'<div class="col p-3 m-1 bg-primary text-light rounded{border}">'
+            f'<h3 class="text-center mb-0">{html.escape(text)}</h3>'
+            f'<small class="text-muted text-center d-block">{html.escape(name)}</small></div>'
+        )
+
+    figures = "".join(
+        f'<div class="col-12 col-lg-6 p-2">'
+        f'{pio.to_html(outputs[component_id], full_html=False, include_plotlyjs=False, div_id=component_id)}</div>'
+        for component_id in FIGURE_OUTPUTS
+    )
+    title = f"MTA Dashboard - {selected_service}, {selected_year}, {selected_metric}, {granularity}"
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+        f'<link rel="stylesheet" href="{dashboard.STYLESHEET}">'
+        f'<script src="{PLOTLY_JS}"></script></head>'
+        f'<body class="p-4"><h3 class="text-light">{html.escape(title)}</h3>'
+        f'<div class="row g-2 mb-3">{kpis}</div><div class="row">{figures}</div></body></html>'
+    )
+
+
+def export_state(args):
+    """Render one state into ``root``; runs in a pool worker."""
+    root, state, formats = args
+    dashboard = _load_dashboard()
+    outputs = dict(zip(dashboard.DASHBOARD_OUTPUTS, dashboard.update_dashboard(*state)))
+
+    path = Path(root) / state_path(state)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.with_suffix(".json").write_text(to_json_plotly(outputs))
+
+    if "html" in formats:
+        path.with_suffix(".html").write_text(render_html(dashboard, state, outputs))
+
+    if "png" in formats:
+        path.mkdir(exist_ok=True)
+        for component_id in FIGURE_OUTPUTS:
+            pio.write_image(outputs[component_id], path / f"{component_id}.png", format="png")
+
+    return state, state_path(state)
+
+
+def export(directory, workers=None, formats=()):
+    """Write every state under a new version directory, then point CURRENT at it."""
+    dashboard = _load_dashboard()
+    # Loads the data once; the states, every render and the manifest read this snapshot, and forked workers inherit it.
+    # No Dash app is built.
+    version = dashboard.latest_snapshot().df.attrs.get("version", "unversioned")
+
+    states = dashboard.selector_states()
+    workers = workers or os.cpu_count() or 1
+    staging = stage(directory, version)
+    jobs = [(str(staging), state, tuple(formats)) for state in states]
+
+    try:
+        if workers > 1:
+            # States are ordered by year, so contiguous chunks keep each worker's figure cache hits high.
+            # With fork the workers inherit the already loaded dataset instead of loading their own.
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(export_state, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+        else:
+            results = [export_state(job) for job in jobs]
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    manifest = {
+        "version": version,
+        "selectors": dashboard.STATE_SELECTORS,
+        "default": state_path(dashboard.default_selection()),
+        "formats": ["json", *formats],
+        "states": {"|".join(state): path for state, path in results},
+    }
+    with open(staging / MANIFEST, "w") as fh:
+        json.dump(manifest, fh)
+
+    # A re-export of the same data (e.g. with other formats) replaces the published one
+    return publish(directory, staging, version, replace=True), len(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: CPU count, 1 renders in-process)")
+    parser.add_argument("--html", action="store_true", help="also write a static HTML page per state")
+    parser.add_argument("--png", action="store_true", help="also write a PNG per figure (requires kaleido)")
+    args = parser.parse_args(argv)
+
+    formats = [name for name in ("html", "png") if getattr(args, name)]
+    if "png" in formats:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            parser.error("--png needs the kaleido package")
+
+    start = time.perf_counter()
+    target, count = export(args.directory, args.workers, formats)
+    print(f"Wrote {count} states to {target} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules live at the repository root, like MTA_Dashboard.py; the benchmarks import them the same way
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,70 @@
+"""SourceWatcher picking up appended lines of the ridership CSV."""
+import pandas as pd
+import pytest
+
+from data_loader import SourceWatcher
+
+
+HEADER = ["Date", "Subways: % of Comparable Pre-Pandemic Day", "Buses: % of Comparable Pre-Pandemic Day"]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "ridership.csv"
+    path.write_text(",".join(HEADER) + "\n2024-11-01,70,60\n")
+    return path
+
+
+def append(path, *lines):
+    with open(path, "a") as fh:
+        fh.write("".join(f"{line}\n" for line in lines))
+
+
+def test_failed_ingest_is_retried(source):
+    received = []
+
+    def on_rows(rows):
+        if not received:
+            received.append(None)
+            raise RuntimeError("database is locked")
+        received.append(rows)
+        return len(rows)
+
+    watcher = SourceWatcher(source, source.stat().st_size, HEADER, on_rows)
+    append(source, "2024-11-02,71,61")
+    with pytest.raises(RuntimeError):
+        watcher.poll()
+
+    append(source, "2024-11-03,72,62")
+    assert watcher.poll() == 2
+    assert received[-1]["Date"].tolist() == [pd.Timestamp("2024-11-02"), pd.Timestamp("2024-11-03")]
+    assert watcher.poll() == 0
+
+
+def test_partial_line_waits_for_its_newline(source):
+    received = []
+    watcher = SourceWatcher(source, source.stat().st_size, HEADER, lambda rows: received.append(rows) or len(rows))
+    with open(source, "a") as fh:
+        fh.write("2024-11-02,71")
+    assert watcher.poll() == 0
+    append(source, ",61")
+    assert watcher.poll() == 1
+    assert received[0].iloc[0, 1:].tolist() == [71, 61]
+
+
+def test_replaced_file_is_retried(source):
+    calls = []
+
+    def on_replaced():
+        calls.append(None)
+        if len(calls) == 1:
+            raise OSError("source unavailable")
+
+    append(source, "2024-11-02,71,61")
+    watcher = SourceWatcher(source, source.stat().st_size, HEADER, lambda rows: len(rows), on_replaced)
+    source.write_text(",".join(HEADER) + "\n")
+    with pytest.raises(OSError):
+        watcher.poll()
+    watcher.poll()
+    assert len(calls) == 2
+    assert watcher.poll() == 0 and len(calls) == 2
@@ -0,0 +1,49 @@
+"""ResponseCache on a bare Flask app standing in for Dash's callback route."""
+from flask import Flask
+
+from http_cache import DASH_UPDATE_PATH, ResponseCache
+
+
+def make_app(versions, **options):
+    # versions: {"pinned": ..., "latest": ...}, changed by the tests between requests
+    app = Flask(__name__)
+    calls = []
+
+    @app.route(DASH_UPDATE_PATH, methods=["POST"])
+    def callback():
+        calls.append(versions["pinned"])
+        return {"version": versions["pinned"], "body": calls[-1]}
+
+    cache = ResponseCache(lambda: versions["pinned"], lambda: versions["latest"], **options).init_app(app)
+    return app.test_client(), cache, calls
+
+
+def test_repeated_request_is_served_from_the_cache():
+    client, cache, calls = make_app({"pinned": "a", "latest": "a"})
+    first = client.post(DASH_UPDATE_PATH, data=b"{}")
+    second = client.post(DASH_UPDATE_PATH, data=b"{}")
+    assert first.data == second.data and len(calls) == 1
+    assert "ETag" not in second.headers
+
+
+def test_request_pinned_to_an_older_version_keeps_the_cache():
+    versions = {"pinned": "b", "latest": "b"}
+    client, cache, calls = make_app(versions)
+    client.post(DASH_UPDATE_PATH, data=b"{}")
+
+    versions["pinned"] = "a"  # a request that started before the swap to "b"
+    client.post(DASH_UPDATE_PATH, data=b"{}")
+    client.post(DASH_UPDATE_PATH, data=b"{}")
+    assert calls == ["b", "a", "a"]  # never stored, never served the newer body
+    assert cache.stats()["size"] == 1
+
+    versions["pinned"] = "b"
+    client.post(DASH_UPDATE_PATH, data=b"{}")
+    assert calls == ["b", "a", "a"]
+
+
+def test_bodies_are_bounded_by_bytes():
+    client, cache, calls = make_app({"pinned": "a", "latest": "a"}, maxbytes=100)
+    for body in (b"[1]", b"[2]", b"[3]"):
+        client.post(DASH_UPDATE_PATH, data=body)
+    assert 0 < cache.stats()["bytes"] <= 100
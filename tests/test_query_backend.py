@@ -0,0 +1,200 @@
+"""The SQL cubes against the pandas AggregateCube, and ingested days against a full rebuild, on the bundled CSV."""
+import importlib.util
+import json
+import multiprocessing
+import os
+
+import pandas as pd
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+
+import MTA_Dashboard as dashboard
+from aggregates import AggregateCube, PrefixSums
+from data_loader import DEFAULT_DATA_PATH, DateIndex, load_ridership
+from query_backend import Database, SqlAggregateCube, compare_cubes, remove_dead_copies
+from services import ServiceRegistry
+
+
+BACKENDS = [
+    "pandas",
+    "sqlite",
+    pytest.param("duckdb", marks=pytest.mark.skipif(importlib.util.find_spec("duckdb") is None, reason="duckdb is not installed")),
+]
+SQL_BACKENDS = BACKENDS[1:]
+
+# First ingested day: a few weeks before the last one, and a split that starts a new year
+SPLITS = ["2024-09-17", "2023-12-15"]
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return load_ridership(path=DEFAULT_DATA_PATH, refresh=False)
+
+
+@pytest.fixture(scope="module")
+def prepared(raw):
+    df = dashboard.prepare_dataset(raw.copy())
+    return df, ServiceRegistry.from_header(raw.columns).mapping, DateIndex(df)
+
+
+def as_json(outputs):
+    # What the browser receives; Dash components compare by identity
+    return json.dumps(outputs, cls=PlotlyJSONEncoder, sort_keys=True)
+
+
+def build(backend, df, mapping, index, path):
+    if backend == "pandas":
+        return AggregateCube(df, mapping, index).build()
+    return SqlAggregateCube(df, mapping, index, backend, path).build()
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+def test_sql_cube_matches_pandas(backend, prepared, tmp_path):
+    df, mapping, index = prepared
+    expected = AggregateCube(df, mapping, index).build()
+    actual = build(backend, df, mapping, index, tmp_path / f"cube.{backend}")
+    assert compare_cubes(expected, actual) == []
+
+
+@pytest.mark.parametrize("split", SPLITS)
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_appended_cube_matches_rebuild(backend, split, prepared, tmp_path):
+    df, mapping, index = prepared
+    head = df[df['Date'] < split].copy()
+    head.attrs.update(df.attrs, version=f"{df.attrs.get('version')}-head")
+    cube = build(backend, head, mapping, DateIndex(head), tmp_path / f"cube.{backend}")
+
+    new_rows = df[df['Date'] >= split]
+    years = cube.append(df, index, new_rows)
+
+    assert sorted(years) == sorted(int(year) for year in new_rows['Year'].unique())
+    assert compare_cubes(AggregateCube(df, mapping, index).build(), cube) == []
+
+
+@pytest.mark.parametrize("split", SPLITS)
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_ingest_rows_matches_full_reload(backend, split, raw, tmp_path, monkeypatch):
+    monkeypatch.setattr(dashboard, "QUERY_BACKEND", backend)
+    monkeypatch.setattr(dashboard, "QUERY_DB", str(tmp_path / f"cube.{backend}"))
+    head = raw[raw['Date'] < split].reset_index(drop=True)
+    tail = raw[raw['Date'] >= split].reset_index(drop=True)
+
+    # Cached outputs from before the ingest: per year, all years and date ranges before / across the split
+    years = ["All"] + [str(year) for year in head['Date'].dt.year.unique()[-2:]]
+    ranges = [(None, None), ("2022-01-01", "2022-06-30"), ("2023-06-01", None)]
+    states = [
+        (year, metric, "Subways", granularity, *dates)
+        for year in years for metric in ("average", "days_100") for granularity in ("monthly", "daily")
+        for dates in ranges
+    ]
+
+    dashboard.load_data(head)
+    for state in states:
+        dashboard.update_dashboard(*state)
+    assert dashboard.ingest_rows(tail) == len(tail)
+    ingested = dashboard.latest_snapshot()
+    outputs = [as_json(dashboard.update_dashboard(*state)) for state in states]
+
+    rebuilt = dashboard.load_data(raw)
+    assert compare_cubes(rebuilt.aggregate_cube, ingested.aggregate_cube) == []
+    pd.testing.assert_frame_equal(ingested.df, rebuilt.df)
+    for metric in ("average", "days_100"):
+        for start, end in ranges:
+            assert ingested.prefix_sums.summary(start, end, metric) == pytest.approx(rebuilt.prefix_sums.summary(start, end, metric), nan_ok=True)
+    for state, output in zip(states, outputs):
+        assert output == as_json(dashboard.update_dashboard(*state)), state
+
+
+def _query_in_child(cube, rows, results):
+    # Runs in a forked process: ingest into its own copy and report where that copy was
+    cube.database.insert(rows, cube.columns)
+    results.put((cube.database.working_path(), cube.database.execute("SELECT COUNT(*) FROM ridership")[0][0]))
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+def test_processes_never_share_a_database_file(backend, prepared, tmp_path):
+    df, mapping, index = prepared
+    head = df[df['Date'] < SPLITS[0]].copy()
+    head.attrs.update(df.attrs, version=f"{df.attrs.get('version')}-head")
+    cube = build(backend, head, mapping, DateIndex(head), tmp_path / f"cube.{backend}")
+    parent_copy = cube.database.working_path()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    child = context.Process(target=_query_in_child, args=(cube, df[df['Date'] >= SPLITS[0]], results))
+    child.start()
+    child_copy, child_rows = results.get(timeout=60)
+    child.join()
+
+    # The child wrote its own copy; the built file and this process's copy still hold the head only
+    assert child_copy != parent_copy and child_rows == len(df)
+    assert cube.database.meta() == {"version": head.attrs["version"], "rows": str(len(head))}
+    assert cube.database.execute("SELECT COUNT(*) FROM ridership")[0][0] == len(head)
+
+    # The child left without cleaning up (multiprocessing exits with os._exit); the next copy made removes it
+    assert os.path.exists(child_copy)
+    other = Database(cube.database.path, backend)
+    other.load(head, cube.columns)
+    remove_dead_copies(other.path)
+    assert not os.path.exists(child_copy)
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+def test_rebuild_at_the_same_path_leaves_the_older_cube_its_rows(backend, prepared, tmp_path):
+    df, mapping, index = prepared
+    path = tmp_path / f"cube.{backend}"
+    head = df[df['Date'] < SPLITS[0]].copy()
+    head.attrs.update(df.attrs, version=f"{df.attrs.get('version')}-head")
+    old = build(backend, head, mapping, DateIndex(head), path)
+
+    new = build(backend, df, mapping, index, path)
+    assert new.database.meta()["rows"] == str(len(df))
+    assert new.database.execute("SELECT COUNT(*) FROM ridership")[0][0] == len(df)
+    assert old.database.execute("SELECT COUNT(*) FROM ridership")[0][0] == len(head)
+
+
+def stored_table(database):
+    with database.connect() as connection:
+        return connection.execute("SELECT * FROM ridership ORDER BY Date").fetchall()
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+def test_csv_source_is_loaded_without_the_frame(backend, prepared, tmp_path, monkeypatch):
+    df, mapping, index = prepared
+    expected = Database(tmp_path / f"frame.{backend}", backend)
+    frame_only = df.copy()
+    frame_only.attrs = {"version": "frame"}
+    expected.load(frame_only, list(mapping.values()))
+
+    def no_frame_inserts(*args, **kwargs):
+        raise AssertionError("loaded from the frame")
+
+    monkeypatch.setattr(Database, "insert", no_frame_inserts)
+    actual = Database(tmp_path / f"csv.{backend}", backend)
+    actual.load(df, list(mapping.values()))
+    monkeypatch.undo()
+
+    assert actual.meta() == {"version": df.attrs["version"], "rows": str(len(df))}
+    assert stored_table(actual) == stored_table(expected)  # NULL for a missing ratio either way
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+def test_frame_that_no_longer_matches_its_source_is_loaded_itself(backend, prepared, tmp_path):
+    df, mapping, index = prepared
+    thinned = df.iloc[::2].reset_index(drop=True)
+    thinned.attrs.update(df.attrs, version=f"{df.attrs.get('version')}-thinned")
+    cube = build(backend, thinned, mapping, DateIndex(thinned), tmp_path / f"cube.{backend}")
+    assert cube.database.execute("SELECT COUNT(*) FROM ridership")[0][0] == len(thinned)
+    assert compare_cubes(AggregateCube(thinned, mapping, DateIndex(thinned)).build(), cube) == []
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+def test_range_summary_matches_prefix_sums(backend, prepared, tmp_path):
+    df, mapping, index = prepared
+    cube = build(backend, df, mapping, index, tmp_path / f"cube.{backend}")
+    prefix_sums = PrefixSums(index, mapping)
+    ranges = [(None, "2021-03-31"), ("2022-01-01", "2022-06-30"), ("2023-06-01 12:00", None), ("2020-03-01", "2020-03-01")]
+    for start, end in ranges:
+        for metric in ("average", "days_100", "days_50", "median"):
+            expected = prefix_sums.summary(start, end, metric)
+            assert cube.range_summary(start, end, metric) == pytest.approx(expected, rel=1e-6, nan_ok=True), (start, end, metric)
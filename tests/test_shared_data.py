@@ -0,0 +1,24 @@
+"""Versioned directories behind CURRENT, as written by shared_data.py and static_export.py."""
+from shared_data import CURRENT, current_version_dir, publish, stage
+
+
+def write_version(directory, version, text, replace=False):
+    staging = stage(directory, version)
+    (staging / "manifest.json").write_text(text)
+    return publish(directory, staging, version, replace=replace)
+
+
+def test_publish_points_current_at_the_new_version(tmp_path):
+    write_version(tmp_path, "v1", "one")
+    target = write_version(tmp_path, "v2", "two")
+    assert (tmp_path / CURRENT).read_text() == "v2"
+    assert current_version_dir(tmp_path) == target
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith(".")] == []
+
+
+def test_republishing_keeps_or_replaces_the_version(tmp_path):
+    write_version(tmp_path, "v1", "first")
+    write_version(tmp_path, "v1", "second")
+    assert (tmp_path / "v1" / "manifest.json").read_text() == "first"
+    write_version(tmp_path, "v1", "third", replace=True)
+    assert (tmp_path / "v1" / "manifest.json").read_text() == "third"
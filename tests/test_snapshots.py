@@ -0,0 +1,31 @@
+"""Snapshot versions: what the figure, response and layout caches are keyed on."""
+import pytest
+
+import MTA_Dashboard as dashboard
+from data_loader import DEFAULT_DATA_PATH, load_ridership
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return load_ridership(path=DEFAULT_DATA_PATH, refresh=False)
+
+
+def test_frames_of_the_same_length_get_their_own_version(raw):
+    halved = raw.copy()
+    ratios = dashboard.ratio_columns(halved.columns)
+    halved[ratios] = halved[ratios] / 2
+
+    state = ("All", "average", "Subways", "monthly")
+    first = dashboard.load_data(raw)
+    average = dashboard.summary_for(*state[:2])["Subways"]
+    dashboard.update_dashboard(*state)
+
+    second = dashboard.load_data(halved)
+    assert second.version != first.version
+    assert dashboard.summary_for(*state[:2])["Subways"] == pytest.approx(average / 2)
+    metrics_row = dashboard.update_dashboard(*state)[0]
+    assert metrics_row[0].children.children[0].children[-1] == f"{average / 2:.1%}"
+
+
+def test_same_frame_keeps_its_version(raw):
+    assert dashboard.load_data(raw).version == dashboard.load_data(raw.copy()).version
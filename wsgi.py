@@ -0,0 +1,29 @@
+"""WSGI entry points for the dashboard.
+
+    gunicorn -c gunicorn.conf.py               # workers/threads from MTA_WORKERS / MTA_THREADS
+    waitress-serve --threads 8 --call wsgi:create_server
+    python MTA_Dashboard.py                    # single process, waitress if installed
+"""
+import gc
+
+import MTA_Dashboard
+
+
+def create_server(background_threads=True):
+    # Load data, build the app and fill caches once; with gunicorn's preload_app this runs in the master before
+    # forking, so gunicorn.conf.py passes background_threads=False and starts them in each worker instead
+    app = MTA_Dashboard.get_app()
+    MTA_Dashboard.warm_up()
+    if background_threads:
+        MTA_Dashboard.start_background_threads()
+
+    # Move everything built so far out of the GC's reach so workers don't dirty the shared pages
+    gc.freeze()
+    return app.server
+
+
+def __getattr__(name):
+    # Plain `wsgi:server` for servers without factories; builds the app on first access
+    if name == "server":
+        return MTA_Dashboard.get_app().server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")